@@ -0,0 +1,115 @@
+"""
+Account rotation: several orders, one after another, in one warmed context
+
+With ORDER_NUMBERS="3,4,5" (set by automation_worker.py when
+ORDERS_PER_CONTEXT > 1) main.py opens the storefront and selects the location
+once, then places each order with its own number. Between orders the account
+session is scrubbed and the page reloaded. The HTTP cache and the SPA bundle
+stay warm, so each later order only pays for login, cart and checkout.
+
+Scrubbing keeps nothing from the previous account:
+  - every cookie is dropped; only the cookies that existed before the first
+    login (the anonymous session carrying the selected location) are restored
+  - localStorage is cleared and restored to its pre-login snapshot;
+    sessionStorage and IndexedDB are wiped
+  - the page is reloaded, so no in-memory SPA state survives
+  - the page must then show the Login button again. If it does not, all
+    cookies and storage are wiped with no restore and the location is
+    selected from scratch
+
+main.py reports each order on stdout as ORDER_START:<n> and
+ORDER_RESULT:<n>:<exit code>. The worker attributes log lines and results
+to the right order from those markers.
+"""
+import os
+from typing import Any, Dict, List
+
+ORDERS_PER_CONTEXT = max(1, int(os.environ.get('ORDERS_PER_CONTEXT', '1')))
+
+START_MARKER = "ORDER_START:"
+RESULT_MARKER = "ORDER_RESULT:"
+
+SNAPSHOT_STORAGE_JS = """
+() => {
+    const items = {};
+    for (let i = 0; i < localStorage.length; i++) {
+        const key = localStorage.key(i);
+        items[key] = localStorage.getItem(key);
+    }
+    return items;
+}
+"""
+
+# Resolves once every IndexedDB database of the origin is deleted
+CLEAR_STORAGE_JS = """
+async (localItems) => {
+    localStorage.clear();
+    sessionStorage.clear();
+    for (const [key, value] of Object.entries(localItems)) {
+        localStorage.setItem(key, value);
+    }
+    if (window.indexedDB && indexedDB.databases) {
+        const databases = await indexedDB.databases();
+        await Promise.all(databases.map((db) => new Promise((resolve) => {
+            const request = indexedDB.deleteDatabase(db.name);
+            request.onsuccess = request.onerror = request.onblocked = () => resolve();
+        })));
+    }
+    return localStorage.length;
+}
+"""
+
+
+def order_numbers() -> List[str]:
+    """Orders this process places: ORDER_NUMBERS, else just ORDER_NUMBER"""
+    numbers = [n.strip() for n in os.environ.get('ORDER_NUMBERS', '').split(',') if n.strip()]
+    return numbers or [os.environ.get('ORDER_NUMBER', 'Unknown')]
+
+
+def begin_order(order_num: str):
+    """Point the per-order environment (CSV rows, screenshots, number registry) at order_num"""
+    log_path = os.environ.get('WORKER_LOG_PATH')
+    if log_path:
+        os.environ['WORKER_LOG_PATH'] = os.path.join(os.path.dirname(log_path), f'worker_{order_num}.log')
+    os.environ['ORDER_NUMBER'] = str(order_num)
+    print(f"{START_MARKER}{order_num}", flush=True)
+
+
+def report_result(order_num: str, exit_code: int):
+    print(f"{RESULT_MARKER}{order_num}:{exit_code}", flush=True)
+
+
+def parse_marker(line: str):
+    """("start", n, None) / ("result", n, code) for a marker line, else None"""
+    line = line.strip()
+    try:
+        if line.startswith(START_MARKER):
+            return "start", int(line[len(START_MARKER):]), None
+        if line.startswith(RESULT_MARKER):
+            order_num, code = line[len(RESULT_MARKER):].split(':')
+            return "result", int(order_num), int(code)
+    except ValueError:
+        pass
+    return None
+
+
+def snapshot(context, page) -> Dict[str, Any]:
+    """Anonymous, location-selected state to restore between accounts (take it before the first login)"""
+    return {
+        "cookies": context.cookies(),
+        "local_storage": page.evaluate(SNAPSHOT_STORAGE_JS),
+    }
+
+
+def scrub(context, page, baseline: Dict[str, Any] = None):
+    """
+    Drop the account session: cookies back to the baseline (or none), storage
+    back to the baseline (or empty), IndexedDB and sessionStorage wiped.
+    The caller reloads the page afterwards.
+    """
+    context.clear_cookies()
+    if baseline and baseline["cookies"]:
+        context.add_cookies(baseline["cookies"])
+    kept = page.evaluate(CLEAR_STORAGE_JS, baseline["local_storage"] if baseline else {})
+    print(f"🧹 Session scrubbed: {len(baseline['cookies']) if baseline else 0} cookie(s), "
+          f"{kept} storage key(s) restored")
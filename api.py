@@ -144,8 +144,7 @@ def get_otp(
     deadline = time.time() + timeout_seconds
 
     while True:
-        response = _http_get({"action": "getStatus", "id": request_id})
-        status, otp = parse_otp_response(response)
+        status, otp = get_status(request_id)
 
         if status in ("ok", "cancelled") and otp:
             return otp
@@ -156,6 +155,11 @@ def get_otp(
         time.sleep(poll_interval)
 
 
+def get_status(request_id: str) -> Tuple[str, Optional[str]]:
+    """Single getStatus call, parsed into (status, otp_or_none)."""
+    return parse_otp_response(_http_get({"action": "getStatus", "id": request_id}))
+
+
 def set_status(status: int, request_id: str) -> str:
     """Generic status update helper (e.g., 3=request new OTP, 8=cancel)."""
     return _http_get({"action": "setStatus", "status": status, "id": request_id})
@@ -215,27 +219,31 @@ def request_new_otp_until_new(
     previous_otp: Optional[str] = None,
     timeout_seconds: float = 300.0,
     poll_interval: float = 1.0,
+    resend_after: float = 60.0,
 ) -> Optional[str]:
     """
-    Ask for a fresh OTP (status=3) and poll until a new OTP different from
-    previous_otp is received, or timeout is reached. Returns the new OTP or None.
+    Ask for a fresh OTP (status=3) once, then poll getStatus (one call per
+    poll_interval) until an OTP different from previous_otp is received.
+    The request is only repeated if nothing new arrived within resend_after
+    seconds. Returns the new OTP, or None on timeout or cancellation.
     """
     deadline = time.time() + timeout_seconds
-    last_otp = previous_otp
+    set_status(3, request_id)
+    requested_at = time.time()
 
     while True:
-        set_status(3, request_id)
         time.sleep(poll_interval)
+        status, otp = get_status(request_id)
 
-        otp = get_otp(request_id, timeout_seconds=poll_interval, poll_interval=poll_interval)
-
-        if otp and otp != last_otp:
+        if status == "ok" and otp and otp != previous_otp:
             return otp
 
-        if time.time() >= deadline:
+        if status == "cancelled" or time.time() >= deadline:
             return None
 
-        last_otp = otp or last_otp
+        if time.time() - requested_at >= resend_after:
+            set_status(3, request_id)
+            requested_at = time.time()
 
 
 def _print_menu() -> None:
@@ -205,8 +205,7 @@ def get_otp(
 
     while True:
         # Poll using the specific request_id (isolated per worker)
-        response = _http_get({"action": "getStatus", "id": request_id}, api_key, base_url)
-        status, otp = parse_otp_response(response)
+        status, otp = get_status(request_id, api_key, base_url)
 
         if status in ("ok", "cancelled") and otp:
             return otp
@@ -217,6 +216,12 @@ def get_otp(
         time.sleep(poll_interval)
 
 
+def get_status(request_id: str, api_key: str, base_url: str) -> Tuple[str, Optional[str]]:
+    """Single getStatus call, parsed into (status, otp_or_none)."""
+    response = _http_get({"action": "getStatus", "id": request_id}, api_key, base_url)
+    return parse_otp_response(response)
+
+
 def set_status(status: int, request_id: str, api_key: str, base_url: str) -> str:
     """Generic status update helper (e.g., 3=request new OTP, 8=cancel)."""
     return _http_get({"action": "setStatus", "status": status, "id": request_id}, api_key, base_url)
@@ -1,10 +1,18 @@
 import subprocess
 import sys
 import os
+import signal
+import json
 import threading
 import time
 from queue import Queue
 from datetime import datetime
+from log_writer import get_log_writer
+from status_channel import StatusChannel, DEFAULT_CHANNEL_PATH
+from coordinator import Coordinator
+from product_preflight import preflight
+from account_rotation import ORDERS_PER_CONTEXT, parse_marker
+from standby_pool import STANDBY_PAGES
 
 # Force unbuffered output and UTF-8 encoding for Windows
 if sys.platform == 'win32':
@@ -20,36 +28,28 @@ else:
     sys.stdout.reconfigure(line_buffering=True) if hasattr(sys.stdout, 'reconfigure') else None
     sys.stderr.reconfigure(line_buffering=True) if hasattr(sys.stderr, 'reconfigure') else None
 
-# Logging setup
-logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+# Logging setup (the backend scheduler gives each batch its own logs directory)
+logs_dir = os.environ.get('LOGS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
 os.makedirs(logs_dir, exist_ok=True)
 latest_logs_file = os.path.join(logs_dir, 'latest_logs.txt')
-log_lock = threading.Lock()
+log_writer = get_log_writer(logs_dir)
+
+# Identifies this run in failed order logs (see failure_index.py)
+batch_id = os.environ.get('BATCH_ID') or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+# Archive the batch's logs as logs/archive/batch_<id>.tar.gz when it finishes
+archive_logs = os.environ.get('LOG_ARCHIVE', '0') == '1'
+
+def handle_terminate(signum, frame):
+    """Backend stop: unwind through the KeyboardInterrupt path so child orders are terminated too"""
+    raise KeyboardInterrupt
 
 def write_to_log(message, worker_id=None):
-    """Write message to worker log file and latest_logs.txt"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_line = f"[{timestamp}] {message}\n"
-    
-    with log_lock:
-        # Write to latest_logs.txt (combined)
-        try:
-            with open(latest_logs_file, 'a', encoding='utf-8') as f:
-                f.write(log_line)
-        except Exception as e:
-            print(f"[ERROR] Failed to write to latest_logs: {e}")
-        
-        # Write to worker-specific log file
-        if worker_id:
-            worker_log_file = os.path.join(logs_dir, f'worker_{worker_id}.log')
-            try:
-                with open(worker_log_file, 'a', encoding='utf-8') as f:
-                    f.write(log_line)
-            except Exception as e:
-                print(f"[ERROR] Failed to write to worker log: {e}")
+    """Write message to worker log file and latest_logs.txt (queued, non-blocking)"""
+    log_writer.write(message, worker_id=worker_id)
 
-def run_single_order(order_num):
-    """Run a single order automation"""
+def run_single_order(order_num, rotation_orders=None):
+    """Run a single order automation (or, with rotation_orders, several in one browser context)"""
     print(f"[DEBUG] run_single_order called for order {order_num}")
     base_dir = os.path.dirname(os.path.abspath(__file__))
     main_script = os.path.join(base_dir, 'main.py')
@@ -60,9 +60,13 @@ def run_single_order(order_num):
     
     env = os.environ.copy()  # This already contains API_KEY, API_URL, etc. from server.py
     env['ORDER_NUMBER'] = str(order_num)
+    env['BATCH_ID'] = batch_id
     # Pass log file path to worker so it can be uploaded on failure
     worker_log_file = os.path.join(logs_dir, f'worker_{order_num}.log')
     env['WORKER_LOG_PATH'] = worker_log_file
+    if rotation_orders and len(rotation_orders) > 1:
+        # main.py places these one after another, logging out between them (see account_rotation.py)
+        env['ORDER_NUMBERS'] = ','.join(str(n) for n in rotation_orders)
     # Set UTF-8 encoding for Windows to handle emojis
     if sys.platform == 'win32':
         env['PYTHONIOENCODING'] = 'utf-8'
@@ -94,15 +98,26 @@ def run_single_order(order_num):
         traceback.print_exc()
         raise
 
-def read_process_output(process, order_num):
-    """Read and print process output in real-time"""
+def read_process_output(process, order_num, events=None):
+    """
+    Read and print process output in real-time.
+    With events (a Queue), ORDER_START/ORDER_RESULT markers of a rotating process
+    are queued as (kind, order, code) and later lines are logged under the order they belong to.
+    """
+    current = {"order": order_num}  # order the process is working on (shared with the stderr reader)
+
     def read_stdout():
         try:
             for line in iter(process.stdout.readline, ''):
                 if line:
-                    message = f"[ORDER {order_num} STDOUT] {line.rstrip()}"
+                    marker = parse_marker(line) if events is not None else None
+                    if marker:
+                        events.put(marker)
+                        if marker[0] == "start":
+                            current["order"] = marker[1]
+                    message = f"[ORDER {current['order']} STDOUT] {line.rstrip()}"
                     print(message)
-                    write_to_log(message, worker_id=order_num)
+                    write_to_log(message, worker_id=current['order'])
         except Exception as e:
             error_msg = f"[ERROR] Error reading stdout for order {order_num}: {e}"
             print(error_msg)
@@ -112,9 +127,9 @@ def read_process_output(process, order_num):
         try:
             for line in iter(process.stderr.readline, ''):
                 if line:
-                    message = f"[ORDER {order_num} STDERR] {line.rstrip()}"
+                    message = f"[ORDER {current['order']} STDERR] {line.rstrip()}"
                     print(message)
-                    write_to_log(message, worker_id=order_num)
+                    write_to_log(message, worker_id=current['order'])
         except Exception as e:
             error_msg = f"[ERROR] Error reading stderr for order {order_num}: {e}"
             print(error_msg)
@@ -126,6 +141,114 @@ def read_process_output(process, order_num):
     stderr_thread.start()
     return stdout_thread, stderr_thread
 
+def start_standby_pool():
+    """Run standby_pool.py next to the orders (STANDBY_PAGES > 0); its output goes to worker_standby.log"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    env = os.environ.copy()
+    env['BATCH_ID'] = batch_id
+    if sys.platform == 'win32':
+        env['PYTHONIOENCODING'] = 'utf-8'
+    try:
+        process = subprocess.Popen(
+            [sys.executable, '-u', os.path.join(base_dir, 'standby_pool.py')],
+            cwd=base_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+    except Exception as e:
+        print(f"[ERROR] Failed to start standby pool: {e}")
+        return None
+    print(f"[INFO] Standby pool started (PID {process.pid}, {STANDBY_PAGES} page(s))")
+    read_process_output(process, "standby")
+    return process
+
+def stop_standby_pool(process):
+    """Let the pool close its browsers, then make sure it is gone"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def log_and_print(message, worker_id=None):
+    print(message)
+    write_to_log(message, worker_id=worker_id)
+
+def run_distributed(total_orders, max_parallel, retry_orders, on_order, on_status):
+    """
+    Run the batch through a coordinator (see coordinator.py). Agents on other
+    hosts connect to COORDINATOR_PORT; unless LOCAL_AGENT_SLOTS=0, a local agent
+    with max_parallel slots is started too so this host keeps its own share.
+    """
+    port = int(os.environ['COORDINATOR_PORT'])
+    local_slots = int(os.environ.get('LOCAL_AGENT_SLOTS', str(max_parallel)))
+    coordinator = Coordinator(
+        total_orders,
+        retry_orders=retry_orders,
+        host=os.environ.get('COORDINATOR_BIND', '127.0.0.1'),
+        port=port,
+        token=os.environ.get('COORDINATOR_TOKEN') or None,
+        on_status=on_status,
+        on_order=on_order,
+        log=log_and_print
+    )
+    try:
+        coordinator.start()
+    except ValueError as e:
+        log_and_print(f"[CRITICAL] {e}")
+        return {"success": 0, "failure": total_orders, "all_products_failed": False}
+
+    local_agent = None
+    if local_slots > 0:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        local_agent = subprocess.Popen(
+            [sys.executable, '-u', os.path.join(base_dir, 'worker_agent.py'),
+             '--host', '127.0.0.1', '--port', str(coordinator.port),
+             '--slots', str(local_slots), '--agent-id', f'local-{batch_id}'],
+            cwd=base_dir,
+            env=dict(os.environ, COORDINATOR_TOKEN=coordinator.token)  # not on the command line
+        )
+    try:
+        return coordinator.run()
+    finally:
+        if local_agent:
+            try:
+                local_agent.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                local_agent.terminate()
+
+def run_preflight():
+    """
+    Check product URLs once before any order buys a number. Dead/OOS products
+    are dropped from PRODUCTS_JSON (inherited by every order); returns the
+    preflight summary, with "products" empty if nothing is orderable.
+    """
+    try:
+        products = json.loads(os.environ.get('PRODUCTS_JSON') or '[]')
+    except json.JSONDecodeError:
+        products = []
+    products = [p for p in products if str(p.get('url', '')).strip()]
+    if not products:
+        return None  # old PRIMARY_/SECONDARY_ format: leave it to main.py
+
+    log_and_print(f"[INFO] Preflight: checking {len(products)} product URLs...")
+    summary = preflight(products, cookies=os.environ.get('PREFLIGHT_COOKIES') or None)
+    for result in summary["results"]:
+        log_and_print(f"[INFO] Preflight: {result['status'].upper()} {result['url']}"
+                      + (f" ({result['reason']})" if result.get('reason') else ""))
+    if summary["products"] and summary["products"] != products:
+        os.environ['PRODUCTS_JSON'] = json.dumps(summary["products"])
+        log_and_print(f"[INFO] Preflight dropped {len(summary['dropped'])} product(s), "
+                      f"{len(summary['products'])} left (available first) - checked in {summary['seconds']}s")
+    return summary
+
 def main():
     print("[DEBUG] ========== AUTOMATION WORKER STARTING ==========")
     print(f"[DEBUG] Current working directory: {os.getcwd()}")
@@ -156,34 +279,55 @@ def main():
     sessions_started = 0  # Track how many sessions have been started
     retried_orders = set()  # Track which orders have already been retried
     
-    # Status file for tracking
-    status_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'automation_status.json')
-    import json
-    from datetime import datetime
+    # Shared-memory status channel read by the backend (see status_channel.py)
+    status = StatusChannel(os.environ.get('STATUS_CHANNEL_PATH') or DEFAULT_CHANNEL_PATH)
     
-    # Initialize status file
-    def update_status_file(is_running, success, failure, all_products_failed=False):
+    def update_status(is_running, success, failure, all_products_failed=False):
         try:
-            status_data = {
-                "is_running": is_running,
-                "success": success,
-                "failure": failure,
-                "all_products_failed": all_products_failed,
-                "start_time": datetime.now().isoformat() if is_running else None,
-                "end_time": datetime.now().isoformat() if not is_running else None
-            }
-            # Atomic write
-            temp_file = status_file + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f)
-                f.flush()
-                os.fsync(f.fileno())
-            os.replace(temp_file, status_file)
+            if is_running:
+                status.update(success=success, failure=failure, all_products_failed=all_products_failed)
+            else:
+                status.finish_run(success=success, failure=failure, all_products_failed=all_products_failed)
         except Exception as e:
-            print(f"[ERROR] Failed to update status file: {e}")
+            print(f"[ERROR] Failed to update status channel: {e}")
+    
+    def update_order_status(order_num, **fields):
+        try:
+            status.update_order(order_num, **fields)
+        except Exception as e:
+            print(f"[ERROR] Failed to update status for order {order_num}: {e}")
     
     # Initialize status
-    update_status_file(True, 0, 0)
+    status.start_run(total_orders=total_orders, batch_id=batch_id)
+    
+    # Preflight the product URLs so a dead product list fails before any number is bought
+    if os.environ.get('PREFLIGHT', '1') == '1':
+        summary = run_preflight()
+        if summary is not None:
+            status.update(preflight={"dropped": summary["dropped"], "seconds": summary["seconds"]})
+            if not summary["products"]:
+                log_and_print("[CRITICAL] Preflight: all product URLs are unavailable. Not starting any orders.")
+                for order_num in range(1, total_orders + 1):
+                    update_order_status(order_num, status="failed", return_code=5,
+                                        error="All product URLs unavailable (preflight)",
+                                        finished_at=datetime.now().isoformat())
+                update_status(False, 0, total_orders, all_products_failed=True)
+                log_writer.close(archive_name=f"batch_{batch_id}" if archive_logs else None)
+                return
+    
+    # Distributed mode: hand the queue to a coordinator and let agents run the orders
+    if os.environ.get('COORDINATOR_PORT'):
+        result = run_distributed(total_orders, max_parallel, retry_orders, update_order_status,
+                                 lambda success, failure: update_status(True, success, failure))
+        print(f"[INFO] Final stats: Success={result['success']}, Failure={result['failure']}")
+        write_to_log(f"[INFO] Final stats: Success={result['success']}, Failure={result['failure']}")
+        update_status(False, result['success'], result['failure'],
+                      all_products_failed=result['all_products_failed'])
+        log_writer.close(archive_name=f"batch_{batch_id}" if archive_logs else None)
+        return
+    
+    # Hot-standby browsers parked at the login modal, claimed by main.py (see standby_pool.py)
+    standby_process = start_standby_pool() if STANDBY_PAGES > 0 else None
     
     # Add all orders to queue
     for i in range(1, total_orders + 1):
@@ -192,6 +336,118 @@ def main():
     print(f"[DEBUG] Added {total_orders} orders to queue")
     
     should_stop_all = False  # Flag to stop all workers if all product URLs fail
+    # Rotating processes (ORDERS_PER_CONTEXT > 1), by PID: their orders and the markers read from stdout
+    rotations = {}
+
+    def pending_orders(order_num, process, rotation=None):
+        """Orders a process still owes a result for"""
+        if rotation is None:
+            return [order_num]
+        return [n for n in rotation["orders"] if n not in rotation["reported"]]
+
+    def record_result(order_num, return_code):
+        """Count a finished order: success, retry or failure. Exit code 5 stops all workers."""
+        nonlocal completed, success_count, failure_count, should_stop_all
+        finished_at = datetime.now().isoformat()
+        
+        if return_code == 0:
+            # Order succeeded
+            completed += 1
+            success_count += 1
+            update_order_status(order_num, status="success", return_code=return_code, finished_at=finished_at)
+            print(f"[INFO] Order {order_num} completed (SUCCESS, return_code={return_code}) - {completed}/{total_orders} total")
+        else:
+            # Logic for determining what to do on failure
+            should_retry = False
+            
+            # Check user-configured Retry (only if enabled, exit code != 5, and not already retried)
+            if retry_orders and return_code != 5 and order_num not in retried_orders:
+                print(f"[INFO] Order {order_num} failed (return_code={return_code}) - Retrying once (User Setting)...")
+                write_to_log(f"[INFO] Order {order_num} failed (return_code={return_code}) - Retrying once (User Setting)...", worker_id=order_num)
+                retried_orders.add(order_num)
+                should_retry = True
+                    
+            if should_retry:
+                # Re-queue order for retry
+                order_queue.put(order_num)
+                update_order_status(order_num, status="retrying", return_code=return_code, finished_at=finished_at)
+                # Do NOT increment completed/failure_count
+            else:
+                # Order legitimately failed and won't be retried
+                completed += 1
+                failure_count += 1
+                update_order_status(order_num, status="failed", return_code=return_code, finished_at=finished_at)
+                
+                if order_num in retried_orders:
+                    print(f"[INFO] Order {order_num} failed again after retry (return_code={return_code}) - Marking as FAILED - {completed}/{total_orders} total")
+                    write_to_log(f"[INFO] Order {order_num} failed again after retry (return_code={return_code}) - Marking as FAILED - {completed}/{total_orders} total", worker_id=order_num)
+                elif return_code != 5:
+                    # Normal failure message (only if not exit code 5 which has its own message below)
+                    print(f"[INFO] Order {order_num} completed (FAILED, return_code={return_code}) - {completed}/{total_orders} total")
+                    write_to_log(f"[INFO] Order {order_num} completed (FAILED, return_code={return_code}) - {completed}/{total_orders} total", worker_id=order_num)
+        
+        # Publish counters
+        update_status(True, success_count, failure_count)
+        
+        # If process failed with exit code 5 (all product URLs failed), stop all workers immediately
+        if return_code == 5:
+            print(f"[CRITICAL] Order {order_num} failed - all product URLs failed. Stopping all workers immediately...")
+            write_to_log(f"[CRITICAL] Order {order_num} failed - all product URLs failed. Stopping all workers immediately...", worker_id=order_num)
+            should_stop_all = True
+            
+            # Terminate all remaining active processes
+            remaining_active = 0
+            for remaining_order_num, remaining_process in active_processes[:]:
+                remaining = pending_orders(remaining_order_num, remaining_process, rotations.get(remaining_process.pid))
+                remaining_active += len(remaining)
+                for pending in remaining:
+                    update_order_status(pending, status="terminated", finished_at=datetime.now().isoformat())
+                try:
+                    print(f"[DEBUG] Terminating process for order {remaining_order_num}")
+                    remaining_process.terminate()
+                    try:
+                        remaining_process.wait(timeout=5)
+                    except:
+                        remaining_process.kill()
+                except Exception as e:
+                    print(f"[ERROR] Failed to terminate process for order {remaining_order_num}: {e}")
+            
+            # Mark remaining orders in queue and active processes as failed
+            remaining_in_queue = order_queue.qsize()
+            remaining_total = remaining_in_queue + remaining_active
+            
+            if remaining_total > 0:
+                failure_count += remaining_total
+                completed += remaining_total
+                print(f"[INFO] Marked {remaining_total} remaining orders as failed ({remaining_in_queue} in queue, {remaining_active} active)")
+                write_to_log(f"[INFO] Marked {remaining_total} remaining orders as failed", worker_id=None)
+            
+            # Clear the queue and active processes
+            while not order_queue.empty():
+                order_queue.get()
+            active_processes.clear()
+            rotations.clear()
+            # Mark as all products failed
+            update_status(False, success_count, failure_count, all_products_failed=True)
+
+    def handle_rotation_events(rotation, pid):
+        """Apply the ORDER_START/ORDER_RESULT markers a rotating process printed since the last check"""
+        while not rotation["events"].empty() and not should_stop_all:
+            kind, rotated_order, code = rotation["events"].get()
+            if kind == "start":
+                rotation["started"].add(rotated_order)
+                if rotated_order != rotation["orders"][0]:
+                    update_order_status(
+                        rotated_order,
+                        status="running",
+                        pid=pid,
+                        attempts=2 if rotated_order in retried_orders else 1,
+                        started_at=datetime.now().isoformat(),
+                        finished_at=None
+                    )
+            elif rotated_order in rotation["orders"] and rotated_order not in rotation["reported"]:
+                rotation["reported"].add(rotated_order)
+                record_result(rotated_order, code)
     
     try:
         while completed < total_orders and not should_stop_all:
@@ -200,6 +456,10 @@ def main():
             # Start new processes up to max_parallel
             while len(active_processes) < max_parallel and not order_queue.empty() and not should_stop_all:
                 order_num = order_queue.get()
+                # Rotation: this process places the next few queued orders too, one account after another
+                group = [order_num]
+                while len(group) < ORDERS_PER_CONTEXT and not order_queue.empty():
+                    group.append(order_queue.get())
                 
                 # Add delay between starting sessions (except for the first one)
                 if sessions_started > 0:
@@ -209,13 +469,28 @@ def main():
                     time.sleep(delay_seconds)
                 
                 print(f"[INFO] Starting order {order_num}/{total_orders}")
+                if len(group) > 1:
+                    print(f"[INFO] Orders {', '.join(str(n) for n in group)} share one browser context (account rotation)")
                 print(f"[INFO] [ISOLATED] Worker {order_num} will be completely isolated - gets its own phone number and request_id")
                 try:
-                    process = run_single_order(order_num)
+                    process = run_single_order(order_num, group)
                     active_processes.append((order_num, process))
+                    events = None
+                    if len(group) > 1:
+                        events = Queue()
+                        rotations[process.pid] = {"orders": group, "events": events,
+                                                  "started": {order_num}, "reported": set()}
                     sessions_started += 1  # Increment session counter
+                    update_order_status(
+                        order_num,
+                        status="running",
+                        pid=process.pid,
+                        attempts=2 if order_num in retried_orders else 1,
+                        started_at=datetime.now().isoformat(),
+                        finished_at=None
+                    )
                     # Start reading output
-                    stdout_thread, stderr_thread = read_process_output(process, order_num)
+                    stdout_thread, stderr_thread = read_process_output(process, order_num, events)
                     output_threads[order_num] = (stdout_thread, stderr_thread)
                     print(f"[DEBUG] Order {order_num} process started, PID: {process.pid}")
                     print(f"[DEBUG] [ISOLATED] Worker {order_num} isolation: Each process has its own memory space and variables")
@@ -223,14 +498,23 @@ def main():
                     print(f"[ERROR] Failed to start order {order_num}: {e}")
                     import traceback
                     traceback.print_exc()
+                    for queued in group[1:]:
+                        order_queue.put(queued)  # only the lead order is counted as failed
                     completed += 1  # Count as failed
                     failure_count += 1
-                    update_status_file(True, success_count, failure_count)
+                    update_order_status(order_num, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+                    update_status(True, success_count, failure_count)
             
             # Check for completed processes
             for order_num, process in active_processes[:]:
                 if should_stop_all:
                     break
+
+                rotation = rotations.get(process.pid)
+                if rotation:
+                    handle_rotation_events(rotation, process.pid)
+                    if should_stop_all:
+                        break
                     
                 return_code = process.poll()
                 if return_code is not None:
@@ -252,87 +536,31 @@ def main():
                     # Remove from active processes
                     active_processes.remove((order_num, process))
                     if order_num in output_threads:
+                        # Let the reader reach EOF so every ORDER_RESULT marker is queued
+                        output_threads[order_num][0].join(timeout=2)
                         del output_threads[order_num]
                     
-                    status = "SUCCESS" if return_code == 0 else "FAILED"
-                    
-                    if return_code == 0:
-                        # Order succeeded
-                        completed += 1
-                        success_count += 1
-                        print(f"[INFO] Order {order_num} completed (SUCCESS, return_code={return_code}) - {completed}/{total_orders} total")
+                    if not rotation:
+                        record_result(order_num, return_code)
                     else:
-                        # Logic for determining what to do on failure
-                        should_retry = False
-                        
-                        # Check user-configured Retry (only if enabled, exit code != 5, and not already retried)
-                        if retry_orders and return_code != 5 and order_num not in retried_orders:
-                            print(f"[INFO] Order {order_num} failed (return_code={return_code}) - Retrying once (User Setting)...")
-                            write_to_log(f"[INFO] Order {order_num} failed (return_code={return_code}) - Retrying once (User Setting)...", worker_id=order_num)
-                            retried_orders.add(order_num)
-                            should_retry = True
-                                
-                        if should_retry:
-                            # Re-queue order for retry
-                            order_queue.put(order_num)
-                            # Do NOT increment completed/failure_count
-                        else:
-                            # Order legitimately failed and won't be retried
-                            completed += 1
-                            failure_count += 1
-                            
-                            if order_num in retried_orders:
-                                print(f"[INFO] Order {order_num} failed again after retry (return_code={return_code}) - Marking as FAILED - {completed}/{total_orders} total")
-                                write_to_log(f"[INFO] Order {order_num} failed again after retry (return_code={return_code}) - Marking as FAILED - {completed}/{total_orders} total", worker_id=order_num)
-                            elif return_code != 5:
-                                # Normal failure message (only if not exit code 5 which has its own message below)
-                                print(f"[INFO] Order {order_num} completed (FAILED, return_code={return_code}) - {completed}/{total_orders} total")
-                                write_to_log(f"[INFO] Order {order_num} completed (FAILED, return_code={return_code}) - {completed}/{total_orders} total", worker_id=order_num)
-                    
-                    
-                    # Update status file
-                    update_status_file(True, success_count, failure_count)
-                    
-                    # If process failed with exit code 5 (all product URLs failed), stop all workers immediately
-                    if return_code == 5:
-                        print(f"[CRITICAL] Order {order_num} failed - all product URLs failed. Stopping all workers immediately...")
-                        write_to_log(f"[CRITICAL] Order {order_num} failed - all product URLs failed. Stopping all workers immediately...", worker_id=order_num)
-                        should_stop_all = True
-                        
-                        # Terminate all remaining active processes
-                        for remaining_order_num, remaining_process in active_processes[:]:
-                            try:
-                                print(f"[DEBUG] Terminating process for order {remaining_order_num}")
-                                remaining_process.terminate()
-                                try:
-                                    remaining_process.wait(timeout=5)
-                                except:
-                                    remaining_process.kill()
-                            except Exception as e:
-                                print(f"[ERROR] Failed to terminate process for order {remaining_order_num}: {e}")
-                        
-                        # Mark remaining orders in queue and active processes as failed
-                        remaining_in_queue = order_queue.qsize()
-                        remaining_active = len(active_processes)
-                        remaining_total = remaining_in_queue + remaining_active
-                        
-                        if remaining_total > 0:
-                            failure_count += remaining_total
-                            completed += remaining_total
-                            print(f"[INFO] Marked {remaining_total} remaining orders as failed ({remaining_in_queue} in queue, {remaining_active} active)")
-                            write_to_log(f"[INFO] Marked {remaining_total} remaining orders as failed", worker_id=None)
-                        
-                        # Clear the queue and active processes
-                        while not order_queue.empty():
-                            order_queue.get()
-                        active_processes.clear()
-                        # Mark as all products failed
-                        update_status_file(False, success_count, failure_count, all_products_failed=True)
+                        del rotations[process.pid]
+                        handle_rotation_events(rotation, process.pid)
+                        if should_stop_all:
+                            break
+                        for rotated_order in pending_orders(order_num, process, rotation):
+                            if rotated_order in rotation["started"]:
+                                # Died mid-order without reporting; a clean exit here still means no order
+                                record_result(rotated_order, return_code or 1)
+                                if should_stop_all:
+                                    break
+                            else:
+                                # Never started (session reset failed or the page closed): run it again later
+                                print(f"[INFO] Order {rotated_order} was not started by PID {process.pid} - re-queued")
+                                order_queue.put(rotated_order)
+
+                    if should_stop_all:
                         break  # Break out of the for loop
-                    
 
-                    
-            
             time.sleep(0.5)  # Small delay to avoid busy waiting
     except KeyboardInterrupt:
         print("\n[WARNING] [INTERRUPTED] Interrupted! Stopping all active processes...")
@@ -354,18 +582,22 @@ def main():
         import traceback
         traceback.print_exc()
         raise
+    finally:
+        stop_standby_pool(standby_process)
     
     print(f"[INFO] All {total_orders} orders completed!")
     print(f"[INFO] Final stats: Success={success_count}, Failure={failure_count}")
     write_to_log(f"[INFO] All {total_orders} orders completed!")
     write_to_log(f"[INFO] Final stats: Success={success_count}, Failure={failure_count}")
     
-    # Mark as completed in status file
-    update_status_file(False, success_count, failure_count)
+    # Mark as completed in status channel (keep the all-products-failed flag if that ended the run)
+    update_status(False, success_count, failure_count, all_products_failed=should_stop_all)
     
     print("[DEBUG] ========== AUTOMATION WORKER FINISHED ==========")
     write_to_log("[DEBUG] ========== AUTOMATION WORKER FINISHED ==========")
+    log_writer.close(archive_name=f"batch_{batch_id}" if archive_logs else None)
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_terminate)
     main()
 
@@ -0,0 +1,86 @@
+"""
+Batch-wide product availability cache shared by concurrent orders
+
+Any order that sees a product out of stock (OOS indicator, no ADD button) or
+undeliverable ("Remove Items" in the cart) records the URL here. Other orders
+in the same batch read the cache and skip that product without a page load.
+Entries expire after a short TTL so a restock is picked up again.
+
+Backed by SQLite (availability_cache.db, WAL) so every main.py process
+sees the same view.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.environ.get('AVAILABILITY_CACHE_DB') or os.path.join(BASE_DIR, 'availability_cache.db')
+DEFAULT_TTL = float(os.environ.get('AVAILABILITY_TTL_SECONDS', '300'))
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS unavailable_products (
+                batch_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                reason TEXT,
+                seen_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (batch_id, url)
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _batch(batch_id: Optional[str]) -> str:
+    return batch_id or os.environ.get('BATCH_ID') or 'default'
+
+
+def mark_unavailable(url: str, reason: str, batch_id: Optional[str] = None, ttl: float = DEFAULT_TTL):
+    """Record that a product can't be ordered right now"""
+    now = time.time()
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO unavailable_products (batch_id, url, reason, seen_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (_batch(batch_id), url, reason, now, now + ttl)
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to update availability cache: {e}")
+
+
+def mark_available(url: str, batch_id: Optional[str] = None):
+    """Forget a negative entry (the product was just added successfully)"""
+    try:
+        _connect().execute("DELETE FROM unavailable_products WHERE batch_id = ? AND url = ?",
+                           (_batch(batch_id), url))
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to update availability cache: {e}")
+
+
+def unavailable_urls(batch_id: Optional[str] = None) -> Dict[str, str]:
+    """URL -> reason for products currently known to be unavailable in this batch"""
+    try:
+        rows = _connect().execute(
+            "SELECT url, reason FROM unavailable_products WHERE batch_id = ? AND expires_at > ?",
+            (_batch(batch_id), time.time())
+        )
+        return {row["url"]: row["reason"] for row in rows}
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to read availability cache: {e}")
+        return {}
+
+
+def purge_expired() -> int:
+    cursor = _connect().execute("DELETE FROM unavailable_products WHERE expires_at <= ?", (time.time(),))
+    return cursor.rowcount
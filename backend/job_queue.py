@@ -0,0 +1,485 @@
+"""Persistent multi-batch job queue and scheduler for automation runs
+
+Every /api/automation/start call becomes a batch row in a SQLite database
+(jobs.db). A scheduler thread admits queued batches in FIFO order. A batch
+starts only if its max_parallel_windows still fits in HOST_MAX_WINDOWS and
+its user is under USER_MAX_RUNNING_BATCHES. Each batch runs its own
+automation_worker.py with a separate logs directory (logs/<batch_id>/) and
+status channel (status/<batch_id>.shm), so concurrent batches don't clobber
+each other.
+
+A worker writes its output to logs/<batch_id>/worker.log rather than to a
+pipe held by the server, so it keeps running across a server restart. Because
+the queue is on disk, the restarted server keeps queued batches and goes on
+tracking running workers by pid and process start time (a reused pid doesn't
+count as the worker). A worker that died mid-run has its process group killed,
+taking any orphaned main.py children with it, and is then re-queued for the
+orders it hadn't finished.
+
+Secrets (SECRET_ENV_KEYS) are never written to jobs.db. The queue keeps them
+in memory for the batches it accepted; after a restart the scheduler asks its
+secrets_provider for them before launching a re-queued batch.
+"""
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from status_channel import StatusChannel
+import number_registry
+
+JOBS_DB = os.path.join(BASE_DIR, 'jobs.db')
+LOGS_ROOT = os.path.join(BASE_DIR, 'logs')
+STATUS_ROOT = os.path.join(BASE_DIR, 'status')
+WORKER_SCRIPT = os.path.join(BASE_DIR, 'automation_worker.py')
+WORKER_LOG = 'worker.log'
+
+# Worker env keys kept out of jobs.db
+SECRET_ENV_KEYS = ('API_KEY',)
+
+# Total browser windows this host may run at once, across all batches
+HOST_MAX_WINDOWS = int(os.environ.get('HOST_MAX_WINDOWS', '20'))
+# Per-user quotas
+USER_MAX_RUNNING_BATCHES = int(os.environ.get('USER_MAX_RUNNING_BATCHES', '1'))
+USER_MAX_PENDING_BATCHES = int(os.environ.get('USER_MAX_PENDING_BATCHES', '5'))
+
+ACTIVE_STATES = ('queued', 'running')
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def kill_process_group(pid: Optional[int], timeout: float = 5.0):
+    """Terminate a worker and everything it started (its main.py children share its process group)"""
+    if not pid:
+        return
+    if sys.platform == 'win32':
+        subprocess.run(['taskkill', '/PID', str(pid), '/T', '/F'], capture_output=True)
+        return
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.killpg(pid, 0)
+        except (ProcessLookupError, PermissionError):
+            return
+        time.sleep(0.2)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def batch_logs_dir(batch_id: str) -> str:
+    return os.path.join(LOGS_ROOT, batch_id)
+
+
+def batch_status_path(batch_id: str) -> str:
+    return os.path.join(STATUS_ROOT, f"{batch_id}.shm")
+
+
+def process_start_time(pid: Optional[int]) -> Optional[int]:
+    """Start time of a process in clock ticks since boot (Linux /proc), None if unknown"""
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat", 'rb') as f:
+            stat = f.read().decode('utf-8', errors='replace')
+        # Field 22; the command name (field 2) may contain spaces, so split after its ")"
+        return int(stat.rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def pid_alive(pid: Optional[int], started: Optional[int] = None) -> bool:
+    """
+    True if a process with this pid is still running. With `started` (from
+    process_start_time() at launch) the process must also have that start
+    time, so a pid reused by an unrelated process doesn't count.
+    """
+    if not pid:
+        return False
+    if started is not None:
+        current = process_start_time(pid)
+        if current is not None and current != started:
+            return False
+    if sys.platform == 'win32':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return code.value == STILL_ACTIVE
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # A zombie child still answers signal 0; reap it if it's ours
+    try:
+        done, _ = os.waitpid(pid, os.WNOHANG)
+        return done == 0
+    except ChildProcessError:
+        return True
+
+
+class JobQueue:
+    """SQLite-backed batch records"""
+
+    def __init__(self, db_path: str = JOBS_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    username TEXT,
+                    state TEXT NOT NULL,
+                    total_orders INTEGER NOT NULL,
+                    max_parallel INTEGER NOT NULL,
+                    env_json TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    pid INTEGER,
+                    pid_started INTEGER,
+                    success INTEGER DEFAULT 0,
+                    failure INTEGER DEFAULT 0,
+                    resumed INTEGER DEFAULT 0,
+                    error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_state ON batches (state, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_user ON batches (user_id, created_at)")
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(batches)")}
+            if 'pid_started' not in columns:
+                conn.execute("ALTER TABLE batches ADD COLUMN pid_started INTEGER")
+        # Secret env values of the batches accepted by this process, by batch_id
+        self._secrets: Dict[str, Dict[str, str]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row], include_env: bool = False) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        data = dict(row)
+        env = json.loads(data.pop('env_json') or '{}')
+        if include_env:
+            data['env'] = env
+        return data
+
+    def submit(self, user_id: str, username: str, total_orders: int, max_parallel: int,
+               env: Dict[str, str]) -> Dict[str, Any]:
+        """Queue a new batch; raises QuotaExceeded if the user has too many pending"""
+        batch_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        secrets = {key: value for key, value in env.items() if key in SECRET_ENV_KEYS}
+        env = {key: value for key, value in env.items() if key not in SECRET_ENV_KEYS}
+        with self._lock, self._connect() as conn:
+            pending = conn.execute(
+                f"SELECT COUNT(*) FROM batches WHERE user_id = ? AND state IN {ACTIVE_STATES}",
+                (user_id,)
+            ).fetchone()[0]
+            if pending >= USER_MAX_PENDING_BATCHES:
+                raise QuotaExceeded(
+                    f"You already have {pending} queued/running batches (limit {USER_MAX_PENDING_BATCHES})"
+                )
+            conn.execute(
+                """INSERT INTO batches (batch_id, user_id, username, state, total_orders, max_parallel,
+                                        env_json, created_at)
+                   VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)""",
+                (batch_id, user_id, username, total_orders, max_parallel, json.dumps(env), _now())
+            )
+            self._secrets[batch_id] = secrets
+        return self.get(batch_id)
+
+    def secrets(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """Secret env of a batch submitted to this process (None after a restart)"""
+        return self._secrets.get(batch_id)
+
+    def forget_secrets(self, batch_id: str):
+        self._secrets.pop(batch_id, None)
+
+    def get(self, batch_id: str, include_env: bool = False) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return self._row(row, include_env)
+
+    def list(self, user_id: Optional[str] = None, states: Optional[tuple] = None,
+             limit: int = 50, include_env: bool = False) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if states:
+            clauses.append(f"state IN ({','.join('?' * len(states))})")
+            params.extend(states)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if states and set(states) <= set(ACTIVE_STATES) else "DESC"
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM batches {where} ORDER BY created_at {order} LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._row(row, include_env) for row in rows]
+
+    def latest_for_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        batches = self.list(user_id=user_id, limit=1)
+        return batches[0] if batches else None
+
+    def update(self, batch_id: str, **fields):
+        if not fields:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE batches SET {assignments} WHERE batch_id = ?", (*fields.values(), batch_id))
+
+    def queue_position(self, batch_id: str) -> Optional[int]:
+        queued = [b['batch_id'] for b in self.list(states=('queued',), limit=10000)]
+        return queued.index(batch_id) + 1 if batch_id in queued else None
+
+
+class BatchScheduler:
+    """Admits queued batches by host capacity and tracks their worker processes"""
+
+    def __init__(self, queue: JobQueue, poll_interval: float = 1.0,
+                 secrets_provider: Optional[Callable[[Dict[str, Any]], Dict[str, str]]] = None):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        # Looks up a batch's secret env (SECRET_ENV_KEYS) when the queue no longer holds it
+        self.secrets_provider = secrets_provider
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.recover()
+        self._thread = threading.Thread(target=self._loop, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    # -----------------------------
+    # RECOVERY
+    # -----------------------------
+    def recover(self):
+        """After a restart: keep tracking live workers, re-queue unfinished orders of dead ones"""
+        for batch in self.queue.list(states=('running',), limit=10000):
+            if pid_alive(batch['pid'], batch['pid_started']):
+                print(f"[INFO] Tracking running batch {batch['batch_id']} (pid {batch['pid']})")
+                continue
+            self._finish_dead(batch)
+
+    def _finish_dead(self, batch: Dict[str, Any]):
+        # main.py children of a dead worker share its process group and may still be
+        # placing orders; kill them before their orders are queued again
+        if sys.platform != 'win32':
+            kill_process_group(batch['pid'])
+        try:
+            number_registry.sweep_leaked(pid_alive, batch_id=batch['batch_id'])
+        except Exception as e:
+            print(f"[WARNING] Failed to sweep numbers of batch {batch['batch_id']}: {e}")
+        status = self._read_status(batch['batch_id'])
+        success = status.get('success', 0)
+        failure = status.get('failure', 0)
+        remaining = batch['total_orders'] - success - failure
+        if status.get('is_running', True) and remaining > 0 and not status.get('all_products_failed'):
+            print(f"[INFO] Batch {batch['batch_id']} was interrupted - re-queueing {remaining} remaining orders")
+            self.queue.update(
+                batch['batch_id'], state='queued', pid=None, total_orders=remaining,
+                max_parallel=min(batch['max_parallel'], remaining), resumed=batch['resumed'] + 1,
+                success=batch['success'] + success, failure=batch['failure'] + failure
+            )
+        else:
+            self.queue.forget_secrets(batch['batch_id'])
+            self.queue.update(
+                batch['batch_id'], state='completed', finished_at=_now(),
+                success=batch['success'] + success, failure=batch['failure'] + failure
+            )
+
+    # -----------------------------
+    # SCHEDULING
+    # -----------------------------
+    def _read_status(self, batch_id: str) -> Dict[str, Any]:
+        try:
+            channel = StatusChannel(batch_status_path(batch_id))
+            try:
+                return channel.snapshot()
+            finally:
+                channel.close()
+        except Exception:
+            return {}
+
+    def _reap(self):
+        for batch in self.queue.list(states=('running',), limit=10000):
+            batch_id = batch['batch_id']
+            process = self.processes.get(batch_id)
+            finished = process.poll() is not None if process else not pid_alive(batch['pid'], batch['pid_started'])
+            if not finished:
+                continue
+            with self._lock:
+                self.processes.pop(batch_id, None)
+            status = self._read_status(batch_id)
+            if status.get('is_running'):
+                # Worker exited without finishing its run
+                self._finish_dead(batch)
+                continue
+            self.queue.forget_secrets(batch_id)
+            self.queue.update(
+                batch_id,
+                state='stopped' if status.get('stopped') else 'completed',
+                finished_at=_now(),
+                success=batch['success'] + status.get('success', 0),
+                failure=batch['failure'] + status.get('failure', 0)
+            )
+            print(f"[INFO] Batch {batch_id} finished")
+
+    def _admit(self):
+        running = self.queue.list(states=('running',), limit=10000)
+        used = sum(b['max_parallel'] for b in running)
+        running_per_user: Dict[str, int] = {}
+        for b in running:
+            running_per_user[b['user_id']] = running_per_user.get(b['user_id'], 0) + 1
+
+        for batch in self.queue.list(states=('queued',), limit=10000, include_env=True):
+            windows = min(batch['max_parallel'], HOST_MAX_WINDOWS)
+            if running_per_user.get(batch['user_id'], 0) >= USER_MAX_RUNNING_BATCHES:
+                continue
+            if used + windows > HOST_MAX_WINDOWS:
+                # FIFO: don't let smaller batches starve the head of the queue
+                break
+            try:
+                self._launch(batch, windows)
+                used += windows
+                running_per_user[batch['user_id']] = running_per_user.get(batch['user_id'], 0) + 1
+            except Exception as e:
+                print(f"[ERROR] Failed to start batch {batch['batch_id']}: {e}")
+                self.queue.forget_secrets(batch['batch_id'])
+                self.queue.update(batch['batch_id'], state='failed', finished_at=_now(), error=str(e))
+
+    def _launch(self, batch: Dict[str, Any], windows: int):
+        batch_id = batch['batch_id']
+        logs_dir = batch_logs_dir(batch_id)
+        os.makedirs(logs_dir, exist_ok=True)
+        os.makedirs(STATUS_ROOT, exist_ok=True)
+
+        channel = StatusChannel(batch_status_path(batch_id))
+        channel.start_run(total_orders=batch['total_orders'], batch_id=batch_id)
+        channel.close()
+
+        secrets = self.queue.secrets(batch_id)
+        if secrets is None and self.secrets_provider:
+            secrets = self.secrets_provider(batch)
+
+        env = os.environ.copy()
+        env.update(batch['env'])
+        env.update(secrets or {})
+        env['BATCH_ID'] = batch_id
+        env['LOGS_DIR'] = logs_dir
+        env['STATUS_CHANNEL_PATH'] = batch_status_path(batch_id)
+        env['TOTAL_ORDERS'] = str(batch['total_orders'])
+        env['MAX_PARALLEL_WINDOWS'] = str(windows)
+
+        # Output goes to a file, not a pipe: a pipe read by this server would break
+        # (and take the worker down) when the server restarts
+        with open(os.path.join(logs_dir, WORKER_LOG), 'ab') as log_file:
+            if sys.platform == 'win32':
+                session = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+            else:
+                session = {'start_new_session': True}  # own process group, see kill_process_group()
+            process = subprocess.Popen(
+                [sys.executable, '-u', WORKER_SCRIPT],  # -u flag for unbuffered output
+                cwd=BASE_DIR,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                **session
+            )
+        with self._lock:
+            self.processes[batch_id] = process
+        self.queue.update(batch_id, state='running', started_at=_now(), pid=process.pid,
+                          pid_started=process_start_time(process.pid), max_parallel=windows)
+        print(f"[INFO] Started batch {batch_id} ({batch['total_orders']} orders, {windows} windows, "
+              f"pid {process.pid}, log {os.path.join(logs_dir, WORKER_LOG)})")
+
+    def _loop(self):
+        while True:
+            try:
+                self._reap()
+                self._admit()
+            except Exception as e:
+                print(f"[ERROR] Batch scheduler error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    # -----------------------------
+    # STOPPING
+    # -----------------------------
+    def stop_batch(self, batch_id: str) -> bool:
+        """Cancel a queued batch or terminate a running one"""
+        batch = self.queue.get(batch_id)
+        if not batch or batch['state'] not in ACTIVE_STATES:
+            return False
+        if batch['state'] == 'queued':
+            self.queue.forget_secrets(batch_id)
+            self.queue.update(batch_id, state='cancelled', finished_at=_now())
+            return True
+
+        with self._lock:
+            process = self.processes.pop(batch_id, None)
+        try:
+            if process or pid_alive(batch['pid'], batch['pid_started']):
+                kill_process_group(batch['pid'])
+            if process:
+                process.wait(timeout=5)
+        except Exception as e:
+            print(f"Error terminating batch {batch_id}: {e}")
+
+        status = {}
+        try:
+            channel = StatusChannel(batch_status_path(batch_id))
+            status = channel.finish_run(stopped=True)
+            channel.close()
+        except Exception as e:
+            print(f"[WARNING] Failed to update status channel on stop: {e}")
+        self.queue.forget_secrets(batch_id)
+        self.queue.update(
+            batch_id, state='stopped', finished_at=_now(),
+            success=batch['success'] + status.get('success', 0),
+            failure=batch['failure'] + status.get('failure', 0)
+        )
+        self.wake()
+        return True
@@ -0,0 +1,201 @@
+"""Orders report: cached CSV parsing, cursor pagination, filters and aggregates"""
+import base64
+import csv
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+ORDERS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'my_orders.csv')
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Parsed rows are cached until the CSV's (mtime, size) changes
+_cache_lock = threading.Lock()
+_cache_key: Optional[Tuple[int, int]] = None
+_cache_rows: List[Dict[str, Any]] = []
+
+
+def _file_key(csv_file: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(csv_file)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse a report timestamp ('YYYY-MM-DD HH:MM:SS' or ISO format) as naive local time.
+
+    The CSV holds naive local timestamps, so ISO values with an offset ('Z',
+    '+05:30') are converted to local time to stay comparable with them.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    except ValueError:
+        pass
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def failure_reason(status: str) -> str:
+    """Text after 'Failed - ' in a status, or the raw status if not in that format"""
+    status = (status or '').strip()
+    if status.lower().startswith('failed - '):
+        return status[len('failed - '):].strip() or 'Unknown'
+    return status or 'Unknown'
+
+def _parse_csv(csv_file: str) -> List[Dict[str, Any]]:
+    """Read the orders CSV into row dicts, newest first.
+
+    Rows are read positionally because main.py and order_reporter.py have
+    historically written different header spellings for the same columns.
+    """
+    rows = []
+    with open(csv_file, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        for index, record in enumerate(reader):
+            if not record:
+                continue
+            if index == 0 and record[0].strip().lower() == 'timestamp':
+                continue
+            record = record + [''] * (6 - len(record))
+            timestamp = record[0].strip()
+            status = record[2].strip()
+            parsed = parse_timestamp(timestamp)
+            rows.append({
+                "id": index,
+                "timestamp": timestamp,
+                "screenshot_url": record[1],
+                "status": status,
+                "pastebin_url": record[3],
+                "order_id": record[4],
+                "amount": record[5],
+                "_dt": parsed,
+                "_success": status.lower() == 'success',
+            })
+    # Newest first; rows with unparseable timestamps sink to the end
+    rows.sort(key=lambda r: (r['_dt'] is not None, r['_dt'] or datetime.min, r['id']), reverse=True)
+    return rows
+
+def load_rows(csv_file: str = ORDERS_CSV) -> List[Dict[str, Any]]:
+    """Return parsed rows, re-reading the CSV only when it has changed"""
+    global _cache_key, _cache_rows
+    key = _file_key(csv_file)
+    if key is None:
+        return []
+    with _cache_lock:
+        if key != _cache_key:
+            _cache_rows = _parse_csv(csv_file)
+            _cache_key = key
+        return _cache_rows
+
+def compute_etag(query: Dict[str, Any], csv_file: str = ORDERS_CSV) -> str:
+    """ETag for a report query: changes when the CSV or the query changes"""
+    key = _file_key(csv_file)
+    raw = json.dumps([key, sorted(query.items())], default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor for the row a page ended at (its id; rows keep their ids while the CSV is appended)"""
+    raw = json.dumps(row['id'])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> int:
+    """Return the row id a cursor points at; raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if isinstance(value, list):
+            value = value[-1]  # [timestamp, id] cursors handed out before the id-only format
+        return int(value)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _public(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+def _aggregates(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    per_hour: Dict[str, Dict[str, int]] = {}
+    reasons: Dict[str, int] = {}
+    for row in rows:
+        if row['_dt'] is not None:
+            hour = row['_dt'].strftime('%Y-%m-%d %H:00')
+            bucket = per_hour.setdefault(hour, {"success": 0, "failed": 0})
+            bucket["success" if row['_success'] else "failed"] += 1
+        if not row['_success']:
+            reason = failure_reason(row['status'])
+            reasons[reason] = reasons.get(reason, 0) + 1
+    return {
+        "per_hour": [dict(hour=h, **counts) for h, counts in sorted(per_hour.items())],
+        "failure_reasons": [
+            {"reason": reason, "count": count}
+            for reason, count in sorted(reasons.items(), key=lambda kv: (-kv[1], kv[0]))
+        ],
+    }
+
+def build_report(status: str = 'all', since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                 include_aggregates: bool = True, csv_file: str = ORDERS_CSV) -> Dict[str, Any]:
+    """Filter, paginate and aggregate the orders report.
+
+    status is 'all', 'success' or 'failed'; since/until bound the timestamp
+    (inclusive). Pages are newest-first; pass the returned next_cursor to get
+    the following page.
+    """
+    rows = load_rows(csv_file)
+
+    filtered = []
+    for row in rows:
+        if status == 'success' and not row['_success']:
+            continue
+        if status == 'failed' and row['_success']:
+            continue
+        if since is not None and (row['_dt'] is None or row['_dt'] < since):
+            continue
+        if until is not None and (row['_dt'] is None or row['_dt'] > until):
+            continue
+        filtered.append(row)
+
+    start = 0
+    if cursor:
+        row_id = decode_cursor(cursor)
+        for position, row in enumerate(filtered):
+            if row['id'] == row_id:
+                start = position + 1
+                break
+        else:
+            raise ValueError("Cursor no longer matches the report")
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    page = filtered[start:start + limit]
+    has_more = start + limit < len(filtered)
+
+    report = {
+        "orders": {
+            "success": [_public(r) for r in page if r['_success']],
+            "failed": [_public(r) for r in page if not r['_success']],
+        },
+        "total": {
+            "success": sum(1 for r in filtered if r['_success']),
+            "failed": sum(1 for r in filtered if not r['_success']),
+        },
+        "count": len(page),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(page[-1]) if has_more and page else None,
+    }
+    if include_aggregates:
+        report["aggregates"] = _aggregates(filtered)
+    return report
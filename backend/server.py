@@ -3,7 +3,6 @@ from flask_cors import CORS
 import sys
 import os
 import threading
-import subprocess
 import time
 
 # Load environment variables from .env file
@@ -26,45 +25,38 @@ from api_dynamic import (
     get_prices,
     parse_prices,
 )
-from shared_state import get_all_request_ids, clear_all_request_ids
+import number_registry
+import otp_manager
+from failure_index import top_failure_reasons, query_failures
+from status_channel import StatusChannel
+from backend.job_queue import JobQueue, BatchScheduler, QuotaExceeded, batch_logs_dir, batch_status_path, pid_alive
+from screenshot_service import get_metadata as get_screenshot_metadata, list_screenshots
 from models.user import User, users_collection
 from models.global_settings import GlobalSettings
 from auth.jwt_auth import create_access_token, verify_token
 from backend.middleware import require_auth, require_admin
+from backend.user_settings_storage import load_user_settings, save_user_settings, export_all_user_settings
+from backend.orders_report import build_report, compute_etag, parse_timestamp, DEFAULT_PAGE_SIZE
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 
 
 # Global state for automation
-active_workers = []
 stop_flag = threading.Event()
+job_queue = JobQueue()
 
-def log_output(process, process_name="Worker"):
-    """Read and print subprocess output in real-time"""
-    def read_stdout():
-        try:
-            for line in iter(process.stdout.readline, b''):
-                if line:
-                    decoded = line.decode('utf-8', errors='replace').rstrip()
-                    print(f"[{process_name} STDOUT] {decoded}")
-        except Exception as e:
-            print(f"[ERROR] Error reading stdout for {process_name}: {e}")
-    
-    def read_stderr():
-        try:
-            for line in iter(process.stderr.readline, b''):
-                if line:
-                    decoded = line.decode('utf-8', errors='replace').rstrip()
-                    print(f"[{process_name} STDERR] {decoded}")
-        except Exception as e:
-            print(f"[ERROR] Error reading stderr for {process_name}: {e}")
-    
-    stdout_thread = threading.Thread(target=read_stdout, daemon=True)
-    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
-    stdout_thread.start()
-    stderr_thread.start()
-    return stdout_thread, stderr_thread
+def batch_secrets(batch):
+    """Secret worker env of a batch re-queued after a restart (jobs.db doesn't store it)"""
+    settings = load_user_settings(batch['user_id']) or {}
+    api_key = settings.get('api_key', '')
+    if not api_key:
+        user = User.get_user_by_id(batch['user_id'])
+        api_key = user.get('api_key', '') if user else ''
+    return {'API_KEY': (api_key or '').strip()}
+
+# Admits queued batches and tracks their worker processes (see backend/job_queue.py)
+scheduler = BatchScheduler(job_queue, secrets_provider=batch_secrets)
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
@@ -125,7 +117,6 @@ def get_current_user():
         user_id = user.get('_id')
         
         # Load settings from JSON file
-        from user_settings_storage import load_user_settings
         settings = load_user_settings(user_id)
         
         # Merge settings into user object
@@ -238,17 +229,6 @@ def update_settings():
         print(f"[DEBUG] update_settings - Settings to save: {settings}")
         
         try:
-            try:
-                from backend.user_settings_storage import save_user_settings
-            except ImportError:
-                # Fallback for different import paths
-                try:
-                    from user_settings_storage import save_user_settings
-                except ImportError:
-                    import sys
-                    import os
-                    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-                    from user_settings_storage import save_user_settings
             result = save_user_settings(user_id, settings)
             print(f"[DEBUG] update_settings - Save result: {result}")
             
@@ -258,12 +238,6 @@ def update_settings():
                 print(f"[DEBUG] update_settings - Failed to save settings: {result.get('error')}")
             
             return jsonify(result)
-        except ImportError as e:
-            print(f"[ERROR] update_settings - Failed to import user_settings_storage: {e}")
-            return jsonify({
-                "success": False,
-                "error": f"Failed to import settings storage: {str(e)}"
-            }), 500
         except Exception as e:
             print(f"[ERROR] update_settings - Exception while saving: {e}")
             import traceback
@@ -309,55 +283,70 @@ def health():
 @app.route('/api/orders/report', methods=['GET'])
 @require_auth
 def get_orders_report():
-    """Get orders report with success/failed separation"""
+    """Get orders report with success/failed separation.
+
+    Query params: status (all/success/failed), since/until (timestamps),
+    limit, cursor (from next_cursor) and aggregates (1/0). Responses carry an
+    ETag; a matching If-None-Match returns 304 without re-reading the CSV.
+    """
     try:
-        import csv
-        csv_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'my_orders.csv')
-        
-        if not os.path.exists(csv_file):
+        status = request.args.get('status', 'all').lower()
+        if status not in ('all', 'success', 'failed'):
             return jsonify({
-                "success": True,
-                "orders": {
-                    "success": [],
-                    "failed": []
-                }
-            })
-        
-        success_orders = []
-        failed_orders = []
-        
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                order_data = {
-                    "timestamp": row.get('timestamp', ''),
-                    "screenshot_url": row.get('screenshot_url', ''),
-                    "status": row.get('status', ''),
-                    "pastebin_url": row.get('pastebin_url', '')
-                }
-                
-                # Categorize based on status (case-insensitive)
-                if str(order_data['status']).lower() == 'success':
-                    success_orders.append(order_data)
-                else:
-                    failed_orders.append(order_data)
-        
-        # Sort by timestamp descending (latest first)
-        success_orders.sort(key=lambda x: x['timestamp'], reverse=True)
-        failed_orders.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        return jsonify({
-            "success": True,
-            "orders": {
-                "success": success_orders,
-                "failed": failed_orders
-            },
-            "total": {
-                "success": len(success_orders),
-                "failed": len(failed_orders)
-            }
+                "success": False,
+                "error": "status must be one of: all, success, failed"
+            }), 400
+
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since_dt = parse_timestamp(since) if since else None
+        until_dt = parse_timestamp(until) if until else None
+        if (since and since_dt is None) or (until and until_dt is None):
+            return jsonify({
+                "success": False,
+                "error": "since/until must be 'YYYY-MM-DD HH:MM:SS' or ISO timestamps"
+            }), 400
+
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except (ValueError, TypeError):
+            return jsonify({
+                "success": False,
+                "error": "limit must be a number"
+            }), 400
+
+        cursor = request.args.get('cursor')
+        include_aggregates = request.args.get('aggregates', '1') != '0'
+
+        etag = compute_etag({
+            "status": status, "since": since, "until": until, "limit": limit,
+            "cursor": cursor, "aggregates": include_aggregates
         })
-        
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        try:
+            report = build_report(
+                status=status,
+                since=since_dt,
+                until=until_dt,
+                limit=limit,
+                cursor=cursor,
+                include_aggregates=include_aggregates
+            )
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+
+        response = jsonify({"success": True, **report})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
     except Exception as e:
         return jsonify({
             "success": False,
@@ -449,18 +438,7 @@ def get_user_api_config():
         user = request.current_user
         user_id = user.get('_id') if user else None
         
-        # Load settings from JSON file
-        try:
-            from backend.user_settings_storage import load_user_settings
-        except ImportError:
-            # Fallback for different import paths
-            try:
-                from user_settings_storage import load_user_settings
-            except ImportError:
-                import sys
-                import os
-                sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-                from user_settings_storage import load_user_settings
+        # Load settings (cached in memory, backed by JSON file)
         settings = load_user_settings(user_id) if user_id else {}
         
         # Get API key from JSON settings (preferred) or user object (fallback)
@@ -509,6 +487,23 @@ def get_user_api_config():
             'service': global_settings.get('service', 'pfk')
         }
 
+def _resolve_batch(batch_id=None):
+    """Batch record for batch_id (or the current user's latest), if the user may see it"""
+    user = request.current_user
+    if batch_id:
+        batch = job_queue.get(batch_id)
+        if batch and (batch['user_id'] == user['_id'] or user.get('role') == 'admin'):
+            return batch
+        return None
+    return job_queue.latest_for_user(user['_id'])
+
+def _resolve_logs_dir():
+    """Logs directory for ?batch_id= (or the user's latest batch); falls back to logs/"""
+    batch = _resolve_batch(request.args.get('batch_id'))
+    if batch:
+        return batch_logs_dir(batch['batch_id'])
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+
 @app.route('/api/balance', methods=['GET'])
 @require_auth
 def balance():
@@ -644,7 +639,7 @@ def get_logs_list():
     try:
         import os
         from datetime import datetime
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+        logs_dir = _resolve_logs_dir()
         
         if not os.path.exists(logs_dir):
             return jsonify({
@@ -684,7 +679,7 @@ def view_log_file(filename):
     """View log file content"""
     try:
         import os
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+        logs_dir = _resolve_logs_dir()
         filepath = os.path.join(logs_dir, filename)
         
         # Security: prevent directory traversal
@@ -723,7 +718,7 @@ def download_log_file(filename):
     try:
         import os
         from flask import send_file
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+        logs_dir = _resolve_logs_dir()
         filepath = os.path.join(logs_dir, filename)
         
         # Security: prevent directory traversal
@@ -992,52 +987,8 @@ def automation_start():
         # Clear stop flag
         stop_flag.clear()
         
-        # Clear/Initialize status file
-        try:
-            import json
-            from datetime import datetime
-            status_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'automation_status.json')
-            status_data = {
-                "is_running": True,
-                "success": 0,
-                "failure": 0,
-                "all_products_failed": False,
-                "start_time": datetime.now().isoformat(),
-                "end_time": None
-            }
-            with open(status_file, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f)
-            print(f"[INFO] Status file initialized: {status_file}")
-        except Exception as e:
-            print(f"[WARNING] Failed to initialize status file: {e}")
-        
-        # Clear logs folder before starting new batch
-        try:
-            import shutil
-            logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-            if os.path.exists(logs_dir):
-                # Remove all files in logs directory
-                for filename in os.listdir(logs_dir):
-                    filepath = os.path.join(logs_dir, filename)
-                    try:
-                        if os.path.isfile(filepath):
-                            os.remove(filepath)
-                        elif os.path.isdir(filepath):
-                            shutil.rmtree(filepath)
-                    except Exception as e:
-                        print(f"[WARNING] Failed to remove {filepath}: {e}")
-                print(f"[INFO] Logs folder cleared: {logs_dir}")
-            else:
-                # Create logs directory if it doesn't exist
-                os.makedirs(logs_dir, exist_ok=True)
-                print(f"[INFO] Created logs directory: {logs_dir}")
-        except Exception as e:
-            print(f"[WARNING] Failed to clear logs folder: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # Set user config in environment
-        env = os.environ.copy()
+        # User config for the worker's environment (stored with the batch)
+        env = {}
         env['AUTOMATION_NAME'] = name
         env['AUTOMATION_HOUSE_FLAT'] = house_flat_no
         env['AUTOMATION_LANDMARK'] = landmark
@@ -1083,30 +1034,31 @@ def automation_start():
         env['SEARCH_INPUT'] = search_input
         env['LOCATION_TEXT'] = location_text
         
-        # Start automation worker that will manage parallel execution
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        worker_script = os.path.join(base_dir, 'automation_worker.py')
-        
-        
-        process = subprocess.Popen(
-            [sys.executable, '-u', worker_script],  # -u flag for unbuffered output
-            cwd=base_dir,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=1,
-            universal_newlines=False  # Keep as bytes for better handling
-        )
-        
-        
-        # Start reading output in background threads
-        log_output(process, f"Worker-{process.pid}")
+        # Queue the batch; the scheduler starts it when the host has capacity
+        user = request.current_user
+        try:
+            batch = job_queue.submit(
+                user_id=user['_id'],
+                username=user.get('username', ''),
+                total_orders=total_orders,
+                max_parallel=max_parallel_windows,
+                env=env
+            )
+        except QuotaExceeded as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 429
         
-        active_workers.append(process)
+        scheduler.start()
+        scheduler.wake()
         
         response_data = {
             "success": True,
-            "message": f"Automation started: {total_orders} orders, max {max_parallel_windows} parallel windows",
+            "message": f"Automation queued: {total_orders} orders, max {max_parallel_windows} parallel windows",
+            "batch_id": batch['batch_id'],
+            "state": batch['state'],
+            "queue_position": job_queue.queue_position(batch['batch_id']),
             "total_orders": total_orders,
             "max_parallel_windows": max_parallel_windows
         }
@@ -1124,45 +1076,70 @@ def automation_start():
 @app.route('/api/automation/status', methods=['GET'])
 @require_auth
 def automation_status():
-    """Get current automation status"""
+    """Get current automation status.
+
+    Optional query params: batch_id (defaults to the user's latest batch),
+    since=<seq> with wait=<seconds> long-polls until the status changes,
+    detail=1 includes per-order records.
+    """
     try:
-        import json
-        import os
-        status_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'automation_status.json')
-        
-        if not os.path.exists(status_file):
+        batch = _resolve_batch(request.args.get('batch_id'))
+        if batch is None:
             return jsonify({
                 "success": True,
                 "is_running": False,
-                "success": 0,
-                "failure": 0,
+                "success_count": 0,
+                "failure_count": 0,
                 "all_products_failed": False
             })
-        
+
         try:
-            with open(status_file, 'r', encoding='utf-8') as f:
-                status_data = json.load(f)
-            # Ensure all_products_failed is included (for backward compatibility)
-            if 'all_products_failed' not in status_data:
-                status_data['all_products_failed'] = False
+            since = int(request.args.get('since', -1))
+            wait = min(float(request.args.get('wait', 0)), 30.0)
+        except (ValueError, TypeError):
             return jsonify({
-                "success": True,
-                "is_running": status_data.get('is_running', False),
-                "success_count": status_data.get('success', 0),
-                "failure_count": status_data.get('failure', 0),
-                "all_products_failed": status_data.get('all_products_failed', False),
-                "start_time": status_data.get('start_time'),
-                "end_time": status_data.get('end_time')
-            })
+                "success": False,
+                "error": "since and wait must be numbers"
+            }), 400
+
+        status_channel = StatusChannel(batch_status_path(batch['batch_id']))
+        try:
+            if batch['state'] == 'queued':
+                status_data = {}
+            elif since >= 0 and wait > 0:
+                status_data = status_channel.wait_for_change(since, timeout=wait)
+            else:
+                status_data = status_channel.snapshot()
         except Exception as e:
-            print(f"[ERROR] Failed to read status file: {e}")
+            print(f"[ERROR] Failed to read status channel: {e}")
             return jsonify({
                 "success": True,
                 "is_running": False,
-                "success": 0,
-                "failure": 0,
+                "success_count": 0,
+                "failure_count": 0,
                 "all_products_failed": False
             })
+        finally:
+            status_channel.close()
+
+        response = {
+            "success": True,
+            "batch_id": batch['batch_id'],
+            "state": batch['state'],
+            "queue_position": job_queue.queue_position(batch['batch_id']),
+            "seq": status_data.get('seq', 0),
+            # A queued batch counts as running so the dashboard keeps polling
+            "is_running": batch['state'] == 'queued' or status_data.get('is_running', False),
+            "success_count": status_data.get('success', 0),
+            "failure_count": status_data.get('failure', 0),
+            "total_orders": status_data.get('total_orders', batch['total_orders']),
+            "all_products_failed": status_data.get('all_products_failed', False),
+            "start_time": status_data.get('start_time'),
+            "end_time": status_data.get('end_time')
+        }
+        if request.args.get('detail') == '1':
+            response["orders"] = status_data.get('orders', {})
+        return jsonify(response)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1172,57 +1149,106 @@ def automation_status():
 @app.route('/api/automation/stop', methods=['POST'])
 @require_auth
 def automation_stop():
+    """Stop one batch (batch_id in body) or all of the user's queued/running batches"""
     try:
         config = get_user_api_config()
+        data = request.json or {}
         # Set stop flag
         stop_flag.set()
         
-        # Get all active request IDs from shared state
-        request_ids = get_all_request_ids()
-        
-        # Cancel all active numbers
-        cancelled_count = 0
-        for request_id in request_ids:
-            try:
-                cancel_number(request_id, config['api_key'], config['api_url'])
-                cancelled_count += 1
-            except Exception as e:
-                print(f"Error cancelling {request_id}: {e}")
-        
-        # Terminate all active workers
-        for process in active_workers[:]:
-            try:
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-            except Exception as e:
-                print(f"Error terminating process: {e}")
+        if data.get('batch_id'):
+            batch = _resolve_batch(data['batch_id'])
+            if batch is None:
+                return jsonify({
+                    "success": False,
+                    "error": "Batch not found"
+                }), 404
+            batches = [batch]
+        else:
+            batches = job_queue.list(user_id=request.current_user['_id'], states=('queued', 'running'))
         
-        # Clear lists and shared state
-        active_workers.clear()
-        clear_all_request_ids()
+        # Cancel queued batches and terminate running workers (orders refund their own numbers on SIGTERM)
+        stopped = [b['batch_id'] for b in batches if scheduler.stop_batch(b['batch_id'])]
         
-        # Update status file to mark as stopped
-        try:
-            import json
-            import os
-            from datetime import datetime
-            status_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'automation_status.json')
-            if os.path.exists(status_file):
-                with open(status_file, 'r', encoding='utf-8') as f:
-                    status_data = json.load(f)
-                status_data['is_running'] = False
-                status_data['end_time'] = datetime.now().isoformat()
-                with open(status_file, 'w', encoding='utf-8') as f:
-                    json.dump(status_data, f)
-        except Exception as e:
-            print(f"[WARNING] Failed to update status file on stop: {e}")
+        # Bulk-cancel whatever numbers the stopped batches still hold, in parallel
+        price = GlobalSettings.get_settings().get('price', 0.0)
+        entries = [e for b in batches for e in number_registry.outstanding(batch_id=b['batch_id'])]
+        cancellation = number_registry.cancel_entries(entries, config['api_key'], config['api_url'], price=price)
         
         return jsonify({
             "success": True,
-            "message": f"Stopped all workers and cancelled {cancelled_count} numbers"
+            "stopped_batches": stopped,
+            "cancellation": cancellation,
+            "message": (f"Stopped {len(stopped)} batch(es) and cancelled {cancellation['cancelled']} numbers "
+                        f"(saved {cancellation['money_saved']:.2f}, {cancellation['time_saved_seconds']:.1f}s faster than one by one)")
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/automation/numbers', methods=['GET'])
+@require_auth
+def automation_numbers():
+    """Provider numbers currently held by the user's batches (shared across all worker processes)"""
+    try:
+        batch_ids = {b['batch_id'] for b in job_queue.list(user_id=request.current_user['_id'], limit=100)}
+        numbers = [
+            {k: v for k, v in entry.items() if k != 'api_key'}
+            for entry in number_registry.outstanding()
+            if entry.get('batch_id') in batch_ids
+        ]
+        per_batch = {}
+        for entry in numbers:
+            per_batch[entry['batch_id']] = per_batch.get(entry['batch_id'], 0) + 1
+        return jsonify({
+            "success": True,
+            "numbers": numbers,
+            "per_batch": per_batch
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/automation/otp-stats', methods=['GET'])
+@require_auth
+def automation_otp_stats():
+    """Time-to-OTP distribution per operator/country (one batch with ?batch_id=, else the last N hours)"""
+    try:
+        batch_id = request.args.get('batch_id')
+        if batch_id:
+            if not _resolve_batch(batch_id):
+                return jsonify({"success": False, "error": "Batch not found"}), 404
+            stats = otp_manager.distribution(batch_id=batch_id)
+        else:
+            hours = float(request.args.get('hours', 24))
+            stats = otp_manager.distribution(since=time.time() - hours * 3600)
+        return jsonify({
+            "success": True,
+            "stats": stats
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/automation/batches', methods=['GET'])
+@require_auth
+def automation_batches():
+    """List batches (the user's own; admins see everyone's with ?all=1)"""
+    try:
+        user = request.current_user
+        show_all = user.get('role') == 'admin' and request.args.get('all') == '1'
+        batches = job_queue.list(user_id=None if show_all else user['_id'], limit=100)
+        for batch in batches:
+            batch['queue_position'] = job_queue.queue_position(batch['batch_id']) if batch['state'] == 'queued' else None
+        return jsonify({
+            "success": True,
+            "batches": batches
         })
     except Exception as e:
         return jsonify({
@@ -1274,6 +1300,23 @@ def create_user_admin():
             "error": str(e)
         }), 500
 
+@app.route('/api/admin/user-settings/export', methods=['GET'])
+@require_admin
+def export_user_settings():
+    """Export all users' settings in one response (admin only)"""
+    try:
+        settings = export_all_user_settings()
+        return jsonify({
+            "success": True,
+            "count": len(settings),
+            "settings": settings
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/admin/global-settings', methods=['GET'])
 @require_admin
 def get_global_settings():
@@ -1444,10 +1487,61 @@ def view_failed_log():
             "error": str(e)
         }), 500
 
+@app.route('/api/logs/failures/top', methods=['GET'])
+@require_auth
+def top_failures():
+    """Top failure reasons across the last N batches (from the failure index)"""
+    try:
+        batches = int(request.args.get('batches', 5))
+        limit = int(request.args.get('limit', 10))
+    except (ValueError, TypeError):
+        return jsonify({
+            "success": False,
+            "error": "batches and limit must be numbers"
+        }), 400
+
+    try:
+        result = top_failure_reasons(last_batches=max(1, batches), limit=max(1, limit))
+        return jsonify({"success": True, **result})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/logs/failures', methods=['GET'])
+@require_auth
+def list_failures():
+    """List indexed failed orders, filterable by batch, reason and step"""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except (ValueError, TypeError):
+        return jsonify({
+            "success": False,
+            "error": "limit must be a number"
+        }), 400
+
+    try:
+        failures = query_failures(
+            batch_id=request.args.get('batch'),
+            reason=request.args.get('reason'),
+            step=request.args.get('step'),
+            limit=max(1, limit)
+        )
+        return jsonify({
+            "success": True,
+            "failures": failures
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/screenshots/view', methods=['GET'])
 @require_auth
 def view_screenshot():
-    """Serve a screenshot file"""
+    """Serve a screenshot file (or its capture metadata with ?meta=1)"""
     try:
         filename = request.args.get('filename')
         if not filename:
@@ -1475,6 +1569,13 @@ def view_screenshot():
                 "error": f"Screenshot not found at: {filepath}",
                 "debug_base": base_dir
             }), 404
+
+        if request.args.get('meta') == '1':
+            return jsonify({
+                "success": True,
+                "filename": filename,
+                "metadata": get_screenshot_metadata(filename) or {"file": filename, "captures": []}
+            })
             
         return send_from_directory(screenshots_dir, filename)
         
@@ -1484,6 +1585,21 @@ def view_screenshot():
             "error": str(e)
         }), 500
 
+@app.route('/api/screenshots/list', methods=['GET'])
+@require_auth
+def list_screenshot_files():
+    """List stored screenshots with their order/step/reason metadata"""
+    try:
+        return jsonify({
+            "success": True,
+            "screenshots": list_screenshots()
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 
 # Serve React Frontend (Catch-all route)
 
@@ -1492,4 +1608,10 @@ if __name__ == '__main__':
     port = int(os.environ.get('BACKEND_PORT', '5000'))
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
+    # Resume queued batches (and re-attach to running ones) left from a previous run
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        scheduler.start()
+        # Refund numbers leaked by orders that died with the previous server/worker
+        threading.Thread(target=number_registry.sweep_leaked, args=(pid_alive,), daemon=True).start()
+    
     app.run(debug=debug_mode, host=host, port=port)
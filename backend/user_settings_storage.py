@@ -1,12 +1,40 @@
-"""User settings storage using JSON files"""
+"""User settings storage using JSON files
+
+Settings are served from an in-memory cache and written back to
+``user_settings/<id>.json`` by a background flusher. Saves for the same user
+that arrive within ``WRITE_BEHIND_DELAY`` seconds are coalesced into a single
+atomic write (temp file + fsync + rename), so a reader never sees a truncated
+file and concurrent PUTs never lose each other's fields.
+"""
+import atexit
 import json
 import os
+import tempfile
+import threading
+import time
 from typing import Dict, Any, Optional
 from pathlib import Path
 
 # Directory to store user settings JSON files
 SETTINGS_DIR = Path(__file__).parent.parent / 'user_settings'
 
+# Seconds to wait after a save before writing it to disk (coalesces bursts)
+WRITE_BEHIND_DELAY = float(os.environ.get('SETTINGS_WRITE_DELAY', '0.5'))
+
+# Cache state: user_id -> settings dict, and the mtime of the file it came from
+_cache: Dict[str, Dict[str, Any]] = {}
+_cache_mtimes: Dict[str, float] = {}
+
+# Per-user locks (guarding load-merge-write) and the lock that creates them
+_user_locks: Dict[str, threading.Lock] = {}
+_user_locks_guard = threading.Lock()
+
+# Write-behind queue: user_id -> time the pending write becomes due
+_dirty: Dict[str, float] = {}
+_dirty_cond = threading.Condition()
+_flusher_thread: Optional[threading.Thread] = None
+
+
 def ensure_settings_dir():
     """Ensure the settings directory exists"""
     SETTINGS_DIR.mkdir(exist_ok=True)
@@ -18,48 +46,147 @@ def get_settings_file_path(user_id: str) -> Path:
     safe_user_id = user_id.replace('/', '_').replace('\\', '_').replace('..', '_')
     return SETTINGS_DIR / f"{safe_user_id}.json"
 
-def load_user_settings(user_id: str) -> Dict[str, Any]:
-    """Load user settings from JSON file"""
-    settings_file = get_settings_file_path(user_id)
-    
+def _get_user_lock(user_id: str) -> threading.Lock:
+    """Get (or create) the lock serializing access to one user's settings"""
+    with _user_locks_guard:
+        lock = _user_locks.get(user_id)
+        if lock is None:
+            lock = threading.Lock()
+            _user_locks[user_id] = lock
+        return lock
+
+def _file_mtime(settings_file: Path) -> Optional[float]:
+    try:
+        return settings_file.stat().st_mtime
+    except OSError:
+        return None
+
+def _read_settings_file(user_id: str, settings_file: Path) -> Dict[str, Any]:
+    """Read and parse a settings file, returning {} if missing or corrupt"""
     if not settings_file.exists():
         return {}
-    
     try:
         with open(settings_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
     except (json.JSONDecodeError, IOError) as e:
         print(f"[WARNING] Failed to load settings for user {user_id}: {e}")
         return {}
 
+def _write_settings_file(settings_file: Path, settings: Dict[str, Any]):
+    """Atomically replace a settings file (temp file in same dir + rename)"""
+    ensure_settings_dir()
+    fd, temp_path = tempfile.mkstemp(dir=str(SETTINGS_DIR), prefix='.settings_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, settings_file)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def _load_cached(user_id: str) -> Dict[str, Any]:
+    """Return the cached settings dict for a user (caller holds the user lock)"""
+    settings_file = get_settings_file_path(user_id)
+    with _dirty_cond:
+        pending = user_id in _dirty
+
+    if user_id in _cache:
+        # Pick up edits made to the file outside this process, unless we have
+        # our own unflushed changes (those win and will overwrite the file)
+        if pending or _file_mtime(settings_file) == _cache_mtimes.get(user_id):
+            return _cache[user_id]
+
+    _cache[user_id] = _read_settings_file(user_id, settings_file)
+    _cache_mtimes[user_id] = _file_mtime(settings_file)
+    return _cache[user_id]
+
+def load_user_settings(user_id: str) -> Dict[str, Any]:
+    """Load user settings (served from cache, read from JSON file on miss)"""
+    with _get_user_lock(user_id):
+        return dict(_load_cached(user_id))
+
+def _flush_user(user_id: str) -> Dict[str, Any]:
+    """Write one user's cached settings to disk"""
+    with _get_user_lock(user_id):
+        with _dirty_cond:
+            _dirty.pop(user_id, None)
+        settings = _cache.get(user_id)
+        if settings is None:
+            return {'success': True}
+        settings_file = get_settings_file_path(user_id)
+        try:
+            _write_settings_file(settings_file, settings)
+            _cache_mtimes[user_id] = _file_mtime(settings_file)
+            return {'success': True}
+        except Exception as e:
+            print(f"[ERROR] Failed to save settings for user {user_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            # Keep it dirty so the next flush retries
+            with _dirty_cond:
+                _dirty[user_id] = time.time() + WRITE_BEHIND_DELAY
+                _dirty_cond.notify()
+            return {'success': False, 'error': str(e)}
+
+def _flusher_loop():
+    """Background thread: write out dirty users once their delay expires"""
+    while True:
+        with _dirty_cond:
+            while not _dirty:
+                _dirty_cond.wait()
+            now = time.time()
+            due = [uid for uid, when in _dirty.items() if when <= now]
+            if not due:
+                _dirty_cond.wait(timeout=max(0.0, min(_dirty.values()) - now))
+                continue
+        for user_id in due:
+            _flush_user(user_id)
+
+def _ensure_flusher():
+    global _flusher_thread
+    with _dirty_cond:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(target=_flusher_loop, name='settings-flusher', daemon=True)
+            _flusher_thread.start()
+
+def flush_user_settings(user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Write pending settings to disk now (one user, or everyone if user_id is None)"""
+    with _dirty_cond:
+        user_ids = [user_id] if user_id is not None else list(_dirty.keys())
+    errors = {}
+    for uid in user_ids:
+        result = _flush_user(uid)
+        if not result.get('success'):
+            errors[uid] = result.get('error')
+    if errors:
+        return {'success': False, 'error': f"Failed to flush settings for {len(errors)} user(s)", 'errors': errors}
+    return {'success': True}
+
 def save_user_settings(user_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
-    """Save user settings to JSON file (merge with existing settings)"""
+    """Save user settings (merge with existing settings, written to disk in the background)"""
     print(f"[DEBUG] save_user_settings - User ID: {user_id}")
-    print(f"[DEBUG] save_user_settings - Settings received: {settings}")
     print(f"[DEBUG] save_user_settings - Settings keys: {list(settings.keys())}")
-    
-    ensure_settings_dir()
-    settings_file = get_settings_file_path(user_id)
-    print(f"[DEBUG] save_user_settings - Settings file path: {settings_file}")
-    
-    # Load existing settings
-    existing_settings = load_user_settings(user_id)
-    print(f"[DEBUG] save_user_settings - Existing settings: {existing_settings}")
-    
-    # Merge new settings with existing
-    existing_settings.update(settings)
-    print(f"[DEBUG] save_user_settings - Merged settings: {existing_settings}")
-    
+
     try:
-        with open(settings_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_settings, f, indent=2, ensure_ascii=False)
-        print(f"[DEBUG] save_user_settings - Settings saved successfully to {settings_file}")
+        with _get_user_lock(user_id):
+            # Merge new settings with existing (cache holds the latest view)
+            merged = dict(_load_cached(user_id))
+            merged.update(settings)
+            _cache[user_id] = merged
+
+            with _dirty_cond:
+                # Keep the original due time so a steady stream of saves still flushes
+                _dirty.setdefault(user_id, time.time() + WRITE_BEHIND_DELAY)
+                _dirty_cond.notify()
+        _ensure_flusher()
+        print(f"[DEBUG] save_user_settings - Settings cached, write-behind scheduled")
         return {'success': True, 'message': 'Settings saved successfully'}
-    except IOError as e:
-        print(f"[ERROR] Failed to save settings for user {user_id}: {e}")
-        import traceback
-        traceback.print_exc()
-        return {'success': False, 'error': str(e)}
     except Exception as e:
         print(f"[ERROR] Unexpected error saving settings for user {user_id}: {e}")
         import traceback
@@ -70,3 +197,14 @@ def update_user_settings(user_id: str, settings: Dict[str, Any]) -> Dict[str, An
     """Update user settings (same as save_user_settings, but with different name for compatibility)"""
     return save_user_settings(user_id, settings)
 
+def export_all_user_settings() -> Dict[str, Dict[str, Any]]:
+    """Export settings for every user (admin bulk export), including unflushed changes"""
+    ensure_settings_dir()
+    user_ids = set(_cache.keys())
+    for settings_file in SETTINGS_DIR.glob('*.json'):
+        user_ids.add(settings_file.stem)
+    return {user_id: load_user_settings(user_id) for user_id in sorted(user_ids)}
+
+
+# Don't lose write-behind saves when the server shuts down
+atexit.register(flush_user_settings)
@@ -0,0 +1,165 @@
+"""
+Local mock of the DealShare checkout for benchmarks
+
+Serves a product page, bag drawer, location modal, payment list and
+place-order button that use the live site's class names (the ones main.py
+selects on), each with the kind of CSS animation/transition the real site
+has. Nothing here talks to the network.
+
+    with MockStorefront() as shop:
+        page.goto(shop.url("/product/1"))
+
+Run directly to browse it: python benchmarks/mock_storefront.py [port]
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STYLE = """
+body { font-family: sans-serif; margin: 0; }
+header { display: flex; justify-content: space-between; padding: 12px; }
+header img { width: 32px; height: 32px; cursor: pointer; }
+.spacer { height: 900px; }
+@keyframes fadeIn { from { opacity: 0; transform: translateY(12px); } to { opacity: 1; transform: none; } }
+@keyframes pop { from { opacity: 0; transform: scale(.8); } to { opacity: 1; transform: none; } }
+.ActionSection_container__ertTt { display: none; padding: 16px; }
+.ActionSection_container__ertTt.shown { display: block; animation: fadeIn .6s ease-out; }
+.drawer { position: fixed; top: 0; right: 0; width: 320px; height: 100%; background: #fff;
+          box-shadow: -2px 0 8px #0003; transform: translateX(100%); transition: transform .5s ease; }
+.drawer.open { transform: none; }
+.modal { position: fixed; inset: 30% 25%; background: #fff; border: 1px solid #ccc; padding: 24px;
+         animation: pop .4s ease-out; }
+.Payment_methodItem__BLz7I { padding: 16px; border: 1px solid #ddd; margin: 8px; animation: fadeIn .5s; }
+.toast { position: fixed; bottom: 24px; left: 24px; padding: 12px; background: #2e7d32; color: #fff;
+         animation: fadeIn .4s; }
+"""
+
+BAG_SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="32" height="32">'
+           '<rect x="4" y="8" width="24" height="20" fill="#333"/></svg>')
+
+PRODUCT_PAGE = """<!doctype html>
+<html><head><title>Product %(id)s</title><style>%(style)s</style></head>
+<body>
+<header><span>Mock DealShare</span><img src="/static/bag.svg" alt="bag"></header>
+<h1>Product %(id)s</h1>
+<div class="ActionSection_container__ertTt"><button class="add-button">ADD</button>
+  <span class="AddButton_quantity-text__enpVI" hidden>0</span></div>
+<div class="drawer"><h2>Bag</h2><p class="items"></p>
+  <button class="AddToCart_cartButton__tWwqP" onclick="location.href='/checkout'">Proceed</button></div>
+<script>
+  // Simulates hydration: the ADD button shows up a moment after load, with a fade-in
+  setTimeout(() => document.querySelector('.ActionSection_container__ertTt').classList.add('shown'), 300);
+  document.querySelector('.add-button').addEventListener('click', async () => {
+    await fetch('/api/cart/add', {method: 'POST', headers: {'Content-Type': 'application/json'},
+                                  body: JSON.stringify({productId: '%(id)s', quantity: 1})});
+    const qty = document.querySelector('.AddButton_quantity-text__enpVI');
+    qty.textContent = String(Number(qty.textContent) + 1);
+    qty.hidden = false;
+  });
+  document.querySelector('header img').addEventListener('click', () => {
+    document.querySelector('.items').textContent = 'Product %(id)s';
+    document.querySelector('.drawer').classList.add('open');
+  });
+</script>
+</body></html>
+"""
+
+CHECKOUT_PAGE = """<!doctype html>
+<html><head><title>Checkout</title><style>%(style)s</style></head>
+<body>
+<h1>Checkout</h1>
+<div class="modal"><p>Your location has changed</p><button onclick="this.parentElement.remove()">Proceed</button></div>
+<div class="spacer"></div>
+<div class="payment">
+  <div class="Payment_methodItem__BLz7I"><p>UPI</p></div>
+  <div class="Payment_methodItem__BLz7I"><img alt="COD" width="16" height="16"
+       src="/static/bag.svg"><p>Cash on Delivery</p></div>
+</div>
+<div class="spacer"></div>
+<button class="CodView_orderButton__E53_u" type="button">Place Order</button>
+<script>
+  document.querySelectorAll('.Payment_methodItem__BLz7I').forEach((el) =>
+    el.addEventListener('click', () => el.style.borderColor = '#2e7d32'));
+  document.querySelector('.CodView_orderButton__E53_u').addEventListener('click', async () => {
+    const response = await fetch('/api/order/place', {method: 'POST'});
+    const order = await response.json();
+    const toast = document.createElement('div');
+    toast.className = 'toast';
+    toast.textContent = 'Order Placed #' + order.orderId;
+    document.body.appendChild(toast);
+  });
+</script>
+</body></html>
+"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockStorefront/1.0"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path.startswith('/product/'):
+            product_id = path.rsplit('/', 1)[-1]
+            self._send(200, PRODUCT_PAGE % {"id": product_id, "style": STYLE}, "text/html")
+        elif path == '/checkout':
+            self._send(200, CHECKOUT_PAGE % {"style": STYLE}, "text/html")
+        elif path == '/static/bag.svg':
+            self._send(200, BAG_SVG, "image/svg+xml")
+        else:
+            self._send(404, "not found", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        path = self.path.split('?')[0]
+        if path == '/api/cart/add':
+            self._send(200, json.dumps({"success": True}), "application/json")
+        elif path == '/api/order/place':
+            self.server.orders += 1
+            order = {"success": True, "orderId": f"MOCK{int(time.time())}{self.server.orders}", "amount": 99.0}
+            self._send(200, json.dumps(order), "application/json")
+        else:
+            self._send(404, json.dumps({"success": False}), "application/json")
+
+
+class MockStorefront:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.orders = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str = "/") -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    with MockStorefront(port=port) as shop:
+        print(f"Mock storefront on {shop.url('/product/1')} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,102 @@
+"""
+Per-order time saved by SUPPRESS_MOTION, measured on the mock storefront
+
+Runs the same scripted order (ADD, bag drawer, checkout, location modal,
+COD, place order) through main.py's helpers, once with animations and once
+with motion suppressed, and prints the per-order timings of both.
+
+    python benchmarks/motion_benchmark.py --orders 5
+    python benchmarks/motion_benchmark.py --orders 5 --no-readiness   # legacy selector waits
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.sync_api import sync_playwright
+
+import main
+import motion
+from readiness import Readiness
+from mock_storefront import MockStorefront
+
+
+def run_order(page, shop):
+    """One mock checkout with the same waits/settles as main.py; returns seconds"""
+    started = time.time()
+    page.goto(shop.url("/product/1"))
+    main.click_add_button(page)
+
+    page.locator("img[src*='bag']").first.click()
+    if main.wait_ready(page, "cart_drawer", timeout=2000) is None:
+        time.sleep(2)
+    main.proceed_to_checkout(page)
+    page.wait_for_url("**/checkout")
+
+    # Location change modal
+    modal_btn = page.locator("button:has-text('Proceed')")
+    modal_btn.wait_for(state="visible", timeout=5000)
+    main.robust_click(page, modal_btn, method="locator")
+    motion.settle(2)
+
+    if main.wait_ready(page, "payment_list", timeout=6000) is None:
+        time.sleep(6)
+    cod = page.locator("div.Payment_methodItem__BLz7I:has-text('Cash on Delivery')").first
+    cod.scroll_into_view_if_needed(timeout=3000)
+    motion.settle(0.5)
+    cod.click(force=True, timeout=3000)
+
+    place_btn = page.locator("button.CodView_orderButton__E53_u").first
+    place_btn.scroll_into_view_if_needed()
+    motion.settle(1)
+    place_btn.click(timeout=3000)
+    page.locator("text=Order Placed").wait_for(timeout=5000)
+    return time.time() - started
+
+
+def run_mode(playwright, shop, suppress, orders, readiness, headless):
+    browser = playwright.chromium.launch(headless=headless)
+    try:
+        context = browser.new_context(viewport={"width": 1280, "height": 720},
+                                      **motion.context_options(suppress))
+        motion.reset()
+        if suppress:
+            motion.install(context)
+        main.readiness_signals = Readiness(context) if readiness else None
+        page = context.new_page()
+        run_order(page, shop)  # warm-up (browser caches, JIT)
+        return [run_order(page, shop) for _ in range(orders)]
+    finally:
+        main.readiness_signals = None
+        motion.reset()
+        browser.close()
+
+
+def summarize(label, timings):
+    print(f"{label:<12} orders={len(timings):<3} mean={statistics.mean(timings):6.2f}s "
+          f"median={statistics.median(timings):6.2f}s min={min(timings):6.2f}s max={max(timings):6.2f}s")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=5, help="measured orders per mode")
+    parser.add_argument("--no-readiness", action="store_true", help="use the legacy selector waits")
+    parser.add_argument("--headed", action="store_true")
+    args = parser.parse_args()
+
+    with MockStorefront() as shop, sync_playwright() as p:
+        animated = run_mode(p, shop, False, args.orders, not args.no_readiness, not args.headed)
+        suppressed = run_mode(p, shop, True, args.orders, not args.no_readiness, not args.headed)
+
+    print()
+    summarize("animations", animated)
+    summarize("suppressed", suppressed)
+    saved = statistics.mean(animated) - statistics.mean(suppressed)
+    print(f"Saved per order: {saved:.2f}s ({saved / statistics.mean(animated) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main_cli()
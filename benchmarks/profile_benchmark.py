@@ -0,0 +1,216 @@
+"""
+Desktop vs mobile execution profile: bytes transferred, renderer RSS, per-step latency
+
+Each profile runs in its own child process (EXECUTION_PROFILE is read when
+main.py is imported). Every run uses a fresh context, so bytes are cold-cache
+transfer sizes. Renderer RSS is the summed resident memory of the browser's
+renderer processes after the last step.
+
+The live run goes as far as the bag drawer (homepage, location, product page,
+bag) and needs no phone number or login. --mock replays a short checkout on
+benchmarks/mock_storefront.py. The mock serves the same markup to both
+profiles, so use it to check the harness rather than to compare bundles.
+
+    python benchmarks/profile_benchmark.py --runs 3
+    python benchmarks/profile_benchmark.py --runs 3 --product https://www.dealshare.in/pname/...
+    python benchmarks/profile_benchmark.py --mock
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROFILE_NAMES = ["desktop", "mobile"]
+
+
+def process_rss(pid):
+    """Resident memory of a process in bytes (psutil, else /proc), None if unknown"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def renderer_rss(browser):
+    """Summed RSS of the browser's renderer processes"""
+    session = browser.new_browser_cdp_session()
+    try:
+        info = session.send("SystemInfo.getProcessInfo")
+    finally:
+        session.detach()
+    sizes = [process_rss(p["id"]) for p in info["processInfo"] if p.get("type") == "renderer"]
+    sizes = [s for s in sizes if s is not None]
+    return sum(sizes) if sizes else None
+
+
+class StepMeter:
+    """Per-step wall time and encoded bytes received (CDP Network.loadingFinished)"""
+
+    def __init__(self, context, page):
+        self.received = 0
+        self.steps = {}
+        session = context.new_cdp_session(page)
+        session.on("Network.loadingFinished", self._on_finished)
+        session.send("Network.enable")
+
+    def _on_finished(self, event):
+        self.received += event.get("encodedDataLength", 0)
+
+    def run(self, name, fn):
+        started, received = time.time(), self.received
+        fn()
+        self.steps[name] = {"seconds": time.time() - started, "bytes": self.received - received}
+
+
+def live_steps(main, page, product_url):
+    def home():
+        page.goto(main.HOME_URL, timeout=60000, wait_until="load")
+
+    def location():
+        main.select_location(page, *main.location_settings())
+
+    def product():
+        page.goto(product_url, timeout=60000)
+        page.locator(main.ADD_BUTTON_SELECTOR).or_(page.get_by_text(main.OOS_TEXT_RE)).first.wait_for(timeout=30000)
+
+    def bag():
+        page.locator(main.BAG_ICON_SELECTOR).first.click(force=True)
+        if main.wait_ready(page, "cart_drawer", timeout=5000) is None:
+            time.sleep(2)
+
+    steps = [("home", home), ("location", location)]
+    if product_url:
+        steps += [("product", product), ("bag", bag)]
+    return steps
+
+
+def mock_steps(main, page, shop):
+    def product():
+        page.goto(shop.url("/product/1"))
+        main.click_add_button(page)
+
+    def bag():
+        page.locator(main.BAG_ICON_SELECTOR).first.click()
+        page.locator("button.AddToCart_cartButton__tWwqP").wait_for(state="visible", timeout=5000)
+
+    def checkout():
+        main.proceed_to_checkout(page)
+        page.wait_for_url("**/checkout")
+        page.locator("div.Payment_methodItem__BLz7I").first.wait_for(timeout=5000)
+
+    return [("product", product), ("bag", bag), ("checkout", checkout)]
+
+
+def run_profile(args):
+    """Child process: run the steps under EXECUTION_PROFILE and print one JSON line"""
+    from playwright.sync_api import sync_playwright
+    import main
+
+    shop = None
+    if args.mock:
+        from mock_storefront import MockStorefront
+        shop = MockStorefront().__enter__()
+    product_url = args.product
+    if not product_url and not args.mock:
+        urls, _ = main.load_products()
+        product_url = urls[0] if urls else None
+
+    runs = []
+    try:
+        with sync_playwright() as p:
+            browser = main.launch_browser(p)
+            for _ in range(args.runs):
+                context = main.new_checkout_context(browser)
+                page = context.new_page()
+                meter = StepMeter(context, page)
+                steps = mock_steps(main, page, shop) if shop else live_steps(main, page, product_url)
+                for name, fn in steps:
+                    meter.run(name, fn)
+                runs.append({"steps": meter.steps, "renderer_rss": renderer_rss(browser)})
+                context.close()
+            browser.close()
+    finally:
+        if shop:
+            shop.__exit__(None, None, None)
+    print("PROFILE_RESULT " + json.dumps(runs))
+
+
+def collect(profile, args):
+    """Run one profile in a child process and return its runs"""
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--runs", str(args.runs)]
+    if args.mock:
+        command.append("--mock")
+    if args.product:
+        command += ["--product", args.product]
+    env = dict(os.environ, EXECUTION_PROFILE=profile)
+    output = subprocess.run(command, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    for line in output.stdout.splitlines():
+        if line.startswith("PROFILE_RESULT "):
+            return json.loads(line[len("PROFILE_RESULT "):])
+    raise RuntimeError(f"{profile} run failed:\n{output.stdout[-2000:]}\n{output.stderr[-2000:]}")
+
+
+def summarize(results):
+    step_names = list(results[PROFILE_NAMES[0]][0]["steps"])
+    print(f"{'step':<12}" + "".join(f"{name + ' s':>14}{name + ' KB':>14}" for name in PROFILE_NAMES))
+    for step in step_names + ["total"]:
+        row = f"{step:<12}"
+        for name in PROFILE_NAMES:
+            runs = results[name]
+            if step == "total":
+                seconds = [sum(s["seconds"] for s in run["steps"].values()) for run in runs]
+                received = [sum(s["bytes"] for s in run["steps"].values()) for run in runs]
+            else:
+                seconds = [run["steps"][step]["seconds"] for run in runs]
+                received = [run["steps"][step]["bytes"] for run in runs]
+            row += f"{statistics.mean(seconds):>14.2f}{statistics.mean(received) / 1024:>14.0f}"
+        print(row)
+
+    rss = {}
+    for name in PROFILE_NAMES:
+        values = [run["renderer_rss"] for run in results[name] if run["renderer_rss"]]
+        rss[name] = statistics.mean(values) if values else None
+    print()
+    for name in PROFILE_NAMES:
+        value = f"{rss[name] / 1024 / 1024:.0f} MB" if rss[name] else "n/a"
+        print(f"Renderer RSS ({name}): {value}")
+    if all(rss.values()):
+        print(f"Windows per host vs desktop (by renderer memory): x{rss['desktop'] / rss['mobile']:.2f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="fresh contexts per profile")
+    parser.add_argument("--product", help="product URL for the live run (default: first of PRODUCTS_JSON)")
+    parser.add_argument("--mock", action="store_true", help="use the local mock storefront")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args)
+        return
+    results = {name: collect(name, args) for name in PROFILE_NAMES}
+    summarize(results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,176 @@
+"""
+Direct cart API mode (CART_API_MODE=1)
+
+The storefront updates the cart through its own XHR/fetch calls. A CartApi
+listens to the requests of one page (one tab, so parallel product tabs never
+see each other's calls) and remembers the cart-mutating calls whose JSON body
+carries a quantity field (normally the one fired by the ADD button), together
+with the product page they came from. set_quantity() replays the latest call
+made on the product's page with the context's request client (same
+cookies/auth) to set a quantity in one call instead of clicking "+" N-1 times.
+When the replayed call is the ADD one, the storefront may treat its quantity
+as an increment, so the caller has to re-read the cart and correct it.
+
+Only the product's own line item is changed. It is the item whose id fields
+match an id in the product URL, or else the body's only line item. Whole-cart
+bodies where the product can't be singled out are never replayed.
+
+Nothing here depends on a hard-coded endpoint: if no matching request was
+captured, the line item can't be located, or the replay is rejected,
+set_quantity() returns False and the caller falls back to UI clicks.
+"""
+import copy
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+CART_API_MODE = os.environ.get('CART_API_MODE', '0') == '1'
+
+CART_URL_HINTS = ('cart', 'bag', 'basket')
+QUANTITY_KEYS = ('quantity', 'qty', 'count', 'quantitycount', 'itemquantity')
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH')
+# Fields that identify a line item's product
+ID_KEYS = ('productid', 'product_id', 'variantid', 'variant_id', 'skuid', 'sku_id', 'sku', 'pid', 'itemid', 'item_id', 'id')
+# Headers the browser computes itself; everything else (auth tokens, app headers) is replayed
+SKIP_HEADERS = ('content-length', 'host', 'cookie', 'connection', 'accept-encoding')
+
+
+def find_quantity_paths(body: Any, path: Tuple = ()) -> List[Tuple]:
+    """Paths (tuples of keys/indexes) to integer quantity fields in a JSON body"""
+    paths = []
+    if isinstance(body, dict):
+        for key, value in body.items():
+            if isinstance(key, str) and key.lower() in QUANTITY_KEYS and isinstance(value, int) \
+                    and not isinstance(value, bool):
+                paths.append(path + (key,))
+            else:
+                paths.extend(find_quantity_paths(value, path + (key,)))
+    elif isinstance(body, list):
+        for index, value in enumerate(body):
+            paths.extend(find_quantity_paths(value, path + (index,)))
+    return paths
+
+
+def product_ids(product_url: str) -> Set[str]:
+    """Id-like tokens of a product URL: path segments and query values containing a digit"""
+    parts = urlsplit(product_url)
+    tokens = [segment for segment in parts.path.split('/') if segment]
+    tokens += [value for _, value in parse_qsl(parts.query)]
+    return {token.lower() for token in tokens if len(token) >= 3 and re.search(r'\d', token)}
+
+
+def _page_key(url: str) -> str:
+    """A page URL without query/fragment, for matching captures to a product page"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}".rstrip('/').lower()
+
+
+def line_items(body: Any) -> List[Dict[str, Any]]:
+    """Dicts in the body that directly carry an integer quantity field"""
+    items = []
+    for path in find_quantity_paths(body):
+        parent = body
+        for key in path[:-1]:
+            parent = parent[key]
+        if not any(parent is item for item in items):
+            items.append(parent)
+    return items
+
+
+def quantity_key(item: Dict[str, Any]) -> Optional[str]:
+    """The item's quantity field, by QUANTITY_KEYS priority"""
+    names = {k.lower(): k for k in item if isinstance(k, str)}
+    for key in QUANTITY_KEYS:
+        if key in names and isinstance(item[names[key]], int) and not isinstance(item[names[key]], bool):
+            return names[key]
+    return None
+
+
+def find_line_item(body: Any, product_url: str) -> Optional[Dict[str, Any]]:
+    """The product's line item: the one whose id fields match the URL, else the only one. None if ambiguous."""
+    items = line_items(body)
+    ids = product_ids(product_url)
+    matches = [
+        item for item in items
+        if any(isinstance(k, str) and k.lower() in ID_KEYS and str(v).lower() in ids for k, v in item.items())
+    ]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches and len(items) == 1:
+        return items[0]
+    return None
+
+
+class CartApi:
+    def __init__(self, page):
+        self.page = page
+        self.context = page.context
+        self.captured: List[Dict[str, Any]] = []
+        page.on("request", self._on_request)
+
+    def _on_request(self, req):
+        try:
+            if req.resource_type not in ('xhr', 'fetch') or req.method not in MUTATING_METHODS:
+                return
+            if not any(hint in req.url.lower() for hint in CART_URL_HINTS):
+                return
+            body = req.post_data_json
+        except Exception:
+            return
+        if not isinstance(body, (dict, list)) or not find_quantity_paths(body):
+            return
+        try:
+            page_url = req.frame.url
+        except Exception:
+            page_url = self.page.url
+        self.captured.append({
+            "page_url": page_url,
+            "url": req.url,
+            "method": req.method,
+            "headers": {k: v for k, v in req.headers.items() if k.lower() not in SKIP_HEADERS},
+            "body": body,
+            "time": time.time(),
+        })
+        print(f"🔎 Captured cart request: {req.method} {req.url.split('?')[0]}")
+
+    def reset(self):
+        """Forget captured calls (they carry the logged-in account's headers)"""
+        self.captured.clear()
+
+    def template(self, product_url: str, since: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Latest cart call captured on the product's page (optionally only those after `since`)"""
+        key = _page_key(product_url)
+        candidates = [c for c in self.captured if c["time"] >= since and _page_key(c["page_url"]) == key]
+        return candidates[-1] if candidates else None
+
+    def set_quantity(self, quantity: int, product_url: str, since: float = 0.0) -> bool:
+        """Replay the product's captured cart call with the target quantity. False if not possible."""
+        template = self.template(product_url, since)
+        if not template:
+            print("⚠️ Cart API: no cart request captured for this product")
+            return False
+        body = copy.deepcopy(template["body"])
+        item = find_line_item(body, product_url)
+        if item is None:
+            print("⚠️ Cart API: can't single out this product's line item in the cart request")
+            return False
+        item[quantity_key(item)] = quantity
+        try:
+            response = self.context.request.fetch(
+                template["url"],
+                method=template["method"],
+                headers=template["headers"],
+                data=json.dumps(body),
+                timeout=10000
+            )
+        except Exception as e:
+            print(f"⚠️ Cart API request failed: {e}")
+            return False
+        if not response.ok:
+            print(f"⚠️ Cart API rejected quantity update: HTTP {response.status}")
+            return False
+        print(f"⚡ Cart API: quantity {quantity} sent in one request")
+        return True
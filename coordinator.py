@@ -0,0 +1,376 @@
+"""
+Central coordinator for distributed order execution
+
+The coordinator owns the order queue and the batch status. Stateless worker
+agents (worker_agent.py), on this host or others, connect over TCP and speak
+line-delimited JSON:
+
+    agent -> coordinator
+        {"type": "hello", "agent_id": "...", "host": "...", "slots": 4, "token": "..."}
+        {"type": "pull"}                                    ask for one order
+        {"type": "started", "order": 3, "pid": 1234}
+        {"type": "log", "order": 3, "stream": "stdout", "line": "..."}
+        {"type": "result", "order": 3, "return_code": 0}
+        {"type": "heartbeat", "orders": [3, 7]}
+
+    coordinator -> agent
+        {"type": "welcome", "env": {...}, "heartbeat_interval": 5}
+        {"type": "order", "order": 3, "attempt": 1}
+        {"type": "wait", "retry_in": 1.0}                   nothing to hand out right now
+        {"type": "stop"}                                    batch is over, kill running orders
+        {"type": "error", "message": "..."}
+
+An agent that disconnects or misses heartbeats for heartbeat_timeout seconds
+is dropped. Its in-flight orders go back to the front of the queue, and
+this doesn't count as the order's retry. Results from an agent whose orders
+were already requeued are ignored.
+
+The welcome carries the batch environment, API key included, so every agent
+must present the batch token. The coordinator binds to 127.0.0.1 unless
+COORDINATOR_BIND says otherwise, and it refuses a non-loopback address
+without COORDINATOR_TOKEN. On loopback without one, a random token is
+generated and handed to the local agent.
+"""
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set
+
+DEFAULT_PORT = 8765
+HEARTBEAT_INTERVAL = float(os.environ.get('AGENT_HEARTBEAT_INTERVAL', '5'))
+HEARTBEAT_TIMEOUT = float(os.environ.get('AGENT_HEARTBEAT_TIMEOUT', '30'))
+
+# Environment passed to agents so main.py runs with the batch's settings
+FORWARDED_ENV_KEYS = {
+    'API_KEY', 'API_URL', 'COUNTRY', 'OPERATOR', 'SERVICE', 'PRODUCTS_JSON', 'ORDER_ALL',
+    'LATITUDE', 'LONGITUDE', 'SELECT_LOCATION', 'SEARCH_INPUT', 'LOCATION_TEXT', 'BATCH_ID',
+    'CART_API_MODE', 'PARALLEL_CART_TABS', 'OTP_POLL_INTERVAL', 'READINESS',
+    'SUPPRESS_MOTION', 'EXECUTION_PROFILE', 'LOCATION_FAST_PATH', 'PRELOAD_DURING_OTP', 'ORDER_TRACE',
+}
+FORWARDED_ENV_PREFIXES = ('AUTOMATION_', 'PRIMARY_', 'SECONDARY_', 'THIRD_', 'SCREENSHOT_')
+
+
+def forwarded_env(environ=None) -> Dict[str, str]:
+    """The subset of the environment that agents need to run orders"""
+    environ = os.environ if environ is None else environ
+    extra = {k.strip() for k in environ.get('AGENT_FORWARD_ENV', '').split(',') if k.strip()}
+    return {
+        key: value for key, value in environ.items()
+        if key in FORWARDED_ENV_KEYS or key in extra or key.startswith(FORWARDED_ENV_PREFIXES)
+    }
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def send_message(wfile, message: Dict[str, Any], lock: Optional[threading.Lock] = None):
+    """Write one JSON line (wfile is a binary socket file)"""
+    data = (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+    if lock:
+        with lock:
+            wfile.write(data)
+            wfile.flush()
+    else:
+        wfile.write(data)
+        wfile.flush()
+
+
+def read_message(rfile) -> Optional[Dict[str, Any]]:
+    """Read one JSON line; None on EOF"""
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+class AgentConnection:
+    def __init__(self, agent_id: str, host: str, slots: int, wfile, sock: socket.socket):
+        self.agent_id = agent_id
+        self.host = host
+        self.slots = slots
+        self.wfile = wfile
+        self.sock = sock
+        self.orders: Set[int] = set()
+        self.last_seen = time.time()
+        self.send_lock = threading.Lock()
+        self.alive = True
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        try:
+            send_message(self.wfile, message, self.send_lock)
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.coordinator._serve_agent(self)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator:
+    def __init__(self, total_orders: int, retry_orders: bool = False,
+                 host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 env: Optional[Dict[str, str]] = None, token: Optional[str] = None,
+                 on_status: Optional[Callable[[int, int], None]] = None,
+                 on_order: Optional[Callable[..., None]] = None,
+                 log: Optional[Callable[..., None]] = None,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        self.total_orders = total_orders
+        self.retry_orders = retry_orders
+        self.host = host
+        self.port = port
+        self.env = forwarded_env() if env is None else env
+        self.token = token
+        self.on_status = on_status or (lambda success, failure: None)
+        self.on_order = on_order or (lambda order_num, **fields: None)
+        self.log = log or (lambda message, worker_id=None: print(message))
+        self.heartbeat_timeout = heartbeat_timeout
+
+        self.pending = deque(range(1, total_orders + 1))
+        self.assignments: Dict[int, str] = {}
+        self.attempts: Dict[int, int] = {}
+        self.retried: Set[int] = set()
+        self.agents: Dict[str, AgentConnection] = {}
+        self.success = 0
+        self.failure = 0
+        self.completed = 0
+        self.all_products_failed = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._server: Optional[_Server] = None
+
+    # -----------------------------
+    # LIFECYCLE
+    # -----------------------------
+    def start(self):
+        if not self.token:
+            if not is_loopback(self.host):
+                raise ValueError(f"Refusing to listen on {self.host} without COORDINATOR_TOKEN: "
+                                 "agents receive the batch environment, including API_KEY")
+            self.token = secrets.token_urlsafe(16)
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.coordinator = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='coordinator', daemon=True).start()
+        self.log(f"[INFO] Coordinator listening on {self.host}:{self.port} for {self.total_orders} orders")
+
+    def run(self, poll_interval: float = 1.0) -> Dict[str, Any]:
+        """Serve agents until every order is done (or the batch is stopped)"""
+        if self._server is None:
+            self.start()
+        try:
+            while not self._done.wait(poll_interval):
+                self._drop_silent_agents()
+        finally:
+            self.shutdown()
+        return {"success": self.success, "failure": self.failure,
+                "all_products_failed": self.all_products_failed}
+
+    def shutdown(self):
+        with self._lock:
+            agents = list(self.agents.values())
+        for agent in agents:
+            agent.send({"type": "stop"})
+            agent.close()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # -----------------------------
+    # AGENT SESSIONS
+    # -----------------------------
+    def _serve_agent(self, handler: _Handler):
+        try:
+            hello = read_message(handler.rfile)
+        except (OSError, ValueError):
+            return
+        if not hello or hello.get('type') != 'hello':
+            return
+        if not hmac.compare_digest(str(hello.get('token') or ''), self.token or ''):
+            send_message(handler.wfile, {"type": "error", "message": "invalid token"})
+            return
+
+        agent_id = str(hello.get('agent_id') or f"{handler.client_address[0]}:{handler.client_address[1]}")
+        agent = AgentConnection(agent_id, hello.get('host') or handler.client_address[0],
+                                int(hello.get('slots', 1)), handler.wfile, handler.connection)
+        with self._lock:
+            previous = self.agents.get(agent_id)
+            self.agents[agent_id] = agent
+        if previous:
+            self._drop_agent(previous, "reconnected")
+        self.log(f"[INFO] Agent {agent_id} connected from {agent.host} ({agent.slots} slots)")
+        agent.send({"type": "welcome", "env": self.env, "heartbeat_interval": HEARTBEAT_INTERVAL})
+
+        try:
+            while agent.alive:
+                message = read_message(handler.rfile)
+                if message is None:
+                    break
+                agent.last_seen = time.time()
+                self._handle(agent, message)
+        except (OSError, ValueError) as e:
+            self.log(f"[WARNING] Agent {agent_id} connection error: {e}")
+        finally:
+            self._drop_agent(agent, "disconnected")
+
+    def _handle(self, agent: AgentConnection, message: Dict[str, Any]):
+        kind = message.get('type')
+        if kind == 'pull':
+            agent.send(self._next_order(agent))
+        elif kind == 'started':
+            order_num = message.get('order')
+            if self.assignments.get(order_num) == agent.agent_id:
+                self.on_order(order_num, status="running", agent=agent.agent_id, host=agent.host,
+                              pid=message.get('pid'), attempts=self.attempts.get(order_num, 1),
+                              started_at=datetime.now().isoformat(), finished_at=None)
+        elif kind == 'log':
+            order_num = message.get('order')
+            stream = str(message.get('stream', 'stdout')).upper()
+            self.log(f"[ORDER {order_num} {stream}] [{agent.agent_id}] {message.get('line', '')}",
+                     worker_id=order_num)
+        elif kind == 'result':
+            self._record_result(agent, message.get('order'), int(message.get('return_code', 1)))
+        elif kind == 'heartbeat':
+            pass  # last_seen already bumped
+        else:
+            agent.send({"type": "error", "message": f"unknown message type: {kind}"})
+
+    def _next_order(self, agent: AgentConnection) -> Dict[str, Any]:
+        with self._lock:
+            if self._done.is_set():
+                return {"type": "stop"}
+            if not self.pending or len(agent.orders) >= agent.slots:
+                return {"type": "wait", "retry_in": 1.0}
+            order_num = self.pending.popleft()
+            self.assignments[order_num] = agent.agent_id
+            agent.orders.add(order_num)
+            self.attempts[order_num] = 2 if order_num in self.retried else 1
+            attempt = self.attempts[order_num]
+        self.log(f"[INFO] Assigned order {order_num}/{self.total_orders} to agent {agent.agent_id}")
+        return {"type": "order", "order": order_num, "attempt": attempt}
+
+    def _drop_agent(self, agent: AgentConnection, reason: str):
+        with self._lock:
+            if self.agents.get(agent.agent_id) is agent:
+                del self.agents[agent.agent_id]
+            orphaned = sorted(o for o in agent.orders if self.assignments.get(o) == agent.agent_id)
+            for order_num in reversed(orphaned):
+                del self.assignments[order_num]
+                self.pending.appendleft(order_num)
+            agent.orders.clear()
+        agent.close()
+        if orphaned and not self._done.is_set():
+            self.log(f"[WARNING] Agent {agent.agent_id} {reason} - requeued orders {orphaned}")
+            for order_num in orphaned:
+                self.on_order(order_num, status="requeued", agent=None, finished_at=datetime.now().isoformat())
+        elif reason != "stopped":
+            self.log(f"[INFO] Agent {agent.agent_id} {reason}")
+
+    def _drop_silent_agents(self):
+        cutoff = time.time() - self.heartbeat_timeout
+        with self._lock:
+            silent = [a for a in self.agents.values() if a.last_seen < cutoff]
+        for agent in silent:
+            self._drop_agent(agent, f"missed heartbeats for {self.heartbeat_timeout:.0f}s")
+
+    # -----------------------------
+    # RESULTS (same retry / exit code 5 rules as automation_worker)
+    # -----------------------------
+    def _record_result(self, agent: AgentConnection, order_num: int, return_code: int):
+        finished_at = datetime.now().isoformat()
+        with self._lock:
+            if self.assignments.get(order_num) != agent.agent_id:
+                return  # stale result from an agent whose orders were requeued
+            del self.assignments[order_num]
+            agent.orders.discard(order_num)
+
+            retry = (return_code != 0 and self.retry_orders and return_code != 5
+                     and order_num not in self.retried)
+            if return_code == 0:
+                self.completed += 1
+                self.success += 1
+            elif retry:
+                self.retried.add(order_num)
+                self.pending.append(order_num)
+            else:
+                self.completed += 1
+                self.failure += 1
+
+            stop_all = return_code == 5
+            if stop_all:
+                self.all_products_failed = True
+                in_flight = sorted(self.assignments)
+                remaining = len(self.pending) + len(in_flight)
+                self.failure += remaining
+                self.completed += remaining
+                self.pending.clear()
+                self.assignments.clear()
+                for other in self.agents.values():
+                    other.orders.clear()
+            success, failure = self.success, self.failure
+            finished = self.completed >= self.total_orders
+
+        if return_code == 0:
+            self.on_order(order_num, status="success", return_code=return_code, finished_at=finished_at)
+            self.log(f"[INFO] Order {order_num} completed on {agent.agent_id} (SUCCESS) - "
+                     f"{self.completed}/{self.total_orders} total", worker_id=order_num)
+        elif retry:
+            self.on_order(order_num, status="retrying", return_code=return_code, finished_at=finished_at)
+            self.log(f"[INFO] Order {order_num} failed (return_code={return_code}) - Retrying once (User Setting)...",
+                     worker_id=order_num)
+        else:
+            self.on_order(order_num, status="failed", return_code=return_code, finished_at=finished_at)
+            self.log(f"[INFO] Order {order_num} completed on {agent.agent_id} (FAILED, return_code={return_code}) - "
+                     f"{self.completed}/{self.total_orders} total", worker_id=order_num)
+        self.on_status(success, failure)
+
+        if stop_all:
+            self.log(f"[CRITICAL] Order {order_num} failed - all product URLs failed. Stopping all agents...",
+                     worker_id=order_num)
+            for other in in_flight:
+                self.on_order(other, status="terminated", finished_at=finished_at)
+        if stop_all or finished:
+            self._done.set()
+            with self._lock:
+                agents = list(self.agents.values())
+            for other in agents:
+                other.send({"type": "stop"})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": list(self.pending),
+                "assignments": dict(self.assignments),
+                "agents": {a.agent_id: {"host": a.host, "slots": a.slots, "orders": sorted(a.orders),
+                                        "last_seen": a.last_seen} for a in self.agents.values()},
+                "success": self.success,
+                "failure": self.failure,
+            }
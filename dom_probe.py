@@ -0,0 +1,111 @@
+"""
+Batched DOM state probe
+
+locator.count() and is_visible() each cost one Playwright round trip, so a
+scan over N candidate selectors costs up to 2N. probe() checks whole named
+sets of selectors inside the page in a single page.evaluate call and returns
+a snapshot per set:
+
+    {"present": bool, "visible": bool, "count": int,
+     "selector": first visible match (else first present, else None),
+     "text": normalized text of that element (trimmed to 200 chars)}
+
+Supported selectors (the subset main.py uses):
+
+    css                     - any CSS selector
+    text=Foo                - smallest elements containing "Foo" (case-insensitive),
+                              like Playwright's unquoted text= engine
+    css:has-text('Foo')     - elements matching css whose text contains "Foo"
+
+Visibility follows Playwright: a non-empty bounding box and not
+visibility:hidden. An invalid selector simply matches nothing.
+"""
+from typing import Any, Dict, List
+
+# Selector matching shared with the readiness init script (readiness.py)
+DOM_QUERY_JS = """
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'HEAD']);
+    const textMatches = (css, needle, smallest) => {
+        const found = [];
+        for (const el of document.querySelectorAll(css)) {
+            if (SKIP.has(el.tagName) || !norm(el.textContent).includes(needle)) continue;
+            if (smallest && Array.from(el.children).some((c) => norm(c.textContent).includes(needle))) continue;
+            found.push(el);
+        }
+        return found;
+    };
+    const query = (selector) => {
+        try {
+            if (selector.startsWith('text=')) {
+                return textMatches('body *', norm(selector.slice(5)), true);
+            }
+            const hasText = selector.match(/^(.*?):has-text\\((['"])(.*)\\2\\)$/);
+            if (hasText) {
+                return textMatches(hasText[1] || '*', norm(hasText[3]), false);
+            }
+            return Array.from(document.querySelectorAll(selector));
+        } catch (e) {
+            return [];
+        }
+    };
+"""
+
+PROBE_JS = """
+(sets) => {
+""" + DOM_QUERY_JS + """
+    const snapshot = {};
+    for (const [name, selectors] of Object.entries(sets)) {
+        const result = {present: false, visible: false, count: 0, selector: null, text: null};
+        let firstPresent = null;
+        for (const selector of selectors) {
+            const elements = query(selector);
+            if (!elements.length) continue;
+            result.present = true;
+            result.count += elements.length;
+            if (!firstPresent) firstPresent = [selector, elements[0]];
+            const shown = elements.find(isVisible);
+            if (shown) {
+                result.visible = true;
+                result.selector = selector;
+                result.text = norm(shown.innerText).slice(0, 200);
+                break;
+            }
+        }
+        if (!result.visible && firstPresent) {
+            result.selector = firstPresent[0];
+            result.text = norm(firstPresent[1].textContent).slice(0, 200);
+        }
+        snapshot[name] = result;
+    }
+    return snapshot;
+}
+"""
+
+EMPTY_RESULT = {"present": False, "visible": False, "count": 0, "selector": None, "text": None}
+
+
+def text_selectors(texts: List[str]) -> List[str]:
+    """["Sold Out", ...] -> ["text=Sold Out", ...]"""
+    return [f"text={text}" for text in texts]
+
+
+def selector_label(selector: str) -> str:
+    """Human-readable form of a matched selector (the text of text= selectors)"""
+    return selector[5:] if selector and selector.startswith("text=") else selector
+
+
+def probe(page, sets: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate every named selector set in one round trip.
+    On failure (navigation in progress, closed page) every set reads as absent.
+    """
+    try:
+        return page.evaluate(PROBE_JS, sets)
+    except Exception as e:
+        print(f"⚠️ DOM probe failed: {e}")
+        return {name: dict(EMPTY_RESULT) for name in sets}
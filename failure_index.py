@@ -0,0 +1,226 @@
+"""
+Incremental index of failed order logs (failed_logs/failed_order_*.txt)
+
+Each log written by order_reporter.save_order_to_csv is parsed into one row of
+a small SQLite table (reason, step, order, batch, screenshot) so the backend
+can answer questions like "top failure reasons in the last N batches"
+without re-reading every log file.
+"""
+import os
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+FAILED_LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'failed_logs')
+INDEX_DB = os.path.join(FAILED_LOGS_DIR, 'failure_index.db')
+
+_FILENAME_RE = re.compile(r'^failed_order_.*\.txt$')
+
+# Log lines that mark the start of a checkout step, in flow order. The last
+# marker seen before the failure is the step the order failed in.
+STEP_MARKERS = [
+    ("location", ["Location selection enabled", "Searching for location", "Trying normal location flow"]),
+    ("login", ["Attempting to click user icon"]),
+    ("get_number", ["Requesting phone number from API"]),
+    ("otp", ["Waiting for OTP", "Clicking Verify OTP button"]),
+    ("add_to_cart", ["Opening product page", "Adding products"]),
+    ("cart_check", ["Opening cart", "Opening bag and checking for errors"]),
+    ("address", ["Address Flow", "Filling address details"]),
+    ("payment", ["Selecting payment method"]),
+    ("place_order", ["Attempting to place order"]),
+]
+
+# Used when the worker log is missing: guess the step from the failure reason
+REASON_STEPS = [
+    ("location", ["location"]),
+    ("get_number", ["phone number", "api_key", "api_url"]),
+    ("otp", ["otp"]),
+    ("add_to_cart", ["add all products", "product url"]),
+    ("cart_check", ["cart check", "delivery not available"]),
+    ("address", ["address"]),
+    ("place_order", ["place order", "post-click", "click methods failed"]),
+]
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(FAILED_LOGS_DIR, exist_ok=True)
+    conn = sqlite3.connect(INDEX_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS failures (
+            file TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            order_number TEXT,
+            batch_id TEXT,
+            timestamp TEXT,
+            reason TEXT,
+            step TEXT,
+            screenshot TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_failures_batch ON failures (batch_id, timestamp)")
+    return conn
+
+
+def _infer_step(log_body: str, reason: str) -> str:
+    step = None
+    for line in log_body.splitlines():
+        for name, markers in STEP_MARKERS:
+            if any(marker in line for marker in markers):
+                step = name
+    if step:
+        return step
+    lowered = reason.lower()
+    for name, keywords in REASON_STEPS:
+        if any(keyword in lowered for keyword in keywords):
+            return name
+    return "unknown"
+
+
+def parse_failed_log(text: str) -> Dict[str, Any]:
+    """
+    Parse the text of a failed order log into a structured record.
+    Returns a dict with order_number, batch_id, timestamp, reason, step, screenshot.
+    """
+    header, _, body = text.partition("WORKER LOG:")
+    fields = {}
+    for line in header.splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            fields[key.strip().lower()] = value.strip()
+
+    status = fields.get("status", "")
+    reason = status[len("Failed - "):].strip() if status.startswith("Failed - ") else status
+    screenshot = fields.get("screenshot", "")
+    return {
+        "order_number": fields.get("order number") or None,
+        "batch_id": fields.get("batch") or "unknown",
+        "timestamp": fields.get("timestamp") or None,
+        "reason": reason or "Unknown",
+        "step": _infer_step(body, reason),
+        "screenshot": screenshot if screenshot and screenshot != "N/A" else None,
+    }
+
+
+def _index_file(conn: sqlite3.Connection, filepath: str, mtime: float) -> Dict[str, Any]:
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        record = parse_failed_log(f.read())
+    record["file"] = os.path.basename(filepath)
+    conn.execute(
+        """INSERT OR REPLACE INTO failures
+           (file, mtime, order_number, batch_id, timestamp, reason, step, screenshot)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (record["file"], mtime, record["order_number"], record["batch_id"],
+         record["timestamp"], record["reason"], record["step"], record["screenshot"])
+    )
+    return record
+
+
+def index_failed_log(filepath: str) -> Optional[Dict[str, Any]]:
+    """Add (or refresh) a single failed log in the index. Returns the parsed record."""
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                return _index_file(conn, filepath, os.path.getmtime(filepath))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[WARNING] Failed to index failed log {filepath}: {e}")
+        return None
+
+
+def sync_index() -> Dict[str, int]:
+    """
+    Bring the index up to date with failed_logs/: index new or modified files
+    and drop rows for deleted ones. Only changed files are re-read.
+    """
+    if not os.path.isdir(FAILED_LOGS_DIR):
+        return {"indexed": 0, "removed": 0}
+
+    on_disk = {}
+    for filename in os.listdir(FAILED_LOGS_DIR):
+        if _FILENAME_RE.match(filename):
+            try:
+                on_disk[filename] = os.path.getmtime(os.path.join(FAILED_LOGS_DIR, filename))
+            except OSError:
+                continue
+
+    conn = _connect()
+    try:
+        known = {row["file"]: row["mtime"] for row in conn.execute("SELECT file, mtime FROM failures")}
+        indexed = 0
+        with conn:
+            for filename, mtime in on_disk.items():
+                if known.get(filename) != mtime:
+                    try:
+                        _index_file(conn, os.path.join(FAILED_LOGS_DIR, filename), mtime)
+                        indexed += 1
+                    except OSError as e:
+                        print(f"[WARNING] Failed to index {filename}: {e}")
+            removed = [name for name in known if name not in on_disk]
+            conn.executemany("DELETE FROM failures WHERE file = ?", [(name,) for name in removed])
+        return {"indexed": indexed, "removed": len(removed)}
+    finally:
+        conn.close()
+
+
+def _recent_batches(conn: sqlite3.Connection, last_batches: int) -> List[str]:
+    rows = conn.execute(
+        """SELECT batch_id FROM failures GROUP BY batch_id
+           ORDER BY MAX(timestamp) DESC LIMIT ?""",
+        (last_batches,)
+    )
+    return [row["batch_id"] for row in rows]
+
+
+def top_failure_reasons(last_batches: int = 5, limit: int = 10) -> Dict[str, Any]:
+    """Most common failure reasons (with the step they failed in) across the last N batches"""
+    sync_index()
+    conn = _connect()
+    try:
+        batches = _recent_batches(conn, last_batches)
+        if not batches:
+            return {"batches": [], "total_failures": 0, "reasons": []}
+        placeholders = ",".join("?" * len(batches))
+        rows = conn.execute(
+            f"""SELECT reason, step, COUNT(*) AS count, MAX(timestamp) AS last_seen
+                FROM failures WHERE batch_id IN ({placeholders})
+                GROUP BY reason, step ORDER BY count DESC, last_seen DESC LIMIT ?""",
+            (*batches, limit)
+        )
+        reasons = [dict(row) for row in rows]
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM failures WHERE batch_id IN ({placeholders})", batches
+        ).fetchone()[0]
+        return {"batches": batches, "total_failures": total, "reasons": reasons}
+    finally:
+        conn.close()
+
+
+def query_failures(batch_id: Optional[str] = None, reason: Optional[str] = None,
+                   step: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """List indexed failures (newest first), optionally filtered by batch, reason or step"""
+    sync_index()
+    clauses, params = [], []
+    if batch_id:
+        clauses.append("batch_id = ?")
+        params.append(batch_id)
+    if reason:
+        clauses.append("reason = ?")
+        params.append(reason)
+    if step:
+        clauses.append("step = ?")
+        params.append(step)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"""SELECT file, order_number, batch_id, timestamp, reason, step, screenshot
+                FROM failures {where} ORDER BY timestamp DESC LIMIT ?""",
+            (*params, limit)
+        )
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
@@ -0,0 +1,186 @@
+"""
+Location fast path: seed the storefront's own location state instead of
+driving the Google autocomplete flow
+
+After a successful UI location selection, main.py records which cookies and
+localStorage keys the selection changed, plus the address-bar text it
+produced. The record is keyed by the configured coordinates and location
+text. Later contexts for the same location get that state before their first
+navigation: cookies through add_cookies(), and localStorage through an init
+script that runs before the app boots. The app then starts with the location
+already chosen.
+
+The fast path is only trusted after validation: the address bar must show
+the recorded text. The configured geolocation counts as well, when the site
+picked it up on its own. On a mismatch main.py falls back to the UI flow
+(and records a fresh state). After FAST_PATH_MAX_FAILURES failed
+validations in a row the fast path is switched off for that location for
+one TTL.
+
+Only non-httpOnly cookies and keys that don't look like session, auth or
+analytics state are recorded. Every order must keep its own anonymous
+session.
+
+Backed by SQLite (location_state.db, WAL), shared by every main.py process.
+LOCATION_FAST_PATH=0 disables it.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB = os.environ.get('LOCATION_STATE_DB') or os.path.join(BASE_DIR, 'location_state.db')
+LOCATION_FAST_PATH = os.environ.get('LOCATION_FAST_PATH', '1') != '0'
+DEFAULT_TTL = float(os.environ.get('LOCATION_STATE_TTL_SECONDS', '86400'))
+FAST_PATH_MAX_FAILURES = 2
+
+# Names never copied between contexts (sessions, auth, CSRF, analytics ids)
+PRIVATE_NAME_RE = re.compile(r"sess|token|auth|jwt|csrf|xsrf|sid|login|user|cart|^_g|^_fb|^cf_|^__cf", re.I)
+
+SNAPSHOT_STORAGE_JS = """
+() => {
+    const items = {};
+    for (let i = 0; i < localStorage.length; i++) {
+        const key = localStorage.key(i);
+        items[key] = localStorage.getItem(key);
+    }
+    return items;
+}
+"""
+
+# Seeds once per tab session, so later in-app location changes are not overwritten
+SEED_SCRIPT_TEMPLATE = """
+(() => {
+    try {
+        if (sessionStorage.getItem('__location_seeded')) return;
+        const items = %s;
+        for (const [key, value] of Object.entries(items)) localStorage.setItem(key, value);
+        sessionStorage.setItem('__location_seeded', '1');
+    } catch (e) {}
+})();
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(STATE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS location_states (
+                location_key TEXT PRIMARY KEY,
+                cookies TEXT NOT NULL,
+                local_storage TEXT NOT NULL,
+                address_text TEXT NOT NULL,
+                captured_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                failures INTEGER NOT NULL DEFAULT 0,
+                disabled_until REAL
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+def location_key() -> str:
+    """Identifies the configured delivery location (coordinates + search/suggestion text)"""
+    parts = [os.environ.get(name, '') for name in ('LATITUDE', 'LONGITUDE', 'SEARCH_INPUT', 'LOCATION_TEXT')]
+    return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def snapshot(context, page) -> Dict[str, Any]:
+    """Cookies (by name/domain/path) and localStorage of the current page"""
+    return {
+        "cookies": {(c["name"], c["domain"], c["path"]): c for c in context.cookies()},
+        "local_storage": page.evaluate(SNAPSHOT_STORAGE_JS),
+    }
+
+
+def capture(before: Dict[str, Any], after: Dict[str, Any], address_text: str) -> Dict[str, Any]:
+    """The non-private state a location selection added or changed"""
+    cookies = [
+        cookie for key, cookie in after["cookies"].items()
+        if before["cookies"].get(key, {}).get("value") != cookie["value"]
+        and not cookie.get("httpOnly") and not PRIVATE_NAME_RE.search(cookie["name"])
+    ]
+    local_storage = {
+        key: value for key, value in after["local_storage"].items()
+        if before["local_storage"].get(key) != value and not PRIVATE_NAME_RE.search(key)
+    }
+    return {"cookies": cookies, "local_storage": local_storage, "address_text": address_text}
+
+
+def save(state: Dict[str, Any], key: Optional[str] = None, ttl: float = DEFAULT_TTL):
+    """Record the state of a successful UI selection (keeps the failure bookkeeping)"""
+    if not state["address_text"] or not (state["cookies"] or state["local_storage"]):
+        return
+    now = time.time()
+    try:
+        _connect().execute(
+            "INSERT INTO location_states (location_key, cookies, local_storage, address_text, captured_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(location_key) DO UPDATE SET "
+            "cookies = excluded.cookies, local_storage = excluded.local_storage, "
+            "address_text = excluded.address_text, captured_at = excluded.captured_at, "
+            "expires_at = excluded.expires_at",
+            (key or location_key(), json.dumps(state["cookies"]), json.dumps(state["local_storage"]),
+             state["address_text"], now, now + ttl)
+        )
+        print(f"📍 Location state saved: {len(state['cookies'])} cookie(s), "
+              f"{len(state['local_storage'])} storage key(s)")
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to save location state: {e}")
+
+
+def load(key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Recorded state for the configured location, unless expired or switched off"""
+    now = time.time()
+    try:
+        row = _connect().execute(
+            "SELECT * FROM location_states WHERE location_key = ? AND expires_at > ? "
+            "AND (disabled_until IS NULL OR disabled_until < ?)",
+            (key or location_key(), now, now)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to read location state: {e}")
+        return None
+    if not row:
+        return None
+    return {
+        "cookies": json.loads(row["cookies"]),
+        "local_storage": json.loads(row["local_storage"]),
+        "address_text": row["address_text"],
+    }
+
+
+def record_validation(ok: bool, key: Optional[str] = None, ttl: float = DEFAULT_TTL):
+    """Count a fast-path validation; repeated failures switch the fast path off for a TTL"""
+    try:
+        if ok:
+            _connect().execute("UPDATE location_states SET failures = 0 WHERE location_key = ?",
+                               (key or location_key(),))
+            return
+        _connect().execute(
+            "UPDATE location_states SET "
+            "disabled_until = CASE WHEN failures + 1 >= ? THEN ? ELSE disabled_until END, "
+            "failures = CASE WHEN failures + 1 >= ? THEN 0 ELSE failures + 1 END "
+            "WHERE location_key = ?",
+            (FAST_PATH_MAX_FAILURES, time.time() + ttl, FAST_PATH_MAX_FAILURES, key or location_key())
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to update location state: {e}")
+
+
+def install(context, state: Dict[str, Any]):
+    """Seed a fresh context (call before its first navigation)"""
+    if state["cookies"]:
+        context.add_cookies(state["cookies"])
+    if state["local_storage"]:
+        context.add_init_script(SEED_SCRIPT_TEMPLATE % json.dumps(state["local_storage"]))
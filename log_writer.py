@@ -0,0 +1,239 @@
+"""
+Non-blocking, batched log writer for automation_worker
+
+Callers enqueue lines and return immediately; a single background thread
+keeps the most recently used log files open (at most max_open_files, least
+recently used closed first), writes lines in batches and flushes on a size or
+time threshold. Files are rotated when they grow past max_bytes, and the
+whole logs directory can optionally be archived (tar.gz) when the batch ends.
+
+When the queue backs up, [DEBUG] lines are dropped first; other lines wait
+briefly for room and are only dropped if the writer stays saturated.
+"""
+import atexit
+import os
+import queue
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, TextIO
+
+_STOP = object()
+
+
+class LogWriter:
+    def __init__(self, logs_dir: str, combined_name: str = 'latest_logs.txt',
+                 max_queue: int = 20000, debug_high_water: float = 0.5,
+                 info_block_timeout: float = 0.5, flush_interval: float = 0.5,
+                 flush_bytes: int = 64 * 1024, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 3, max_open_files: int = 32):
+        self.logs_dir = logs_dir
+        self.combined_file = os.path.join(logs_dir, combined_name)
+        self.max_queue = max_queue
+        self.debug_limit = int(max_queue * debug_high_water)
+        self.info_block_timeout = info_block_timeout
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_open_files = max(2, max_open_files)
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._handles: "OrderedDict[str, TextIO]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._pending_bytes = 0
+        self._last_flush = time.time()
+        self._dropped = {"debug": 0, "info": 0}
+        self._drop_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    # -----------------------------
+    # PRODUCER SIDE
+    # -----------------------------
+    def worker_log_path(self, worker_id) -> str:
+        return os.path.join(self.logs_dir, f'worker_{worker_id}.log')
+
+    def write(self, message: str, worker_id=None):
+        """Queue a message for latest_logs.txt (and worker_<id>.log if worker_id is set)"""
+        if self._closed:
+            return
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        item = (f"[{timestamp}] {message}\n", worker_id)
+
+        if '[DEBUG]' in message:
+            # Debug lines are the first to go when the writer falls behind
+            if self._queue.qsize() >= self.debug_limit:
+                self._count_drop("debug")
+                return
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._count_drop("debug")
+            return
+
+        try:
+            self._queue.put(item, timeout=self.info_block_timeout)
+        except queue.Full:
+            self._count_drop("info")
+
+    def _count_drop(self, level: str):
+        with self._drop_lock:
+            self._dropped[level] += 1
+
+    # -----------------------------
+    # WRITER THREAD
+    # -----------------------------
+    def _handle(self, path: str) -> TextIO:
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+        else:
+            # One handle per order would pile up over a long batch: close the least recently used
+            while len(self._handles) >= self.max_open_files:
+                _, oldest = self._handles.popitem(last=False)
+                try:
+                    oldest.close()
+                except Exception as e:
+                    print(f"[ERROR] Failed to close log file: {e}")
+            handle = open(path, 'a', encoding='utf-8')
+            self._handles[path] = handle
+            try:
+                self._sizes[path] = os.path.getsize(path)
+            except OSError:
+                self._sizes[path] = 0
+        return handle
+
+    def _rotate(self, path: str):
+        handle = self._handles.pop(path, None)
+        if handle:
+            handle.close()
+        base, ext = os.path.splitext(path)
+        for n in range(self.backup_count - 1, 0, -1):
+            src = f"{base}.{n}{ext}"
+            if os.path.exists(src):
+                os.replace(src, f"{base}.{n + 1}{ext}")
+        if self.backup_count > 0:
+            os.replace(path, f"{base}.1{ext}")
+        else:
+            os.remove(path)
+        self._sizes[path] = 0
+
+    def _write_line(self, path: str, line: str):
+        try:
+            self._handle(path).write(line)
+            size = len(line.encode('utf-8', errors='replace'))
+            self._sizes[path] = self._sizes.get(path, 0) + size
+            self._pending_bytes += size
+            if self._sizes[path] >= self.max_bytes:
+                self._handles[path].flush()
+                self._rotate(path)
+        except Exception as e:
+            print(f"[ERROR] Failed to write to {os.path.basename(path)}: {e}")
+
+    def _flush(self):
+        for handle in self._handles.values():
+            try:
+                handle.flush()
+            except Exception as e:
+                print(f"[ERROR] Failed to flush log file: {e}")
+        self._pending_bytes = 0
+        self._last_flush = time.time()
+
+    def _report_drops(self):
+        with self._drop_lock:
+            dropped = dict(self._dropped)
+            self._dropped = {"debug": 0, "info": 0}
+        if dropped["debug"] or dropped["info"]:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._write_line(
+                self.combined_file,
+                f"[{timestamp}] [WARNING] Log writer backlog: dropped {dropped['debug']} debug "
+                f"and {dropped['info']} info lines\n"
+            )
+
+    def _run(self):
+        os.makedirs(self.logs_dir, exist_ok=True)
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.time() - self._last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Drain whatever else is queued so a burst becomes one batch
+            batch = [] if item is None else [item]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for entry in batch:
+                if entry is _STOP:
+                    stop = True
+                    continue
+                line, worker_id = entry
+                self._write_line(self.combined_file, line)
+                if worker_id:
+                    self._write_line(self.worker_log_path(worker_id), line)
+
+            if (self._pending_bytes >= self.flush_bytes
+                    or time.time() - self._last_flush >= self.flush_interval
+                    or stop):
+                self._report_drops()
+                self._flush()
+
+            if stop:
+                for handle in self._handles.values():
+                    try:
+                        handle.close()
+                    except Exception:
+                        pass
+                self._handles.clear()
+                return
+
+    # -----------------------------
+    # SHUTDOWN
+    # -----------------------------
+    def close(self, archive_name: Optional[str] = None, timeout: float = 10.0):
+        """Flush everything, close the files, and optionally archive the logs directory"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        if archive_name:
+            self.archive(archive_name)
+
+    def archive(self, archive_name: str) -> Optional[str]:
+        """Write logs/archive/<archive_name>.tar.gz containing the current log files"""
+        archive_dir = os.path.join(self.logs_dir, 'archive')
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f"{archive_name}.tar.gz")
+        try:
+            with tarfile.open(archive_path, 'w:gz') as tar:
+                for filename in sorted(os.listdir(self.logs_dir)):
+                    filepath = os.path.join(self.logs_dir, filename)
+                    if os.path.isfile(filepath):
+                        tar.add(filepath, arcname=filename)
+            return archive_path
+        except Exception as e:
+            print(f"[ERROR] Failed to archive logs: {e}")
+            return None
+
+
+_default_writer: Optional[LogWriter] = None
+
+
+def get_log_writer(logs_dir: str) -> LogWriter:
+    """Process-wide LogWriter for logs_dir (created on first use, closed at exit)"""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = LogWriter(logs_dir)
+        atexit.register(_default_writer.close)
+    return _default_writer
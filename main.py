@@ -2,45 +2,160 @@ from playwright.sync_api import sync_playwright, TimeoutError, Error as Playwrig
 import time
 import os
 import sys
-import csv
-from datetime import datetime
-from api_dynamic import get_number, get_otp, cancel_number, set_status
+import signal
+import re
+import threading
+from api_dynamic import get_number, cancel_number
 from order_reporter import save_order_to_csv
+import screenshot_service
+import number_registry
+import availability_cache
+import otp_manager
+import motion
+import profiles
+import account_rotation
+import location_state
+import order_confirmation
+import order_trace
+import standby_pool
+from cart_api import CartApi, CART_API_MODE
+from dom_probe import probe, selector_label, text_selectors
+from readiness import Readiness, READINESS_ENABLED, LANDMARKS
 # Try to import imgbb uploader
 # from imgbb_upload import upload_image_to_imgbb (Removed as per request)
 
 
 
 
-SCREENSHOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
-os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
+# Checkout step currently running (recorded with screenshots and failures)
+current_step = "startup"
+
+# Records each tab's cart requests when CART_API_MODE=1 (see cart_api.py), by page
+cart_recorders = {}
+
+# In-page landmark readiness signals (see readiness.py); None when READINESS=0
+readiness_signals = None
+
+# ORDER ALL cart filling: how many product tabs to load at once (1 = sequential)
+PARALLEL_CART_TABS = int(os.environ.get('PARALLEL_CART_TABS', '4'))
+# Load and pre-check the product pages in a second tab while the OTP is outstanding
+PRELOAD_DURING_OTP = os.environ.get('PRELOAD_DURING_OTP', '1') == '1'
+# Layout-dependent selectors come from the execution profile (see profiles.py)
+ADD_BUTTON_SELECTOR = profiles.selector("add_button")
+BAG_ICON_SELECTOR = profiles.selector("bag_icon")
+ADDRESS_SELECTOR = profiles.selector("address_bar")
+OOS_TEXT_RE = re.compile("Currently Unavailable|Notify Me|Out of Stock|Sold Out")
+
+# Selector sets checked in one round trip with dom_probe.probe()
+OOS_SELECTORS = text_selectors(["Currently Unavailable", "Notify Me", "Out of Stock", "Sold Out"])
+LOGIN_BUTTON_SELECTORS = [
+    "button:has-text('Login')",
+    "button:has-text('Log in')",
+    "button:has-text('Sign in')",
+    "span:has-text('Login')"
+]
+REMOVE_ITEMS_SELECTORS = text_selectors([
+    "Remove Items & Proceed",
+    "Remove Items",
+    "Remove Item & Proceed",
+    "Remove Item"
+])
+USER_ICON_SELECTORS = profiles.selectors("user_icon")
+PHONE_INPUT_SELECTOR = "input[placeholder='Ex 9876543210']"
+HOME_URL = "https://www.dealshare.in/"
+
+# Chromium flags for every checkout browser (also used by standby_pool.py)
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',  # Critical for Docker/parallel
+    '--disable-gpu',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    # Performance optimizations for parallel execution
+    '--disable-background-networking',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-breakpad',
+    '--disable-client-side-phishing-detection',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-default-apps',
+    '--disable-extensions',
+    '--disable-features=TranslateUI',
+    '--disable-hang-monitor',
+    '--disable-ipc-flooding-protection',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-renderer-backgrounding',
+    '--disable-sync',
+    '--force-color-profile=srgb',
+    '--metrics-recording-only',
+    '--no-first-run',
+    '--password-store=basic',
+    '--use-mock-keychain',
+    '--mute-audio',  # Disable audio to save resources
+    '--disable-software-rasterizer',
+    # Memory optimizations
+    '--js-flags=--max-old-space-size=512',  # Limit JS heap to 512MB per instance
+    '--renderer-process-limit=2',  # Limit renderer processes
+]
+
+# Placing several orders in this context, one account after another (see account_rotation.py)
+rotation_active = False
+
+
+class OrderFailed(SystemExit):
+    """fail_and_exit() while rotating: ends the current order like sys.exit() would, but the process goes on"""
+    def __init__(self, code, message):
+        super().__init__(code)
+        self.message = message
+
+
+class QuantityNotSet(Exception):
+    """adjust_quantity() couldn't make the cart show the requested quantity; the order must not go on"""
 
 # =========================
 # HELPERS
 # =========================
 
-def fail_and_exit(message, page=None, browser=None):
+def wait_ready(page, landmark, timeout=30000):
+    """Wait for a readiness landmark: True/False, or None if readiness signals are off"""
+    if readiness_signals is None:
+        return None
+    return readiness_signals.wait(page, landmark, timeout)
+
+def set_step(step):
+    """Record which checkout step is running (and start its span in the order trace)"""
+    global current_step
+    current_step = step
+    order_trace.step(step)
+
+
+def capture_screenshot(page, prefix, reason=None, full_page=False):
+    """Compressed, deduplicated screenshot written in the background (see screenshot_service)"""
+    path = screenshot_service.capture(page, prefix=prefix, step=current_step, reason=reason, full_page=full_page)
+    if path:
+        print(f"📸 Screenshot taken: {path}")
+    return path
+
+
+def fail_and_exit(message, page=None, browser=None, exit_code=1):
     """
     Log failure, save screenshot, closed browser, upload to Pastebin/CSV, and exit.
+    While rotating accounts (ORDERS_PER_CONTEXT) only this order ends: OrderFailed is raised instead.
     """
     print(f"❌ CRITICAL FAILURE: {message}")
     
     screenshot_url = "N/A"
     filepath = None
     
-    # 1. Take screenshot first (if page available)
+    # 1. Take screenshot first (if page available); it is written out in the background
     if page:
-        try:
-            filename = f"failed_{int(time.time())}.png"
-            filepath = os.path.join(SCREENSHOTS_DIR, filename)
-            page.screenshot(path=filepath)
-            print(f"📸 Screenshot taken: {filepath}")
-        except Exception as e:
-            print(f"⚠️ Screenshot failed: {e}")
-            filepath = None
+        filepath = capture_screenshot(page, "failed", reason=message)
 
-    # 2. Close browser IMMEDIATELY
-    if browser:
+    # 2. Close browser IMMEDIATELY (kept open for the next account while rotating)
+    if browser and not rotation_active:
         print("🛑 Closing browser session...")
         try:
             browser.close()
@@ -48,10 +163,12 @@ def fail_and_exit(message, page=None, browser=None):
         except:
             pass
 
+    # 2b. Give back any number this order is still holding
+    cancel_held_numbers()
+
     # 3. Use local screenshot path
-    if filepath and os.path.exists(filepath):
+    if filepath:
         screenshot_url = filepath
-        print(f"📸 Saved local screenshot: {filepath}")
 
     # 4. Save to CSV/Pastebin
     try:
@@ -62,7 +179,8 @@ def fail_and_exit(message, page=None, browser=None):
         # IMPORTANT: Wait a bit for the parent process (automation_worker.py) to capture 
         # the latest stdout logs (including the CRITICAL FAILURE message above) 
         # and write them to the log file before we try to read it.
-        time.sleep(2) 
+        # The parent's log writer flushes every 0.5s; the screenshot write overlaps this wait.
+        time.sleep(1)
         
         save_order_to_csv(
             screenshot_url=screenshot_url,
@@ -73,8 +191,69 @@ def fail_and_exit(message, page=None, browser=None):
         print("📝 Failure logged to CSV")
     except Exception as e:
         print(f"⚠️ Failed to log failure to CSV: {e}")
-            
-    sys.exit(1)
+
+    order_trace.finish("failed")
+    screenshot_service.flush()
+    if rotation_active:
+        raise OrderFailed(exit_code, message)
+    sys.exit(exit_code)
+
+def cancel_held_numbers():
+    """Cancel (refund) provider numbers this process registered but never cancelled"""
+    try:
+        report = number_registry.cancel_own()
+        if report["requested"]:
+            print(f"🔄 Cancelled {report['cancelled']}/{report['requested']} outstanding number(s)")
+    except Exception as e:
+        print(f"⚠️ Failed to cancel outstanding numbers: {e}")
+
+
+def handle_terminate(signum, frame):
+    """Worker is stopping us: refund our number before dying"""
+    print("🛑 Terminated - cancelling outstanding numbers...")
+    cancel_held_numbers()
+    sys.exit(143)
+
+def load_products():
+    """Product URLs and quantities from PRODUCTS_JSON (or the old PRIMARY_/SECONDARY_/THIRD_ variables)"""
+    product_urls = []
+    product_quantities = []
+
+    products_json = os.environ.get('PRODUCTS_JSON', '')
+    if products_json:
+        try:
+            import json
+            products = json.loads(products_json)
+            for product in products:
+                url = product.get('url', '').strip()
+                quantity = int(product.get('quantity', 1))
+                if url:
+                    product_urls.append(url)
+                    product_quantities.append(quantity)
+        except Exception as e:
+            print(f"⚠️ Failed to parse PRODUCTS_JSON: {e}, falling back to old format")
+
+    # Fall back to old format if no products from JSON
+    if len(product_urls) == 0:
+        primary_product_url = os.environ.get('PRIMARY_PRODUCT_URL', '').strip()
+        secondary_product_url = os.environ.get('SECONDARY_PRODUCT_URL', '').strip()
+        third_product_url = os.environ.get('THIRD_PRODUCT_URL', '').strip()
+        primary_product_quantity = int(os.environ.get('PRIMARY_PRODUCT_QUANTITY', '1'))
+        secondary_product_quantity = int(os.environ.get('SECONDARY_PRODUCT_QUANTITY', '1'))
+        third_product_quantity = int(os.environ.get('THIRD_PRODUCT_QUANTITY', '1'))
+
+        if primary_product_url:
+            product_urls.append(primary_product_url)
+            product_quantities.append(primary_product_quantity)
+        if secondary_product_url:
+            product_urls.append(secondary_product_url)
+            product_quantities.append(secondary_product_quantity)
+        if third_product_url:
+            product_urls.append(third_product_url)
+            product_quantities.append(third_product_quantity)
+
+    return product_urls, product_quantities
+
 
 def js_click(page, locator):
     if locator.count() == 0:
@@ -92,7 +271,7 @@ def robust_click(page, selector, method="selector"):
     
     try:
         locator.scroll_into_view_if_needed()
-        time.sleep(0.3)
+        motion.settle(0.3)
     except:
         pass
     
@@ -171,27 +350,15 @@ def click_user_icon(page):
     success = False
     user_icon = None
     
-    # Try to find the user icon with multiple selectors
-    selectors = [
-        "div.UserOptions_userContainer__CqX1R",
-        "div[class*='UserOptions_userContainer']",
-        "div[class*='userContainer']",
-        "button:has-text('Login')",
-        "span:has-text('Login')"
-    ]
-    
-    for selector in selectors:
-        try:
-            if page.locator(selector).count() > 0:
-                user_icon = page.locator(selector).first
-                print(f"✅ Found user icon with selector: {selector}")
-                break
-        except:
-            continue
+    # Try to find the user icon with multiple selectors (one probe for all of them)
+    found = probe(page, {"user_icon": USER_ICON_SELECTORS})["user_icon"]
+    if found["present"]:
+        user_icon = page.locator(found["selector"]).first
+        print(f"✅ Found user icon with selector: {found['selector']}")
     
     if not user_icon:
         print("❌ Could not find user icon")
-        page.screenshot(path="user_icon_not_found.png")
+        capture_screenshot(page, "user_icon_not_found")
         raise Exception("User icon not found")
     
     # Wait for element to be ready
@@ -203,7 +370,7 @@ def click_user_icon(page):
     # Scroll into view
     try:
         user_icon.scroll_into_view_if_needed()
-        time.sleep(0.5)
+        motion.settle(0.5)
     except:
         pass
     
@@ -244,7 +411,7 @@ def click_user_icon(page):
     
     if not success:
         print("❌ All click methods failed for user icon")
-        page.screenshot(path="user_icon_click_failed.png")
+        capture_screenshot(page, "user_icon_click_failed")
         raise Exception("Could not click user icon")
     
     time.sleep(1)
@@ -273,16 +440,21 @@ def click_user_icon_with_retry(page, max_attempts=3):
 def proceed_to_checkout(page):
     time.sleep(1)
 
+    state = probe(page, {
+        "drawer": ["button:has-text('Proceed')"],
+        "cart": ["button.AddToCart_cartButton__tWwqP"],
+    })
+
     # CASE 1: Drawer checkout
     drawer_btn = page.locator("button:has-text('Proceed')")
-    if drawer_btn.count() > 0:
+    if state["drawer"]["present"]:
         print("➡ Proceeding via drawer")
         js_click(page, drawer_btn)
         return
 
     # CASE 2: Full cart page
     cart_btn = page.locator("button.AddToCart_cartButton__tWwqP")
-    if cart_btn.count() > 0:
+    if state["cart"]["present"]:
         print("➡ Proceeding via cart page")
         js_click(page, cart_btn)
         return
@@ -294,23 +466,27 @@ def click_add_button(page):
     """Improved ADD button clicking with multiple fallbacks"""
     print("🔘 Attempting to click ADD button...")
     
-    # Wait for button to be ready
-    page.wait_for_selector(
-        ".ActionSection_container__ertTt button.add-button",
-        state="visible",
-        timeout=30000
-    )
-    
-    # Additional wait for any animations
-    time.sleep(1.5)
+    # Wait for button to be ready (visible, enabled, done animating)
+    ready = wait_ready(page, "add_button", timeout=30000)
+    if ready is None:
+        page.wait_for_selector(
+            ADD_BUTTON_SELECTOR,
+            state="visible",
+            timeout=30000
+        )
+        
+        # Additional wait for any animations
+        motion.settle(1.5)
+    elif not ready:
+        raise Exception("ADD button did not become clickable within 30s")
     
     # Get the button locator
-    add_btn = page.locator(".ActionSection_container__ertTt button.add-button").first
+    add_btn = page.locator(ADD_BUTTON_SELECTOR).first
     
     # Ensure it's scrolled into view
     try:
         add_btn.scroll_into_view_if_needed()
-        time.sleep(0.5)
+        motion.settle(0.5)
     except:
         pass
     
@@ -352,11 +528,210 @@ def click_add_button(page):
             print("✅ ADD clicked (JS)")
         except Exception as e:
             print(f"❌ All ADD click methods failed: {e}")
-            page.screenshot(path="add_button_failed.png")
+            capture_screenshot(page, "add_button_failed", reason=str(e))
             raise
     
     time.sleep(1)
 
+def start_cart_capture(page):
+    """Start recording this tab's cart requests (CART_API_MODE); returns the capture start time"""
+    if CART_API_MODE and page not in cart_recorders:
+        cart_recorders[page] = CartApi(page)
+        page.on("close", lambda closed: cart_recorders.pop(closed, None))
+    return time.time()
+
+
+def read_cart_quantity(page):
+    """Quantity shown on the product page's ADD button, or None"""
+    try:
+        return int(page.locator("span.AddButton_quantity-text__enpVI").first.text_content().strip())
+    except Exception:
+        return None
+
+
+def click_quantity_button(page, name, times):
+    """Click the "plus" or "minus" button `times` times (UI fallback for quantity changes)"""
+    icon = page.locator(f"img[alt='{name}'][src*='{name}']")
+    
+    for i in range(times):
+        try:
+            # Wait for the button to be visible
+            icon.wait_for(state="visible", timeout=5000)
+            
+            # Try multiple click methods
+            success = False
+            
+            # Method 1: Regular click
+            try:
+                icon.first.click(timeout=3000)
+                success = True
+            except:
+                pass
+            
+            # Method 2: Force click
+            if not success:
+                try:
+                    icon.first.click(force=True)
+                    success = True
+                except:
+                    pass
+            
+            # Method 3: JS click
+            if not success:
+                try:
+                    page.evaluate("(el) => el.click()", icon.first)
+                    success = True
+                except:
+                    pass
+            
+            if success:
+                print(f"  {'➕' if name == 'plus' else '➖'} Clicked {name} button (iteration {i+1}/{times})")
+                time.sleep(0.5)  # Small delay between clicks
+            else:
+                print(f"  ⚠️ Failed to click {name} button on iteration {i+1}")
+                
+        except Exception as e:
+            print(f"  ⚠️ Error clicking {name} button: {e}")
+            break
+
+
+def click_plus(page, times):
+    click_quantity_button(page, "plus", times)
+
+
+def click_minus(page, times):
+    click_quantity_button(page, "minus", times)
+
+
+def adjust_quantity(page, quantity, since=0.0):
+    """
+    Bring the product's cart quantity to exactly `quantity`. With CART_API_MODE
+    the captured cart request is replayed once first; that call is usually the
+    ADD one and may add to the quantity instead of setting it, so the page is
+    re-read afterwards either way and the plus/minus buttons make up the
+    difference. Raises QuantityNotSet if the page doesn't end up showing
+    `quantity`: ordering a different amount is worse than failing the order.
+    """
+    if quantity <= 1:
+        return
+    print(f"🔢 Adjusting quantity to {quantity}...")
+    
+    recorder = cart_recorders.get(page)
+    if recorder is not None and recorder.set_quantity(quantity, page.url, since=since):
+        # The page doesn't know about the direct update until it reloads
+        try:
+            page.reload(timeout=30000)
+            page.locator("span.AddButton_quantity-text__enpVI").first.wait_for(state="visible", timeout=10000)
+        except Exception as e:
+            print(f"⚠️ Could not reload product page after cart API update: {e}")
+        if read_cart_quantity(page) == quantity:
+            print(f"✅ Quantity verified: {quantity} (cart API)")
+            return
+        print("⚠️ Cart API update not reflected exactly on page - correcting with UI clicks")
+    
+    current = read_cart_quantity(page) or 1
+    if current < quantity:
+        click_plus(page, quantity - current)
+    elif current > quantity:
+        print(f"⚠️ Cart shows {current}, expected {quantity} - removing {current - quantity}")
+        click_minus(page, current - quantity)
+    
+    # Verify quantity
+    time.sleep(1)
+    actual_quantity = read_cart_quantity(page)
+    if actual_quantity == quantity:
+        print(f"✅ Quantity verified: {actual_quantity} (expected: {quantity})")
+        return
+    if actual_quantity is None:
+        raise QuantityNotSet(f"Could not verify quantity (expected {quantity})")
+    raise QuantityNotSet(f"Quantity mismatch: got {actual_quantity}, expected {quantity}")
+
+
+def enter_otp_and_verify(page, otp):
+    """Type the OTP into the digit boxes (clearing old digits) and click Verify OTP"""
+    otp_boxes = page.locator("input[type='tel'][maxlength='1']")
+    # Clear existing OTP
+    for i in range(6):  # Assuming 6 digit OTP
+        try:
+            otp_boxes.nth(i).fill("")
+        except:
+            pass
+    for i, digit in enumerate(otp):
+        otp_boxes.nth(i).fill(digit)
+    
+    # Click Verify OTP button (it turns active once every digit is in)
+    print("🔘 Clicking Verify OTP button...")
+    verify_btn = page.locator("button.Button_button__8B4nB.Button_active__8l_7k", has_text="Verify OTP")
+    
+    ready = wait_ready(page, "verify_otp", timeout=5000)
+    if ready is None:
+        motion.settle(1)
+        try:
+            verify_btn.wait_for(state="visible", timeout=5000)
+        except:
+            print("⚠️ Verify button not visible, trying anyway...")
+        motion.settle(0.5)
+    elif not ready:
+        print("⚠️ Verify button not visible, trying anyway...")
+    
+    # Try multiple click methods
+    success = False
+    try:
+        verify_btn.click(timeout=3000)
+        success = True
+        print("✅ Verify OTP clicked (regular)")
+    except:
+        pass
+    
+    if not success:
+        try:
+            verify_btn.click(force=True, timeout=3000)
+            success = True
+            print("✅ Verify OTP clicked (force)")
+        except:
+            pass
+    
+    if not success:
+        try:
+            page.evaluate("(el) => el.click()", verify_btn.first)
+            success = True
+            print("✅ Verify OTP clicked (JS)")
+        except:
+            pass
+    
+    if not success:
+        if robust_click(page, verify_btn, method="locator"):
+            success = True
+            print("✅ Verify OTP clicked (robust)")
+    
+    if not success:
+        print("❌ Failed to click Verify OTP button")
+        capture_screenshot(page, "verify_otp_failed")
+    return success
+
+def login_with_new_otp(page, request_id, api_key, api_url):
+    """
+    The site asked to log in again: request a fresh OTP for the same number and enter it.
+    Returns True if a new OTP was entered.
+    """
+    session = otp_manager.session_for(request_id, api_key, api_url)
+    print("🔄 Requesting a new OTP...")
+    if not session.request_new():
+        return False
+    print("✅ New OTP request sent")
+    
+    print("⏳ Getting new OTP (max 2 minutes)...")
+    new_otp = session.wait(timeout_seconds=120.0, poll_interval=2.0)
+    if not new_otp:
+        print("❌ Failed to get new OTP within 2 minutes")
+        return False
+    
+    print(f"✅ Got new OTP: {new_otp}")
+    enter_otp_and_verify(page, new_otp)
+    session.consume()
+    time.sleep(2)
+    return True
+
 def add_product_and_check_cart(page, product_url, quantity=1, request_id=None, api_key=None, api_url=None):
     """
     Add product to cart with specified quantity and check for removal notice and OOS
@@ -375,16 +750,15 @@ def add_product_and_check_cart(page, product_url, quantity=1, request_id=None, a
     # FAST OOS CHECK
     # -----------------------------
     # Check for immediate "Out of Stock" indicators
-    oos_indicators = ["Currently Unavailable", "Notify Me", "Out of Stock", "Sold Out"]
-    for indicator in oos_indicators:
-        if page.locator(f"text={indicator}").count() > 0:
-            if page.locator(f"text={indicator}").first.is_visible():
-                print(f"⚠️ Product is Out of Stock ('{indicator}' detected)")
-                return False
+    oos = probe(page, {"oos": OOS_SELECTORS})["oos"]
+    if oos["visible"]:
+        print(f"⚠️ Product is Out of Stock ('{selector_label(oos['selector'])}' detected)")
+        return False
 
     # -----------------------------
     # ADD TO CART
     # -----------------------------
+    add_started = start_cart_capture(page)
     try:
         click_add_button(page)
         print("✅ Added to cart (initially)")
@@ -397,66 +771,7 @@ def add_product_and_check_cart(page, product_url, quantity=1, request_id=None, a
     # -----------------------------
     # QUANTITY ADJUSTMENT
     # -----------------------------
-    if quantity > 1:
-        print(f"🔢 Adjusting quantity to {quantity}...")
-        
-        # Click plus button (quantity - 1) times since we already have 1 item
-        plus_icon = page.locator("img[alt='plus'][src*='plus']")
-        
-        for i in range(quantity - 1):
-            try:
-                # Wait for plus button to be visible
-                plus_icon.wait_for(state="visible", timeout=5000)
-                
-                # Try multiple click methods
-                success = False
-                
-                # Method 1: Regular click
-                try:
-                    plus_icon.first.click(timeout=3000)
-                    success = True
-                except:
-                    pass
-                
-                # Method 2: Force click
-                if not success:
-                    try:
-                        plus_icon.first.click(force=True)
-                        success = True
-                    except:
-                        pass
-                
-                # Method 3: JS click
-                if not success:
-                    try:
-                        page.evaluate("(el) => el.click()", plus_icon.first)
-                        success = True
-                    except:
-                        pass
-                
-                if success:
-                    print(f"  ➕ Clicked plus button (iteration {i+1}/{quantity-1})")
-                    time.sleep(0.5)  # Small delay between clicks
-                else:
-                    print(f"  ⚠️ Failed to click plus button on iteration {i+1}")
-                    
-            except Exception as e:
-                print(f"  ⚠️ Error clicking plus button: {e}")
-                break
-        
-        # Verify quantity
-        time.sleep(1)
-        try:
-            quantity_text = page.locator("span.AddButton_quantity-text__enpVI").first
-            actual_quantity = quantity_text.text_content().strip()
-            
-            if actual_quantity == str(quantity):
-                print(f"✅ Quantity verified: {actual_quantity} (expected: {quantity})")
-            else:
-                print(f"⚠️ Quantity mismatch: got {actual_quantity}, expected {quantity}")
-                print("   Continuing anyway...")
-        except Exception as e:
-            print(f"⚠️ Could not verify quantity: {e}")
+    adjust_quantity(page, quantity, since=add_started)
 
     time.sleep(1)
 
@@ -465,152 +780,57 @@ def add_product_and_check_cart(page, product_url, quantity=1, request_id=None, a
     # -----------------------------
     print("🛍️ Opening cart...")
     try:
-        page.locator("img[src*='bag']").first.click(force=True)
+        page.locator(BAG_ICON_SELECTOR).first.click(force=True)
         print("✅ Clicked bag icon")
     except Exception as e:
         print(f"⚠️ Failed to click bag icon: {e}")
         return False
         
-    time.sleep(2)
+    # Wait for the bag to render (checkout/login button or remove-items notice)
+    if wait_ready(page, "cart_drawer", timeout=2000) is None:
+        time.sleep(2)
 
     # Check if login button appears after opening bag
-    login_btn_selectors = [
-        "button:has-text('Login')",
-        "button:has-text('Log in')",
-        "button:has-text('Sign in')",
-        "span:has-text('Login')"
-    ]
-    
-    for selector in login_btn_selectors:
+    login = probe(page, {"login": LOGIN_BUTTON_SELECTORS})["login"]
+    if login["visible"]:
         try:
-            login_btn = page.locator(selector)
-            if login_btn.count() > 0 and login_btn.first.is_visible():
-                print(f"🔐 Login button found after opening bag! Clicking it...")
-                if robust_click(page, login_btn.first, method="locator"):
-                    print("✅ Login button clicked successfully")
-                    time.sleep(5)  # Wait for a few seconds
-                    
-                    # Request a new OTP using the same request_id if available
-                    if request_id and api_key and api_url:
-                        print("🔄 Requesting a new OTP...")
-                        try:
-                            set_status(3, request_id, api_key, api_url)  # Status 3 = request new OTP
-                            print("✅ New OTP request sent")
-                            
-                            # Wait a bit for OTP to arrive
-                            time.sleep(3)
-                            
-                            # Get the new OTP
-                            print("⏳ Getting new OTP (max 2 minutes)...")
-                            new_otp = get_otp(
-                                request_id=request_id,
-                                api_key=api_key,
-                                base_url=api_url,
-                                timeout_seconds=120.0,
-                                poll_interval=2.0
-                            )
-                            
-                            if new_otp:
-                                print(f"✅ Got new OTP: {new_otp}")
-                                
-                                # Enter the new OTP
-                                otp_boxes = page.locator("input[type='tel'][maxlength='1']")
-                                # Clear existing OTP
-                                for i in range(6):  # Assuming 6 digit OTP
-                                    try:
-                                        otp_boxes.nth(i).fill("")
-                                    except:
-                                        pass
-                                
-                                # Fill new OTP
-                                for i, digit in enumerate(new_otp):
-                                    otp_boxes.nth(i).fill(digit)
-                                time.sleep(1)
-                                
-                                # Click Verify OTP button
-                                print("🔘 Clicking Verify OTP button...")
-                                verify_btn = page.locator("button.Button_button__8B4nB.Button_active__8l_7k", has_text="Verify OTP")
-                                
-                                try:
-                                    verify_btn.wait_for(state="visible", timeout=5000)
-                                except:
-                                    print("⚠️ Verify button not visible, trying anyway...")
-                                
-                                time.sleep(0.5)
-                                
-                                # Try multiple click methods
-                                success = False
-                                try:
-                                    verify_btn.click(timeout=3000)
-                                    success = True
-                                    print("✅ Verify OTP clicked (regular)")
-                                except:
-                                    pass
-                                
-                                if not success:
-                                    try:
-                                        verify_btn.click(force=True, timeout=3000)
-                                        success = True
-                                        print("✅ Verify OTP clicked (force)")
-                                    except:
-                                        pass
-                                
-                                if not success:
-                                    try:
-                                        page.evaluate("(el) => el.click()", verify_btn.first)
-                                        success = True
-                                        print("✅ Verify OTP clicked (JS)")
-                                    except:
-                                        pass
-                                
-                                if not success:
-                                    if robust_click(page, verify_btn, method="locator"):
-                                        success = True
-                                        print("✅ Verify OTP clicked (robust)")
-                                
-                                if not success:
-                                    print("❌ Failed to click Verify OTP button")
-                                    page.screenshot(path="verify_otp_failed.png")
-                                
-                                time.sleep(2)
-                            else:
-                                print("❌ Failed to get new OTP within 2 minutes")
-                        except Exception as e:
-                            print(f"⚠️ Error requesting/getting new OTP: {e}")
-                    
-                    time.sleep(2)
-                    # After clicking login, the cart should reload - break and continue
-                    break
-                else:
-                    print("⚠️ Failed to click login button, continuing anyway...")
+            print(f"🔐 Login button found after opening bag! Clicking it...")
+            if robust_click(page, page.locator(login["selector"]).first, method="locator"):
+                print("✅ Login button clicked successfully")
+                time.sleep(5)  # Wait for a few seconds
+                
+                # Request a new OTP using the same request_id if available
+                if request_id and api_key and api_url:
+                    try:
+                        login_with_new_otp(page, request_id, api_key, api_url)
+                    except Exception as e:
+                        print(f"⚠️ Error requesting/getting new OTP: {e}")
+                
+                # After clicking login, the cart should reload
+                time.sleep(2)
+            else:
+                print("⚠️ Failed to click login button, continuing anyway...")
         except Exception as e:
             pass
 
     # Check for "Remove Items & Proceed" text
-    remove_text_options = [
-        "Remove Items & Proceed",
-        "Remove Items",
-        "Remove Item & Proceed",
-        "Remove Item"
-    ]
-    
-    for text in remove_text_options:
-        if page.locator(f"text={text}").count() > 0:
-            if page.locator(f"text={text}").first.is_visible():
-                print(f"⚠️ Found '{text}' - Product needs to be removed (Delivery not available)")
-                
-                # Try to cleanly remove it before failing, so next product has clean slate? 
-                # Actually, better to just fail and let next product flow handle its own state, 
-                # but clicking remove is safer to clear the bad state.
-                try:
-                    remove_btn = page.locator(f"text={text}").first
-                    if robust_click(page, remove_btn, method="locator"):
-                        print("✅ Clicked remove button to clear bad state")
-                        time.sleep(1)
-                except:
-                    pass
-                
-                return False  # Return False because this product failed
+    remove = probe(page, {"remove_items": REMOVE_ITEMS_SELECTORS})["remove_items"]
+    if remove["visible"]:
+        text = selector_label(remove["selector"])
+        print(f"⚠️ Found '{text}' - Product needs to be removed (Delivery not available)")
+        
+        # Try to cleanly remove it before failing, so next product has clean slate? 
+        # Actually, better to just fail and let next product flow handle its own state, 
+        # but clicking remove is safer to clear the bad state.
+        try:
+            remove_btn = page.locator(remove["selector"]).first
+            if robust_click(page, remove_btn, method="locator"):
+                print("✅ Clicked remove button to clear bad state")
+                time.sleep(1)
+        except:
+            pass
+        
+        return False  # Return False because this product failed
             
     return True  # Return True if no removal needed
 
@@ -627,26 +847,42 @@ def add_product_only(page, product_url, quantity=1):
         return False
         
     time.sleep(1)
+    return add_to_cart_on_page(page, product_url, quantity)
 
-    # -----------------------------
-    # FAST OOS CHECK
-    # -----------------------------
+def press_add_on_page(page, product_url):
+    """
+    OOS check and ADD click on an already-open product page (no settle wait).
+    Returns (add_started, None), or (None, reason) if the product can't be added.
+    """
     # Check for immediate "Out of Stock" indicators
-    oos_indicators = ["Currently Unavailable", "Notify Me", "Out of Stock", "Sold Out"]
-    for indicator in oos_indicators:
-        if page.locator(f"text={indicator}").count() > 0:
-            if page.locator(f"text={indicator}").first.is_visible():
-                print(f"⚠️ Product is Out of Stock ('{indicator}' detected)")
-                return False
-
-    # -----------------------------
-    # ADD TO CART
-    # -----------------------------
+    oos = probe(page, {"oos": OOS_SELECTORS})["oos"]
+    if oos["visible"]:
+        indicator = selector_label(oos["selector"])
+        print(f"⚠️ Product is Out of Stock ('{indicator}' detected)")
+        availability_cache.mark_unavailable(product_url, f"Out of stock ('{indicator}')")
+        return None, f"Out of stock ('{indicator}')"
+
+    add_started = start_cart_capture(page)
     try:
         click_add_button(page)
         print("✅ Added to cart")
     except Exception as e:
         print(f"⚠️ Failed to click Add button (likely OOS or page changed): {e}")
+        return None, "ADD failed"
+    availability_cache.mark_available(product_url)
+    return add_started, None
+
+def add_to_cart_on_page(page, product_url, quantity=1):
+    """
+    Add the product shown on an already-open product page (OOS check, ADD, quantity)
+    Returns True if product was added successfully, False if failed
+    Raises QuantityNotSet if it was added but the quantity couldn't be set
+    """
+    # -----------------------------
+    # FAST OOS CHECK + ADD TO CART
+    # -----------------------------
+    add_started, _ = press_add_on_page(page, product_url)
+    if add_started is None:
         return False
 
     time.sleep(2)
@@ -654,1127 +890,1274 @@ def add_product_only(page, product_url, quantity=1):
     # -----------------------------
     # QUANTITY ADJUSTMENT
     # -----------------------------
-    if quantity > 1:
-        print(f"🔢 Adjusting quantity to {quantity}...")
-        
-        # Click plus button (quantity - 1) times since we already have 1 item
-        plus_icon = page.locator("img[alt='plus'][src*='plus']")
-        
-        for i in range(quantity - 1):
+    adjust_quantity(page, quantity, since=add_started)
+
+    time.sleep(1)
+    return True
+
+def add_products_parallel(page, product_urls, product_quantities, max_tabs=None):
+    """
+    ORDER ALL: add every product from its own tab in the page's context.
+    Each wave of up to PARALLEL_CART_TABS tabs starts all its navigations before
+    waiting on any of them, so a wave's page loads take about as long as the
+    slowest one. The ADD clicks then go out tab after tab without waiting in
+    between, so their cart calls and the settle wait overlap. Playwright's sync
+    API drives one tab at a time, though: the clicks themselves and the
+    quantity changes (plus clicks, or one cart API call each) still run
+    sequentially across the wave.
+    Returns the per-product summary [{url, quantity, status, reason, seconds}].
+    """
+    max_tabs = max_tabs or PARALLEL_CART_TABS
+    context = page.context
+    known_unavailable = availability_cache.unavailable_urls()
+    summary = []
+    pending = []
+    for url, quantity in zip(product_urls, product_quantities):
+        if url in known_unavailable:
+            summary.append({"url": url, "quantity": quantity, "status": "unavailable",
+                            "reason": known_unavailable[url], "seconds": 0.0})
+        else:
+            pending.append((url, quantity))
+
+    for start in range(0, len(pending), max_tabs):
+        wave = pending[start:start + max_tabs]
+        print(f"🗂️ Opening {len(wave)} product tab(s) in parallel...")
+        tabs = []
+        for url, quantity in wave:
+            started = time.time()
+            tab = context.new_page()
+            error = None
             try:
-                # Wait for plus button to be visible
-                plus_icon.wait_for(state="visible", timeout=5000)
-                
-                # Try multiple click methods
-                success = False
-                
-                # Method 1: Regular click
+                tab.goto(url, wait_until="commit", timeout=45000)
+            except Exception as e:
+                error = f"Failed to load page: {e}"
+            tabs.append((tab, url, quantity, started, error))
+
+        # ADD in every tab first; the settle wait below covers all of their cart calls at once
+        pressed = []
+        entries = []
+        for tab, url, quantity, started, error in tabs:
+            entry = {"url": url, "quantity": quantity, "started": started}
+            entries.append(entry)
+            if error is None:
                 try:
-                    plus_icon.first.click(timeout=3000)
-                    success = True
-                except:
-                    pass
-                
-                # Method 2: Force click
-                if not success:
-                    try:
-                        plus_icon.first.click(force=True)
-                        success = True
-                    except:
-                        pass
-                
-                # Method 3: JS click
-                if not success:
-                    try:
-                        page.evaluate("(el) => el.click()", plus_icon.first)
-                        success = True
-                    except:
-                        pass
-                
-                if success:
-                    print(f"  ➕ Clicked plus button (iteration {i+1}/{quantity-1})")
-                    time.sleep(0.5)  # Small delay between clicks
-                else:
-                    print(f"  ⚠️ Failed to click plus button on iteration {i+1}")
-                    
+                    # Rendered once either the ADD button or an OOS indicator is visible
+                    tab.locator(ADD_BUTTON_SELECTOR).or_(tab.get_by_text(OOS_TEXT_RE)).first.wait_for(
+                        state="visible", timeout=45000)
+                except Exception as e:
+                    error = f"Product page did not render: {e}"
+            if error is not None:
+                entry.update(status="failed", reason=error)
+                continue
+            try:
+                add_started, reason = press_add_on_page(tab, url)
             except Exception as e:
-                print(f"  ⚠️ Error clicking plus button: {e}")
-                break
-        
-        # Verify quantity
-        time.sleep(1)
-        try:
-            quantity_text = page.locator("span.AddButton_quantity-text__enpVI").first
-            actual_quantity = quantity_text.text_content().strip()
-            
-            if actual_quantity == str(quantity):
-                print(f"✅ Quantity verified: {actual_quantity} (expected: {quantity})")
+                add_started, reason = None, str(e)
+            if add_started is None:
+                unavailable = url in availability_cache.unavailable_urls()
+                entry.update(status="unavailable" if unavailable else "failed", reason=reason)
             else:
-                print(f"⚠️ Quantity mismatch: got {actual_quantity}, expected {quantity}")
-                print("   Continuing anyway...")
-        except Exception as e:
-            print(f"⚠️ Could not verify quantity: {e}")
+                entry.update(status="added", reason=None)
+                pressed.append((tab, quantity, add_started, entry))
 
-    time.sleep(1)
-    return True
+        if pressed:
+            time.sleep(2)
+            for tab, quantity, add_started, entry in pressed:
+                try:
+                    adjust_quantity(tab, quantity, since=add_started)
+                except Exception as e:
+                    entry.update(status="failed", reason=f"Quantity update failed: {e}")
+            if any(quantity > 1 for _, quantity, _, _ in pressed):
+                time.sleep(1)
+
+        for entry in entries:
+            entry["seconds"] = round(time.time() - entry.pop("started"), 2)
+            print(f"{'✅' if entry['status'] == 'added' else '⚠️'} [{entry['seconds']}s] {entry['status']}: {entry['url']}")
+            summary.append(entry)
+
+        for tab, *_ in tabs:
+            try:
+                tab.close()
+            except Exception:
+                pass
+    return summary
+
+
+def preload_products(context, stop):
+    """
+    Runs on the main thread while the OTP is polled in the background: load each
+    product page in a second tab of the order's context, so the cart step
+    navigates with a warm HTTP cache, and pre-check availability. Out-of-stock
+    products go to availability_cache, which the cart step already skips.
+    Stops as soon as `stop` (OTP done) is set. Returns {url: result}.
+    """
+    product_urls, _ = load_products()
+    known_unavailable = availability_cache.unavailable_urls()
+    results = {}
+    tab = None
+    try:
+        tab = context.new_page()
+        for url in product_urls:
+            if stop.is_set():
+                break
+            if url in known_unavailable:
+                continue
+            with order_trace.span("preload", lane="preload", url=url) as span:
+                span["result"] = "interrupted"
+                try:
+                    tab.goto(url, wait_until="commit", timeout=20000)
+                except Exception as e:
+                    span["result"] = f"load failed: {e}"
+                    continue
+                rendered = tab.locator(ADD_BUTTON_SELECTOR).or_(tab.get_by_text(OOS_TEXT_RE)).first
+                deadline = time.time() + 20
+                # Short waits, so the login flow resumes soon after the OTP arrives
+                while not stop.is_set() and time.time() < deadline:
+                    try:
+                        rendered.wait_for(state="visible", timeout=250)
+                    except Exception:
+                        continue
+                    oos = probe(tab, {"oos": OOS_SELECTORS})["oos"]
+                    if oos["visible"]:
+                        indicator = selector_label(oos["selector"])
+                        availability_cache.mark_unavailable(url, f"Out of stock ('{indicator}')")
+                        span["result"] = "unavailable"
+                    else:
+                        span["result"] = "available"
+                    break
+                else:
+                    if not stop.is_set():
+                        span["result"] = "not rendered"
+            results[url] = span["result"]
+            print(f"🔭 Preloaded during OTP wait: {url} ({span['result']})")
+    except Exception as e:
+        print(f"⚠️ Product preload stopped: {e}")
+    finally:
+        if tab is not None:
+            try:
+                tab.close()
+            except Exception:
+                pass
+    return results
 
-def check_cart_for_errors(page, request_id=None, api_key=None, api_url=None):
+
+def check_cart_for_errors(page, request_id=None, api_key=None, api_url=None, product_summary=None):
     """
     Open cart and check for errors (login button, remove items, etc.)
+    product_summary is the per-product outcome of cart filling ({url, status, ...}).
     Returns True if cart is ready to proceed, False if errors found
     """
+    added_urls = [entry["url"] for entry in (product_summary or []) if entry["status"] == "added"]
+    if product_summary:
+        print(f"📋 Cart fill summary: {len(added_urls)}/{len(product_summary)} product(s) added")
+        for entry in product_summary:
+            reason = f" - {entry['reason']}" if entry.get("reason") else ""
+            print(f"   • {entry['status'].upper()} x{entry['quantity']} {entry['url']}{reason}")
+
     print("🛍️ Opening cart to check for errors...")
     try:
-        page.locator("img[src*='bag']").first.click(force=True)
+        page.locator(BAG_ICON_SELECTOR).first.click(force=True)
         print("✅ Clicked bag icon")
     except Exception as e:
         print(f"⚠️ Failed to click bag icon: {e}")
         return False
         
-    time.sleep(2)
+    # Wait for the bag to render (checkout/login button or remove-items notice)
+    if wait_ready(page, "cart_drawer", timeout=2000) is None:
+        time.sleep(2)
 
     # Check if login button appears after opening bag
-    login_btn_selectors = [
-        "button:has-text('Login')",
-        "button:has-text('Log in')",
-        "button:has-text('Sign in')",
-        "span:has-text('Login')"
-    ]
-    
-    for selector in login_btn_selectors:
+    login = probe(page, {"login": LOGIN_BUTTON_SELECTORS})["login"]
+    if login["visible"]:
         try:
-            login_btn = page.locator(selector)
-            if login_btn.count() > 0 and login_btn.first.is_visible():
-                print(f"🔐 Login button found after opening bag! Clicking it...")
-                if robust_click(page, login_btn.first, method="locator"):
-                    print("✅ Login button clicked successfully")
-                    time.sleep(5)  # Wait for a few seconds
-                    
-                    # Request a new OTP using the same request_id if available
-                    if request_id and api_key and api_url:
-                        print("🔄 Requesting a new OTP...")
-                        try:
-                            from api_dynamic import set_status, get_otp
-                            set_status(3, request_id, api_key, api_url)  # Status 3 = request new OTP
-                            print("✅ New OTP request sent")
-                            
-                            # Wait a bit for OTP to arrive
-                            time.sleep(3)
-                            
-                            # Get the new OTP
-                            print("⏳ Getting new OTP (max 2 minutes)...")
-                            new_otp = get_otp(
-                                request_id=request_id,
-                                api_key=api_key,
-                                base_url=api_url,
-                                timeout_seconds=120.0,
-                                poll_interval=2.0
-                            )
-                            
-                            if new_otp:
-                                print(f"✅ Got new OTP: {new_otp}")
-                                
-                                # Enter the new OTP
-                                otp_boxes = page.locator("input[type='tel'][maxlength='1']")
-                                # Clear existing OTP
-                                for i in range(6):  # Assuming 6 digit OTP
-                                    try:
-                                        otp_boxes.nth(i).fill("")
-                                    except:
-                                        pass
-                                
-                                # Fill new OTP
-                                for i, digit in enumerate(new_otp):
-                                    otp_boxes.nth(i).fill(digit)
-                                time.sleep(1)
-                                
-                                # Click Verify OTP button
-                                print("🔘 Clicking Verify OTP button...")
-                                verify_btn = page.locator("button.Button_button__8B4nB.Button_active__8l_7k", has_text="Verify OTP")
-                                
-                                try:
-                                    verify_btn.wait_for(state="visible", timeout=5000)
-                                except:
-                                    print("⚠️ Verify button not visible, trying anyway...")
-                                
-                                time.sleep(0.5)
-                                
-                                # Try multiple click methods
-                                success = False
-                                try:
-                                    verify_btn.click(timeout=3000)
-                                    success = True
-                                    print("✅ Verify OTP clicked (regular)")
-                                except:
-                                    pass
-                                
-                                if not success:
-                                    try:
-                                        verify_btn.click(force=True, timeout=3000)
-                                        success = True
-                                        print("✅ Verify OTP clicked (force)")
-                                    except:
-                                        pass
-                                
-                                if not success:
-                                    try:
-                                        page.evaluate("(el) => el.click()", verify_btn.first)
-                                        success = True
-                                        print("✅ Verify OTP clicked (JS)")
-                                    except:
-                                        pass
-                                
-                                if not success:
-                                    if robust_click(page, verify_btn, method="locator"):
-                                        success = True
-                                        print("✅ Verify OTP clicked (robust)")
-                                
-                                if not success:
-                                    print("❌ Failed to click Verify OTP button")
-                                    page.screenshot(path="verify_otp_failed.png")
-                                
-                                time.sleep(2)
-                            else:
-                                print("❌ Failed to get new OTP within 2 minutes")
-                        except Exception as e:
-                            print(f"⚠️ Error requesting/getting new OTP: {e}")
-                    
-                    time.sleep(2)
-                    # After clicking login, the cart should reload - break and continue
-                    break
-                else:
-                    print("⚠️ Failed to click login button, continuing anyway...")
-        except Exception as e:
-            pass
-
+            print(f"🔐 Login button found after opening bag! Clicking it...")
+            if robust_click(page, page.locator(login["selector"]).first, method="locator"):
+                print("✅ Login button clicked successfully")
+                time.sleep(5)  # Wait for a few seconds
+                
+                # Request a new OTP using the same request_id if available
+                if request_id and api_key and api_url:
+                    try:
+                        login_with_new_otp(page, request_id, api_key, api_url)
+                    except Exception as e:
+                        print(f"⚠️ Error requesting/getting new OTP: {e}")
+                
+                # After clicking login, the cart should reload
+                time.sleep(2)
+            else:
+                print("⚠️ Failed to click login button, continuing anyway...")
+        except Exception as e:
+            pass
+
     # Check for "Remove Items & Proceed" text
-    remove_text_options = [
-        "Remove Items & Proceed",
-        "Remove Items",
-        "Remove Item & Proceed",
-        "Remove Item"
-    ]
-    
-    for text in remove_text_options:
-        if page.locator(f"text={text}").count() > 0:
-            if page.locator(f"text={text}").first.is_visible():
-                print(f"⚠️ Found '{text}' - Product needs to be removed (Delivery not available)")
-                return False  # Return False because error found
+    remove = probe(page, {"remove_items": REMOVE_ITEMS_SELECTORS})["remove_items"]
+    if remove["visible"]:
+        text = selector_label(remove["selector"])
+        print(f"⚠️ Found '{text}' - Product needs to be removed (Delivery not available)")
+        if len(added_urls) == 1:
+            # Only one product in the bag, so we know which one can't be delivered
+            availability_cache.mark_unavailable(added_urls[0], f"Not deliverable ('{text}' in cart)")
+        return False  # Return False because error found
             
     return True  # Return True if no errors found
 
 # =========================
-# MAIN
+# ADDRESS
 # =========================
-def main():
-    with sync_playwright() as p:
-        # Launch browser with optimized settings for parallel execution
-        # Added explicit stability arguments to prevent crashes in parallel mode
-        try:
-            browser_args = [
-                '--disable-blink-features=AutomationControlled',
-                '--disable-dev-shm-usage',  # Critical for Docker/parallel
-                '--disable-gpu',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-web-security',
-                '--disable-features=IsolateOrigins,site-per-process',
-                # Performance optimizations for parallel execution
-                '--disable-background-networking',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-breakpad',
-                '--disable-client-side-phishing-detection',
-                '--disable-component-extensions-with-background-pages',
-                '--disable-default-apps',
-                '--disable-extensions',
-                '--disable-features=TranslateUI',
-                '--disable-hang-monitor',
-                '--disable-ipc-flooding-protection',
-                '--disable-popup-blocking',
-                '--disable-prompt-on-repost',
-                '--disable-renderer-backgrounding',
-                '--disable-sync',
-                '--force-color-profile=srgb',
-                '--metrics-recording-only',
-                '--no-first-run',
-                '--password-store=basic',
-                '--use-mock-keychain',
-                '--mute-audio',  # Disable audio to save resources
-                '--disable-software-rasterizer',
-                # Memory optimizations
-                '--js-flags=--max-old-space-size=512',  # Limit JS heap to 512MB per instance
-                '--renderer-process-limit=2',  # Limit renderer processes
-            ]
+ADDRESS_FORM_SELECTOR = "input[name='userName']"
+CART_PROCEED_SELECTOR = "button.AddToCart_cartButton__tWwqP"
+PAYMENT_ITEM_SELECTOR = "div.Payment_methodItem__BLz7I"
+ADDRESS_ATTEMPTS = 2
+
+# Marks the smallest visible element that shows both the flat and the landmark
+# (a saved address card), climbing to its clickable container. Each value must
+# appear as a whole term (bounded by spaces, commas or the text's ends), so a
+# short flat like "1" doesn't match "B-1" or "12" on another card.
+FIND_SAVED_ADDRESS_JS = """
+([flat, landmark]) => {
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const escape = (s) => s.replace(/[.*+?^${}()|[\\]\\\\]/g, '\\\\$&');
+    const wanted = [norm(flat), norm(landmark)].map((w) => new RegExp(`(^|[\\\\s,])${escape(w)}(?=$|[\\\\s,.])`));
+    const matches = (el) => { const text = norm(el.textContent); return wanted.every((re) => re.test(text)); };
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'INPUT', 'TEXTAREA']);
+    for (const el of document.querySelectorAll('body *')) {
+        if (SKIP.has(el.tagName) || !matches(el)) continue;
+        if (Array.from(el.children).some(matches)) continue;
+        if (el.closest('form')) continue;
+        let target = el;
+        for (let node = el; node && node !== document.body; node = node.parentElement) {
+            if (node.matches('label, button, a, [role="radio"], [role="button"]') ||
+                getComputedStyle(node).cursor === 'pointer') {
+                target = node;
+                break;
+            }
+        }
+        const rect = target.getBoundingClientRect();
+        if (!rect.width || !rect.height) continue;
+        target.setAttribute('data-saved-address', '1');
+        return norm(target.textContent).slice(0, 120);
+    }
+    return null;
+}
+"""
+
+# Sets every field through the native value setter (so React sees the change); returns what stuck
+FILL_ADDRESS_FORM_JS = """
+(values) => {
+    const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    const filled = {};
+    for (const [name, value] of Object.entries(values)) {
+        const input = document.querySelector(`input[name="${name}"]`);
+        if (!input) continue;
+        input.focus();
+        setter.call(input, value);
+        input.dispatchEvent(new Event('input', {bubbles: true}));
+        input.dispatchEvent(new Event('change', {bubbles: true}));
+        input.blur();
+        filled[name] = input.value;
+    }
+    return filled;
+}
+"""
+
+
+def address_details():
+    """(name, house/flat, landmark) from the environment"""
+    return (
+        os.environ.get('AUTOMATION_NAME', ''),
+        os.environ.get('AUTOMATION_HOUSE_FLAT', ''),
+        os.environ.get('AUTOMATION_LANDMARK', ''),
+    )
+
 
+def dismiss_location_modal(page):
+    """Click Proceed on the "location changed" modal the checkout sometimes shows"""
+    try:
+        print("🔍 Checking for location change 'Proceed' button...")
+        proceed_modal_btn = page.locator("button:has-text('Proceed')")
+        
+        if proceed_modal_btn.count() > 0:
+            print("📍 Location change modal detected - clicking Proceed...")
+            proceed_modal_btn.wait_for(state="visible", timeout=3000)
             
-            browser = p.chromium.launch(
-                headless=True,  # Run in visible mode for local development
-                slow_mo=0,  # No delay for better performance
-                args=browser_args,
-                timeout=30000
-            )
+            # Try multiple click methods for reliability
+            if robust_click(page, proceed_modal_btn, method="locator"):
+                print("✅ Location modal 'Proceed' clicked (robust)")
+            else:
+                # Fallback: Try regular click
+                try:
+                    proceed_modal_btn.click(timeout=3000)
+                    print("✅ Location modal 'Proceed' clicked (regular)")
+                except:
+                    try:
+                        proceed_modal_btn.click(force=True, timeout=3000)
+                        print("✅ Location modal 'Proceed' clicked (force)")
+                    except:
+                        try:
+                            page.evaluate("(el) => el.click()", proceed_modal_btn.first)
+                            print("✅ Location modal 'Proceed' clicked (JS)")
+                        except:
+                            print("⚠️ Failed to click location modal Proceed button")
+            
+            motion.settle(2)  # Wait after modal dismissal
+        else:
+            print("ℹ️ No location modal detected, continuing...")
+    except Exception as e:
+        print(f"⚠️ Error checking for Proceed modal: {e}")
+        # Continue anyway - modal might not appear every time
+
+
+def select_saved_address(page, flat, landmark):
+    """Click a saved address that matches the configured flat and landmark; False if there is none"""
+    try:
+        label = page.evaluate(FIND_SAVED_ADDRESS_JS, [flat, landmark])
+    except Exception as e:
+        print(f"⚠️ Saved address lookup failed: {e}")
+        return False
+    if not label:
+        return False
+    print(f"🏠 Using saved address: {label}")
+    return robust_click(page, page.locator("[data-saved-address='1']").first, method="locator")
+
+
+def fill_address_form(page, name, flat, landmark):
+    """Fill the address form in one round trip and save it"""
+    print("📝 Filling address details...")
+    values = {"userName": name, "flat": flat, "landMark": landmark}
+    page.locator(ADDRESS_FORM_SELECTOR).wait_for(state="visible", timeout=10000)
+    filled = page.evaluate(FILL_ADDRESS_FORM_JS, values)
+    for field, value in values.items():
+        if filled.get(field) != value:
+            # The form ignored the programmatic value; type it the slow way
+            page.locator(f"input[name='{field}']").fill(value)
+    print(f"✅ Address filled: {name} / {flat} / {landmark}")
+
+    save_btn = page.locator("button.btn.btn-secondary", has_text="Save Address")
+    save_btn.wait_for(state="visible", timeout=5000)
+    if robust_click(page, save_btn, method="locator"):
+        print("✅ Save Address clicked")
+    else:
+        print("❌ Failed to click Save Address")
+
+
+def reached_payment(page):
+    """
+    The address step's postcondition: the payment list shows. If the cart's
+    Proceed button comes back instead (saving an address returns to the bag),
+    it is clicked once more.
+    """
+    payment = page.locator(PAYMENT_ITEM_SELECTOR).first
+    cart_proceed = page.locator(CART_PROCEED_SELECTOR).first
+    try:
+        payment.or_(cart_proceed).wait_for(state="visible", timeout=15000)
+    except Exception:
+        return False
+    if payment.is_visible():
+        return True
+    print("🔄 Cart 'Proceed' button is back - clicking it once more")
+    robust_click(page, cart_proceed, method="locator")
+    try:
+        payment.wait_for(state="visible", timeout=10000)
+        return True
+    except Exception:
+        return False
+
+
+def complete_address_step(page, browser):
+    """
+    From the cart to the payment list: select a saved address that matches
+    AUTOMATION_HOUSE_FLAT/AUTOMATION_LANDMARK when the account has one,
+    otherwise fill the address form in one batched call.
+    """
+    name, flat, landmark = address_details()
+    if not name or not flat or not landmark:
+        fail_and_exit("Order details (name, house/flat, landmark) are required but not configured", page, browser)
+
+    for attempt in range(1, ADDRESS_ATTEMPTS + 1):
+        print(f"🔄 Address Flow - attempt {attempt}/{ADDRESS_ATTEMPTS}")
+        try:
+            btn = page.locator(CART_PROCEED_SELECTOR)
+            btn.wait_for(state="visible", timeout=15000)
+            btn.click(force=True)
+            print("✅ Proceed to pay clicked")
         except Exception as e:
-            print(f"❌ CRITICAL: Failed to launch browser: {e}")
-            sys.exit(1)
+            print(f"⚠️ Potential error clicking proceed: {e}")
+            # Don't exit yet, might be already on address page
 
-        # Get location settings from environment
-        latitude = float(os.environ.get('LATITUDE', '26.994880'))
-        longitude = float(os.environ.get('LONGITUDE', '75.774836'))
-        should_select_location = os.environ.get('SELECT_LOCATION', '1') == '1'
-        
-            # Optimize context creation
-        context = browser.new_context(
+        motion.settle(1)
+        dismiss_location_modal(page)
+        try:
+            page.locator(f"{PAYMENT_ITEM_SELECTOR}, {ADDRESS_FORM_SELECTOR}, span.CartHeader_changeCta__92ZgT") \
+                .first.wait_for(state="visible", timeout=5000)
+        except Exception:
+            pass  # Saved address list only (its markup has no stable class)
+
+        state = probe(page, {
+            "payment": [PAYMENT_ITEM_SELECTOR],
+            "form": [ADDRESS_FORM_SELECTOR],
+            "add_address": ["button:has-text('Add Address')"],
+            "change_link": ["span.CartHeader_changeCta__92ZgT"],
+        })
+        if state["payment"]["visible"]:
+            print("✅ Address already set - on the payment page")
+            return
+
+        try:
+            if not state["form"]["visible"] and select_saved_address(page, flat, landmark):
+                pass
+            else:
+                if not state["form"]["visible"] and state["add_address"]["present"] and state["change_link"]["present"]:
+                    print("📍 'Add Address' shown - opening the address form via 'Change'")
+                    robust_click(page, page.locator("span.CartHeader_changeCta__92ZgT").first, method="locator")
+                fill_address_form(page, name, flat, landmark)
+        except Exception as e:
+            print(f"⚠️ Error in address step: {e}")
+
+        if reached_payment(page):
+            print("✅ Address step done - payment list is showing")
+            return
+        print("⚠️ Payment list did not show after the address step")
+
+    fail_and_exit(f"Failed to advance past address screen after {ADDRESS_ATTEMPTS} attempts", page, browser)
+
+# =========================
+# MAIN
+# =========================
+def launch_browser(p):
+    # Launch browser with optimized settings for parallel execution
+    # Added explicit stability arguments to prevent crashes in parallel mode
+    try:
+        browser = p.chromium.launch(
+            headless=True,  # Run in visible mode for local development
+            slow_mo=0,  # No delay for better performance
+            args=BROWSER_ARGS,
+            timeout=30000
+        )
+    except Exception as e:
+        print(f"❌ CRITICAL: Failed to launch browser: {e}")
+        sys.exit(1)
+    return browser
+
+
+def context_options():
+    """new_context() / launch_persistent_context() options for a checkout context"""
+    # Get location settings from environment
+    latitude = float(os.environ.get('LATITUDE', '26.994880'))
+    longitude = float(os.environ.get('LONGITUDE', '75.774836'))
+
+    # Optimize context creation
+    return dict(
         geolocation={"latitude": latitude, "longitude": longitude},
         permissions=["geolocation"],
         # Performance optimizations
-        viewport={"width": 1280, "height": 720},  # Smaller viewport
-        device_scale_factor=1,
-        has_touch=False,
-        is_mobile=False,
         java_script_enabled=True,
         bypass_csp=True,
         ignore_https_errors=True,
-        )
+        **profiles.context_options(),  # viewport/device (EXECUTION_PROFILE)
+        **motion.context_options(),
+    )
 
-        page = context.new_page()
-        page.goto("https://www.dealshare.in/", timeout=60000)
-        time.sleep(2)
 
-        # -----------------------------
-        # LOCATION
-        # -----------------------------
-        if should_select_location:
-            # Get location search settings from environment
-            search_input = os.environ.get('SEARCH_INPUT', 'chinu juice center')
-            location_text = os.environ.get('LOCATION_TEXT', 'Chinu Juice Center, Jaswant Nagar, mod, Khatipura, Jaipur, Rajasthan, India')
-            
-            print(f"📍 Location selection enabled")
-            print(f"   Search query: {search_input}")
-            print(f"   Location text: {location_text}")
-            
-            try:
-                print("➡ Trying normal location flow...")
-                select_location(page, search_input, location_text)
-            except (TimeoutError, PlaywrightError, Exception) as e:
-                error_msg = str(e)
-                if "Page closed" in error_msg or "TargetClosedError" in error_msg or "has been closed" in error_msg:
-                    print(f"❌ Location selection failed: Page was closed. Cannot continue.")
-                    raise
-                
-                print("⚠ Location selection failed, retrying...")
-                
-                # Retry up to 5 times
-                retry_success = False
-                for retry_attempt in range(1, 6):
-                    try:
-                        print(f"🔄 Retry attempt {retry_attempt}/5...")
-                        # Click address bar fallback
-                        page.wait_for_selector("p.Address_addressBold__GlDKW", timeout=8000)
-                        page.click("p.Address_addressBold__GlDKW")
-                        time.sleep(1)
-                        select_location(page, search_input, location_text)
-                        print(f"✅ Location selection succeeded on retry attempt {retry_attempt}")
-                        retry_success = True
-                        break
-                    except (TimeoutError, PlaywrightError, Exception) as retry_error:
-                        print(f"⚠️ Retry attempt {retry_attempt}/5 failed: {retry_error}")
-                        if retry_attempt == 5:
-                            print(f"❌ All 5 retry attempts failed. Last error: {retry_error}")
-                            ail_and_exit("Location Typing Error", page, browser)
-                            raise
-                        time.sleep(2)  # Wait before next retry
-        else:
-            print("⏭️ Location selection step skipped (disabled in settings)")
+def prepare_context(context, readiness=READINESS_ENABLED):
+    """Motion suppression and readiness signals for a checkout context"""
+    if motion.SUPPRESS_MOTION:
+        # Drawers/modals finish instantly, so motion.settle() pauses are skipped
+        motion.install(context)
+    if readiness:
+        global readiness_signals
+        readiness_signals = Readiness(context, dict(LANDMARKS, add_button=profiles.selectors("add_button")))
 
-        # -----------------------------
-        # LOGIN
-        # -----------------------------
-        time.sleep(2)
-        click_user_icon_with_retry(page)
 
-        
-        
-        # Get API configuration from environment
-        # Get API settings from environment variables (set by backend/server.py)
-        api_key = os.environ.get('API_KEY', '')
-        api_url = os.environ.get('API_URL', '')
-        country = os.environ.get('COUNTRY', '22')
-        operator = os.environ.get('OPERATOR', '10')
-        service = os.environ.get('SERVICE', 'lmeh')
-        
-        # Debug: Print API settings being used
-        print(f"[DEBUG] ========== API CONFIGURATION ==========")
-        print(f"[DEBUG] Step 1: Reading environment variables...")
-        print(f"[DEBUG]   API_KEY: {'SET' if api_key else 'NOT SET'}")
-        if api_key:
-            # Show masked version for security
-            masked_key = api_key[:4] + '*' * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else '****'
-            print(f"[DEBUG]   API_KEY (masked): {masked_key} (length: {len(api_key)})")
-            print(f"[DEBUG]   API_URL: {api_url}")
-            print(f"[DEBUG]   COUNTRY: {country}")
-            print(f"[DEBUG]   OPERATOR: {operator}")
-            print(f"[DEBUG]   SERVICE: {service}")
-            print(f"[DEBUG] ========================================")
-            
-        if not api_key:
-            fail_and_exit("API_KEY not found in environment variables", page, browser)
-        
-        if not api_url:
-            fail_and_exit("API_URL not found in environment variables", page, browser)
-        
-        print(f"[DEBUG] Step 2: API configuration validated successfully")
-        print(f"[DEBUG] Step 3: Proceeding to request phone number from API...")
-        
-        # Get phone number from API
-        print("📱 Requesting phone number from API...")
-        print(f"[DEBUG] Step 4: Calling get_number() with:")
-        print(f"[DEBUG]   service={service}")
-        print(f"[DEBUG]   country={country}")
-        print(f"[DEBUG]   operator={operator}")
-        print(f"[DEBUG]   api_key={api_key[:4] + '...' + api_key[-4:] if len(api_key) > 8 else '****'}")
-        print(f"[DEBUG]   base_url={api_url}")
-        number_result = get_number(
-            service=service,
-            country=country,
-            operator=operator,
-            api_key=api_key,
-            base_url=api_url
-        )
-        print(f"[DEBUG] Step 5: get_number() returned: {number_result}")
-        if not number_result:
-            fail_and_exit("Failed to get phone number from API", page, browser)
-        
-        request_id, phone_number = number_result
-        print(f"✅ Got phone number: {phone_number} (request_id: {request_id})")
-        
-        # Enter phone number
-        try:
-            phone_input = page.locator("input[placeholder='Ex 9876543210']")
-            phone_input.wait_for()
-            phone_input.fill(phone_number)
-            phone_input.press("Enter")
-        except Exception as e:
-            fail_and_exit(f"Failed to enter phone number: {e}", page, browser)
+def new_checkout_context(browser):
+    """Browser context with the order location, motion suppression and readiness signals"""
+    print(f"🖥️ Execution profile: {profiles.active()['name']}")
+    context = browser.new_context(**context_options())
+    prepare_context(context)
+    seed_location(context)
+    return context
 
-        # Wait a bit for OTP to be sent
-        print("⏳ Waiting for OTP (max 2 minutes)...")
-        time.sleep(3)
-        
-        # Get OTP from API (wait for 2 minutes)
-        otp = get_otp(
-            request_id=request_id,
-            api_key=api_key,
-            base_url=api_url,
-            timeout_seconds=120.0,
-            poll_interval=1.0
-        )
+
+def location_settings():
+    """(search query, suggestion text) for the location step, from the environment"""
+    search_input = os.environ.get('SEARCH_INPUT', 'chinu juice center')
+    location_text = os.environ.get('LOCATION_TEXT', 'Chinu Juice Center, Jaswant Nagar, mod, Khatipura, Jaipur, Rajasthan, India')
+    return search_input, location_text
+
+
+def seed_location(context):
+    """Give a fresh context the location state recorded by an earlier selection (see location_state.py)"""
+    if not location_state.LOCATION_FAST_PATH or os.environ.get('SELECT_LOCATION', '1') != '1':
+        return
+    state = location_state.load()
+    if state:
+        location_state.install(context, state)
+        print(f"📍 Location state seeded ({state['address_text']})")
+
+
+def location_fast_path_ok(page):
+    """True if the address bar already shows the recorded location (seeded state or geolocation)"""
+    state = location_state.load() if location_state.LOCATION_FAST_PATH else None
+    if not state:
+        return False
+    started = time.time()
+    try:
+        page.locator(ADDRESS_SELECTOR).first.wait_for(state="visible", timeout=5000)
+    except Exception:
+        pass
+    shown = probe(page, {"address": [ADDRESS_SELECTOR]})["address"]["text"]
+    ok = shown == state["address_text"]
+    location_state.record_validation(ok)
+    if ok:
+        print(f"⚡ Location fast path: '{shown}' validated in {time.time() - started:.1f}s")
+    else:
+        print(f"⚠️ Location fast path not valid (address bar: '{shown}'), using the location flow")
+    return ok
+
+
+def location_snapshot(page):
+    """Storage and address bar before a location selection (for remember_location)"""
+    try:
+        before = location_state.snapshot(page.context, page)
+    except Exception as e:
+        print(f"⚠️ Could not snapshot location state: {e}")
+        return None
+    before["address_text"] = probe(page, {"address": [ADDRESS_SELECTOR]})["address"]["text"]
+    return before
+
+
+def remember_location(page, before):
+    """Record what a successful location selection changed, for the fast path of later contexts"""
+    try:
+        before_address = before["address_text"]
+        address = None
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            address = probe(page, {"address": [ADDRESS_SELECTOR]})["address"]["text"]
+            if address and address != before_address:
+                break
+            time.sleep(0.25)
+        after = location_state.snapshot(page.context, page)
+        location_state.save(location_state.capture(before, after, address))
+    except Exception as e:
+        print(f"⚠️ Could not record location state: {e}")
+
+
+def choose_location(page, browser):
+    should_select_location = os.environ.get('SELECT_LOCATION', '1') == '1'
+
+    # -----------------------------
+    # LOCATION
+    # -----------------------------
+    set_step("location")
+    if should_select_location and location_fast_path_ok(page):
+        return
+    if should_select_location:
+        search_input, location_text = location_settings()
+        before = location_snapshot(page) if location_state.LOCATION_FAST_PATH else None
         
-        if not otp:
-            print("❌ Failed to get OTP within 2 minutes. Cancelling number...")
-            cancel_number(request_id, api_key, api_url)
-            fail_and_exit("Number cancelled due to OTP timeout", page, browser)
+        print(f"📍 Location selection enabled")
+        print(f"   Search query: {search_input}")
+        print(f"   Location text: {location_text}")
         
-        # OTP received - enter it
-        print(f"✅ Got OTP: {otp}")
-        otp_boxes = page.locator("input[type='tel'][maxlength='1']")
-        for i, digit in enumerate(otp):
-            otp_boxes.nth(i).fill(digit)
-        time.sleep(1)
-            
-            # Click Verify OTP button
-        print("🔘 Clicking Verify OTP button...")
-        verify_btn = page.locator("button.Button_button__8B4nB.Button_active__8l_7k", has_text="Verify OTP")
-            
-        # Wait for button to be visible and enabled
         try:
-            verify_btn.wait_for(state="visible", timeout=5000)
-        except:
-            print("⚠️ Verify button not visible, trying anyway...")
-            
-        time.sleep(0.5)
+            print("➡ Trying normal location flow...")
+            select_location(page, search_input, location_text)
+        except (TimeoutError, PlaywrightError, Exception) as e:
+            error_msg = str(e)
+            if "Page closed" in error_msg or "TargetClosedError" in error_msg or "has been closed" in error_msg:
+                print(f"❌ Location selection failed: Page was closed. Cannot continue.")
+                raise
             
-            # Try multiple click methods for verify button
-        success = False
+            print("⚠ Location selection failed, retrying...")
             
-            # Method 1: Regular click
+            # Retry up to 5 times
+            retry_success = False
+            for retry_attempt in range(1, 6):
+                try:
+                    print(f"🔄 Retry attempt {retry_attempt}/5...")
+                    # Click address bar fallback
+                    page.wait_for_selector(ADDRESS_SELECTOR, timeout=8000)
+                    page.locator(ADDRESS_SELECTOR).first.click()
+                    time.sleep(1)
+                    select_location(page, search_input, location_text)
+                    print(f"✅ Location selection succeeded on retry attempt {retry_attempt}")
+                    retry_success = True
+                    break
+                except (TimeoutError, PlaywrightError, Exception) as retry_error:
+                    print(f"⚠️ Retry attempt {retry_attempt}/5 failed: {retry_error}")
+                    if retry_attempt == 5:
+                        print(f"❌ All 5 retry attempts failed. Last error: {retry_error}")
+                        ail_and_exit("Location Typing Error", page, browser)
+                        raise
+                    time.sleep(2)  # Wait before next retry
+        if before is not None:
+            remember_location(page, before)
+    else:
+        print("⏭️ Location selection step skipped (disabled in settings)")
+
+
+def click_place_order(page, place_btn):
+    """Click the place order button, trying each click method in turn"""
+    success = False
+    
+    # Method 1: Regular click
+    try:
+        place_btn.click(timeout=5000)
+        success = True
+        print("✅ Place order clicked (regular)")
+    except Exception as e:
+        print(f"Regular click failed: {e}")
+    
+    # Method 2: Force click
+    if not success:
         try:
-            verify_btn.click(timeout=3000)
+            place_btn.click(force=True, timeout=5000)
             success = True
-            print("✅ Verify OTP clicked (regular)")
-        except:
-                pass
-            
-            # Method 2: Force click
-        if not success:
-                try:
-                    verify_btn.click(force=True, timeout=3000)
-                    success = True
-                    print("✅ Verify OTP clicked (force)")
-                except:
-                    pass
-            
-            # Method 3: JS click
-        if not success:
-                try:
-                    page.evaluate("(el) => el.click()", verify_btn.first)
-                    success = True
-                    print("✅ Verify OTP clicked (JS)")
-                except:
-                    pass
-            
-            # Method 4: Use robust_click helper
-        if not success:
-                if robust_click(page, verify_btn, method="locator"):
-                    success = True
-                    print("✅ Verify OTP clicked (robust)")
-            
-        if not success:
-                print("❌ Failed to click Verify OTP button")
-                page.screenshot(path="verify_otp_failed.png")
-            
-        time.sleep(1.5)
-                   
-        
-        # Cancel the number after entering OTP
-        print("🔄 Cancelling number after OTP entry...")
-        time.sleep(1)
-        cancel_result = cancel_number(request_id, api_key, api_url)
-        print(f"✅ Number cancelled: {cancel_result}")
-
-        print("✅ LOGIN SUCCESSFUL")
-
-        # -----------------------------
-        # PRODUCT
-        # -----------------------------
-        primary_product_url = os.environ.get('PRIMARY_PRODUCT_URL', '')
-        # -----------------------------
-        # PRODUCT FALLBACK SYSTEM
-        # -----------------------------
-        # -----------------------------
-        # PRODUCT SYSTEM
-        # -----------------------------
-        # Try to get products from JSON (new format), fall back to old format
-        product_urls = []
-        product_quantities = []
+            print("✅ Place order clicked (force)")
+        except Exception as e:
+            print(f"Force click failed: {e}")
+    
+    # Method 3: JS click
+    if not success:
+        try:
+            page.evaluate("(el) => el.click()", place_btn)
+            success = True
+            print("✅ Place order clicked (JS)")
+        except Exception as e:
+            print(f"JS click failed: {e}")
+    
+    # Method 4: Dispatch click event
+    if not success:
+        try:
+            place_btn.dispatch_event("click")
+            success = True
+            print("✅ Place order clicked (dispatch)")
+        except Exception as e:
+            print(f"Dispatch click failed: {e}")
+    
+    return success
+
+
+def run_order(page, browser):
+    """
+    One order on an open storefront page (location already selected): number,
+    login, cart, checkout. Returns on success; failures go through fail_and_exit().
+    """
+    # -----------------------------
+    # LOGIN
+    # -----------------------------
+    # Don't buy a number if other orders in this batch already found the products unavailable
+    product_urls, _ = load_products()
+    known_unavailable = availability_cache.unavailable_urls()
+    if product_urls and all(url in known_unavailable for url in product_urls):
+        fail_and_exit("All product URLs unavailable (reported by other orders in this batch)", page, browser, exit_code=5)
+    if os.environ.get('ORDER_ALL', '0') == '1' and any(url in known_unavailable for url in product_urls):
+        fail_and_exit("A required product is unavailable (reported by other orders in this batch)", page, browser)
+
+    set_step("login")
+    if probe(page, {"phone": [PHONE_INPUT_SELECTOR]})["phone"]["visible"]:
+        print("⚡ Login modal already open")
+    else:
+        time.sleep(2)
+        click_user_icon_with_retry(page)
+
+    
+    
+    # Get API configuration from environment
+    # Get API settings from environment variables (set by backend/server.py)
+    api_key = os.environ.get('API_KEY', '')
+    api_url = os.environ.get('API_URL', '')
+    country = os.environ.get('COUNTRY', '22')
+    operator = os.environ.get('OPERATOR', '10')
+    service = os.environ.get('SERVICE', 'lmeh')
+    
+    # Debug: Print API settings being used
+    print(f"[DEBUG] ========== API CONFIGURATION ==========")
+    print(f"[DEBUG] Step 1: Reading environment variables...")
+    print(f"[DEBUG]   API_KEY: {'SET' if api_key else 'NOT SET'}")
+    if api_key:
+        # Show masked version for security
+        masked_key = api_key[:4] + '*' * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else '****'
+        print(f"[DEBUG]   API_KEY (masked): {masked_key} (length: {len(api_key)})")
+        print(f"[DEBUG]   API_URL: {api_url}")
+        print(f"[DEBUG]   COUNTRY: {country}")
+        print(f"[DEBUG]   OPERATOR: {operator}")
+        print(f"[DEBUG]   SERVICE: {service}")
+        print(f"[DEBUG] ========================================")
         
-        products_json = os.environ.get('PRODUCTS_JSON', '')
-        if products_json:
+    if not api_key:
+        fail_and_exit("API_KEY not found in environment variables", page, browser)
+    
+    if not api_url:
+        fail_and_exit("API_URL not found in environment variables", page, browser)
+    
+    print(f"[DEBUG] Step 2: API configuration validated successfully")
+    print(f"[DEBUG] Step 3: Proceeding to request phone number from API...")
+    
+    # Get phone number from API
+    set_step("get_number")
+    print("📱 Requesting phone number from API...")
+    print(f"[DEBUG] Step 4: Calling get_number() with:")
+    print(f"[DEBUG]   service={service}")
+    print(f"[DEBUG]   country={country}")
+    print(f"[DEBUG]   operator={operator}")
+    print(f"[DEBUG]   api_key={api_key[:4] + '...' + api_key[-4:] if len(api_key) > 8 else '****'}")
+    print(f"[DEBUG]   base_url={api_url}")
+    number_result = get_number(
+        service=service,
+        country=country,
+        operator=operator,
+        api_key=api_key,
+        base_url=api_url
+    )
+    print(f"[DEBUG] Step 5: get_number() returned: {number_result}")
+    if not number_result:
+        fail_and_exit("Failed to get phone number from API", page, browser)
+    
+    request_id, phone_number = number_result
+    print(f"✅ Got phone number: {phone_number} (request_id: {request_id})")
+    number_registry.register(
+        request_id, api_key, api_url,
+        batch_id=os.environ.get('BATCH_ID'),
+        order_number=os.environ.get('ORDER_NUMBER')
+    )
+    
+    # Enter phone number
+    try:
+        phone_input = page.locator(PHONE_INPUT_SELECTOR)
+        phone_input.wait_for()
+        phone_input.fill(phone_number)
+        phone_input.press("Enter")
+    except Exception as e:
+        fail_and_exit(f"Failed to enter phone number: {e}", page, browser)
+
+    # Poll for the OTP right away (the session ignores codes that were already used)
+    set_step("otp")
+    print("⏳ Waiting for OTP (max 2 minutes)...")
+    otp_session = otp_manager.start(request_id, api_key, api_url)
+    otp_result = {}
+    otp_done = threading.Event()
+
+    def poll_otp():
+        try:
+            with order_trace.span("otp_wait", lane="otp") as span:
+                otp_result["otp"] = otp_session.wait(timeout_seconds=120.0)
+                span["result"] = "received" if otp_result["otp"] else "none"
+        finally:
+            otp_done.set()
+
+    # The provider is polled in the background; Playwright stays on this thread for the preload tab
+    threading.Thread(target=poll_otp, name="otp-poll", daemon=True).start()
+    if PRELOAD_DURING_OTP:
+        preload_products(page.context, otp_done)
+    otp_done.wait()
+    otp = otp_result.get("otp")
+    
+    if not otp:
+        print("❌ Failed to get OTP within 2 minutes. Cancelling number...")
+        cancel_number(request_id, api_key, api_url)
+        number_registry.release(request_id)
+        fail_and_exit("Number cancelled due to OTP timeout", page, browser)
+    
+    # OTP received - enter it
+    print(f"✅ Got OTP: {otp}")
+    enter_otp_and_verify(page, otp)
+    otp_session.consume()
+    time.sleep(1.5)
+               
+    
+    # Cancel the number after entering OTP
+    print("🔄 Cancelling number after OTP entry...")
+    time.sleep(1)
+    cancel_result = cancel_number(request_id, api_key, api_url)
+    number_registry.release(request_id)
+    otp_session.expire("number cancelled after login")
+    print(f"✅ Number cancelled: {cancel_result}")
+
+    print("✅ LOGIN SUCCESSFUL")
+
+    # -----------------------------
+    # PRODUCT
+    # -----------------------------
+    # Try to get products from JSON (new format), fall back to old format
+    product_urls, product_quantities = load_products()
+    
+    if len(product_urls) == 0:
+        fail_and_exit("At least one product URL is required but not configured", page, browser)
+    
+    print(f"📋 Found {len(product_urls)} product URLs to try")
+    print(f"🔢 Quantities: {product_quantities}")
+
+    
+    # Check if ORDER_ALL mode is enabled
+    order_all = os.environ.get('ORDER_ALL', '0') == '1'
+    
+    cart_success = False
+    
+    if order_all:
+        # ORDER ALL MODE: Add all products first, then check cart once
+        print("🛒 ORDER ALL mode enabled - Adding all products...")
+    else:
+        # FALLBACK MODE: Try adding each product one by one (without opening bag)
+        print("🛒 FALLBACK mode - Adding products one by one...")
+    
+    # Add products, then check cart at the end. ORDER ALL needs every product;
+    # FALLBACK skips unavailable ones and continues with the rest.
+    set_step("add_to_cart")
+    all_added = True
+    product_summary = []
+    
+    if order_all and len(product_urls) > 1 and PARALLEL_CART_TABS > 1:
+        # Every product is required: load them side by side in extra tabs
+        product_summary = add_products_parallel(page, product_urls, product_quantities)
+        all_added = all(entry["status"] == "added" for entry in product_summary)
+        if all_added:
+            # Other tabs changed the cart; sync this page once before opening the bag
             try:
-                import json
-                products = json.loads(products_json)
-                for product in products:
-                    url = product.get('url', '').strip()
-                    quantity = int(product.get('quantity', 1))
-                    if url:
-                        product_urls.append(url)
-                        product_quantities.append(quantity)
+                page.reload(timeout=45000)
             except Exception as e:
-                print(f"⚠️ Failed to parse PRODUCTS_JSON: {e}, falling back to old format")
-        
-        # Fall back to old format if no products from JSON
-        if len(product_urls) == 0:
-            primary_product_url = os.environ.get('PRIMARY_PRODUCT_URL', '').strip()
-            secondary_product_url = os.environ.get('SECONDARY_PRODUCT_URL', '').strip()
-            third_product_url = os.environ.get('THIRD_PRODUCT_URL', '').strip()
-            primary_product_quantity = int(os.environ.get('PRIMARY_PRODUCT_QUANTITY', '1'))
-            secondary_product_quantity = int(os.environ.get('SECONDARY_PRODUCT_QUANTITY', '1'))
-            third_product_quantity = int(os.environ.get('THIRD_PRODUCT_QUANTITY', '1'))
-            
-            if primary_product_url:
-                product_urls.append(primary_product_url)
-                product_quantities.append(primary_product_quantity)
-            if secondary_product_url:
-                product_urls.append(secondary_product_url)
-                product_quantities.append(secondary_product_quantity)
-            if third_product_url:
-                product_urls.append(third_product_url)
-                product_quantities.append(third_product_quantity)
-        
-        if len(product_urls) == 0:
-            fail_and_exit("At least one product URL is required but not configured", page, browser)
-        
-        print(f"📋 Found {len(product_urls)} product URLs to try")
-        print(f"🔢 Quantities: {product_quantities}")
-
-        
-        # Check if ORDER_ALL mode is enabled
-        order_all = os.environ.get('ORDER_ALL', '0') == '1'
-        
-        cart_success = False
-        
-        if order_all:
-            # ORDER ALL MODE: Add all products first, then check cart once
-            print("🛒 ORDER ALL mode enabled - Adding all products...")
-        else:
-            # FALLBACK MODE: Try adding each product one by one (without opening bag)
-            print("🛒 FALLBACK mode - Adding products one by one...")
-        
-        # Both modes now work the same: add all products, then check cart at the end
-        all_added = True
-        
+                print(f"⚠️ Reload after parallel cart fill failed: {e}")
+    else:
+        known_unavailable = availability_cache.unavailable_urls()
         for i, (url, quantity) in enumerate(zip(product_urls, product_quantities)):
+            if url in known_unavailable:
+                print(f"⏭️ [Product {i+1}/{len(product_urls)}] Skipping {url} - {known_unavailable[url]} (seen by another order)")
+                product_summary.append({"url": url, "quantity": quantity, "status": "unavailable",
+                                        "reason": known_unavailable[url], "seconds": 0.0})
+                if order_all:
+                    all_added = False
+                    break
+                continue
+            
             print(f"🔄 [Product {i+1}/{len(product_urls)}] Adding: {url} (quantity: {quantity})")
+            entry = {"url": url, "quantity": quantity, "status": "failed", "reason": None}
+            started = time.time()
             
             try:
                 if not add_product_only(page, url, quantity):
                     print(f"⚠️ Failed to add product {i+1}")
-                    all_added = False
-                    break
+                    entry["reason"] = "ADD failed"
                 else:
                     print(f"✅ Product {i+1} added successfully")
+                    entry["status"] = "added"
+            except QuantityNotSet as e:
+                # The product is in the cart with the wrong quantity: don't order the rest without it
+                fail_and_exit(f"Product {i+1}: {e}", page, browser)
             except Exception as e:
                 print(f"❌ Error adding product {i+1}: {e}")
+                entry["reason"] = str(e)
+            entry["seconds"] = round(time.time() - started, 2)
+            product_summary.append(entry)
+            if order_all and entry["status"] != "added":
                 all_added = False
                 break
-        
-        if not all_added:
-            print("❌ Failed to add all products - Closing windows")
-            fail_and_exit("Failed to add all products", page, browser)
-        
-        # After adding all products, open bag and check for errors
-        print("✅ All products added. Opening bag and checking for errors...")
-        if not check_cart_for_errors(page, request_id, api_key, api_url):
-            print("⚠️ Cart check found errors (remove_text_options detected) - Closing windows")
-            fail_and_exit("Cart check found errors (Delivery not available)", page, browser)
-        
-        print("✅ Cart check passed - ready to proceed")
-        
-        time.sleep(1)
+    
+    added_urls = [entry["url"] for entry in product_summary if entry["status"] == "added"]
+    if not added_urls:
+        all_added = False
+    
+    if not all_added:
+        print("❌ Failed to add all products - Closing windows")
+        known_unavailable = availability_cache.unavailable_urls()
+        if all(url in known_unavailable for url in product_urls):
+            # Every product is out of stock/undeliverable: stop the whole batch (exit code 5)
+            fail_and_exit("All product URLs unavailable", page, browser, exit_code=5)
+        fail_and_exit("Failed to add all products", page, browser)
+    
+    # After adding all products, open bag and check for errors
+    print(f"✅ {len(added_urls)} product(s) added. Opening bag and checking for errors...")
+    set_step("cart_check")
+    if not check_cart_for_errors(page, request_id, api_key, api_url, product_summary=product_summary):
+        print("⚠️ Cart check found errors (remove_text_options detected) - Closing windows")
+        fail_and_exit("Cart check found errors (Delivery not available)", page, browser)
+    
+    print("✅ Cart check passed - ready to proceed")
+    
+    time.sleep(1)
 
-        # -----------------------------
-        # ADDRESS LOOP (Retry until proceeded)
-        # -----------------------------
-        address_retry = 0
-        while True:
-            print(f"🔄 Address Flow - Attempt {address_retry + 1}")
-            
-            # Click Proceed to Pay/Checkout
-            try:
-                btn = page.locator("button.AddToCart_cartButton__tWwqP")
-                btn.wait_for(state="visible", timeout=15000)
-                btn.click(force=True)
-                print("✅ Proceed to pay clicked")
-            except Exception as e:
-                print(f"⚠️ Potential error clicking proceed: {e}")
-                # Don't exit yet, might be already on address page
-            
-            time.sleep(2)
+    # -----------------------------
+    # ADDRESS
+    # -----------------------------
+    set_step("address")
+    complete_address_step(page, browser)
+    
+    # -----------------------------
+    # PAYMENT
+    # -----------------------------
+    set_step("payment")
+    print("💳 Selecting payment method...")
+
+    # Wait for payment page to stabilize
+    ready = wait_ready(page, "payment_list", timeout=6000)
+    if ready is None:
+        time.sleep(6)
+
+    # Try multiple methods to select COD
+    cod_selected = False
+    cod_state = probe(page, {
+        "by_class": ["div.Payment_methodItem__BLz7I:has-text('Cash on Delivery')"],
+        "by_text": ["text=Cash on Delivery"],
+        "by_image": ["img[alt='COD']"],
+    })
+
+    # Method 1: Find by class and text
+    print("🔄 Trying Method 1: class + text...")
+    try:
+        cod_option = page.locator("div.Payment_methodItem__BLz7I:has-text('Cash on Delivery')")
+        if cod_state["by_class"]["present"]:
+            print(f"  Found {cod_state['by_class']['count']} COD options")
+            first_option = cod_option.first
+            first_option.scroll_into_view_if_needed(timeout=3000)
+            motion.settle(0.5)
+            first_option.click(force=True, timeout=3000)
+            print("✅ COD selected (Method 1)")
+            cod_selected = True
+    except Exception as e:
+        print(f"⚠️ Method 1 failed: {e}")
 
-            # Check for location change "Proceed" modal button
-            try:
-                print("🔍 Checking for location change 'Proceed' button...")
-                proceed_modal_btn = page.locator("button:has-text('Proceed')")
-                
-                if proceed_modal_btn.count() > 0:
-                    print("📍 Location change modal detected - clicking Proceed...")
-                    proceed_modal_btn.wait_for(state="visible", timeout=3000)
-                    
-                    # Try multiple click methods for reliability
-                    if robust_click(page, proceed_modal_btn, method="locator"):
-                        print("✅ Location modal 'Proceed' clicked (robust)")
-                    else:
-                        # Fallback: Try regular click
-                        try:
-                            proceed_modal_btn.click(timeout=3000)
-                            print("✅ Location modal 'Proceed' clicked (regular)")
-                        except:
-                            try:
-                                proceed_modal_btn.click(force=True, timeout=3000)
-                                print("✅ Location modal 'Proceed' clicked (force)")
-                            except:
-                                try:
-                                    page.evaluate("(el) => el.click()", proceed_modal_btn.first)
-                                    print("✅ Location modal 'Proceed' clicked (JS)")
-                                except:
-                                    print("⚠️ Failed to click location modal Proceed button")
-                    
-                    time.sleep(2)  # Wait after modal dismissal
-                else:
-                    print("ℹ️ No location modal detected, continuing...")
-            except Exception as e:
-                print(f"⚠️ Error checking for Proceed modal: {e}")
-                # Continue anyway - modal might not appear every time
+    # Method 2: Find by text only
+    if not cod_selected:
+        print("🔄 Trying Method 2: text only...")
+        try:
+            cod_text = page.locator("text=Cash on Delivery")
+            if cod_state["by_text"]["present"]:
+                print(f"  Found {cod_state['by_text']['count']} text matches")
+                first_text = cod_text.first
+                first_text.scroll_into_view_if_needed(timeout=3000)
+                motion.settle(0.5)
+                first_text.click(force=True, timeout=3000)
+                print("✅ COD selected (Method 2)")
+                cod_selected = True
+        except Exception as e:
+            print(f"⚠️ Method 2 failed: {e}")
 
+    # Method 3: Find by COD image
+    if not cod_selected:
+        print("🔄 Trying Method 3: COD image...")
+        try:
+            cod_img = page.locator("img[alt='COD']")
+            if cod_state["by_image"]["present"]:
+                print(f"  Found {cod_state['by_image']['count']} COD images")
+                first_img = cod_img.first
+                first_img.scroll_into_view_if_needed(timeout=3000)
+                motion.settle(0.5)
+                first_img.click(force=True, timeout=3000)
+                print("✅ COD selected (Method 3)")
+                cod_selected = True
+        except Exception as e:
+            print(f"⚠️ Method 3 failed: {e}")
 
-            # Check for "Add Address" scenario and handle "Change" flow
-            try:
-                print("🔍 Checking for 'Add Address' button...")
-                time.sleep(1)
-                
-                # Check if "Add Address" button exists (indicating we need to change address)
-                add_address_btn = page.locator("button:has-text('Add Address')")
+    # Method 4: Iterate through payment items
+    if not cod_selected:
+        print("🔄 Trying Method 4: iterate containers...")
+        try:
+            all_items = page.locator("div.Payment_methodItem__BLz7I")
+            count = all_items.count()
+            print(f"  Found {count} payment items")
+            
+            for i in range(count):
+                item = all_items.nth(i)
+                text = item.text_content()
+                print(f"    Item {i}: {text[:50]}")
                 
-                if add_address_btn.count() > 0:
-                    print("📍 'Add Address' button detected - clicking 'Change' to update address...")
-                    
-                    # Click on "Change" link
-                    change_link = page.locator("span.CartHeader_changeCta__92ZgT")
-                    if change_link.count() > 0:
-                        change_link.wait_for(state="visible", timeout=5000)
-                        
-                        # Try multiple click methods
-                        if robust_click(page, change_link, method="locator"):
-                            print("✅ 'Change' link clicked (robust)")
-                        else:
-                            try:
-                                change_link.click(timeout=3000)
-                                print("✅ 'Change' link clicked (regular)")
-                            except:
-                                try:
-                                    change_link.click(force=True, timeout=3000)
-                                    print("✅ 'Change' link clicked (force)")
-                                except:
-                                    print("⚠️ Failed to click 'Change' link")
-                        
-                        time.sleep(2)
-                        
-                        # Get address details from environment
-                        automation_name = os.environ.get('AUTOMATION_NAME', '')
-                        automation_house_flat = os.environ.get('AUTOMATION_HOUSE_FLAT', '')
-                        automation_landmark = os.environ.get('AUTOMATION_LANDMARK', '')
-                        
-                        if automation_name and automation_house_flat and automation_landmark:
-                            # Fill address form
-                            try:
-                                print("📝 Filling address in 'Change' flow...")
-                                
-                                # Wait for form
-                                page.wait_for_selector("input[name='userName']", state="visible", timeout=10000)
-                                time.sleep(1)
-                                
-                                # Fill name
-                                name_input = page.locator("input[name='userName']")
-                                name_input.fill(automation_name)
-                                print(f"✅ Filled name: {automation_name}")
-                                time.sleep(0.5)
-                                
-                                # Fill flat
-                                flat_input = page.locator("input[name='flat']")
-                                flat_input.fill(automation_house_flat)
-                                print(f"✅ Filled house/flat: {automation_house_flat}")
-                                time.sleep(0.5)
-                                
-                                # Fill landmark
-                                landmark_input = page.locator("input[name='landMark']")
-                                landmark_input.fill(automation_landmark)
-                                print(f"✅ Filled landmark: {automation_landmark}")
-                                time.sleep(1)
-                                
-                                # Click Save Address
-                                save_btn = page.locator("button.btn.btn-secondary", has_text="Save Address")
-                                save_btn.wait_for(state="visible", timeout=5000)
-                                time.sleep(0.5)
-                                
-                                if robust_click(page, save_btn, method="locator"):
-                                    print("✅ Save Address clicked in 'Change' flow")
-                                else:
-                                    print("⚠️ Failed to click Save Address")
-                                
-                                time.sleep(3)
-                                
-                                # Check if cart proceed button appeared again
-                                print("🔍 Checking if cart 'Proceed' button reappeared...")
-                                cart_proceed_btn = page.locator("button.AddToCart_cartButton__tWwqP")
-                                
-                                if cart_proceed_btn.count() > 0 and cart_proceed_btn.first.is_visible():
-                                    print("🔄 Cart 'Proceed' button detected again - clicking...")
-                                    
-                                    if robust_click(page, cart_proceed_btn, method="locator"):
-                                        print("✅ Cart 'Proceed' re-clicked (robust)")
-                                    else:
-                                        try:
-                                            cart_proceed_btn.click(force=True, timeout=3000)
-                                            print("✅ Cart 'Proceed' re-clicked (force)")
-                                        except:
-                                            print("⚠️ Failed to re-click cart Proceed button")
-                                    
-                                    time.sleep(2)
-                                else:
-                                    print("ℹ️ Cart 'Proceed' button not found, continuing...")
-                                
-                            except Exception as e:
-                                print(f"⚠️ Error filling address in 'Change' flow: {e}")
-                        else:
-                            print("⚠️ Address details missing, skipping 'Change' flow")
-                    else:
-                        print("⚠️ 'Change' link not found")
-                else:
-                    print("ℹ️ No 'Add Address' button detected, continuing to normal flow...")
-                    
-            except Exception as e:
-                print(f"⚠️ Error in 'Change' address flow: {e}")
-                # Continue anyway
-
+                if "Cash on Delivery" in text or "COD" in text:
+                    print(f"    ✓ Found COD at index {i}")
+                    item.scroll_into_view_if_needed(timeout=3000)
+                    motion.settle(0.5)
+                    item.click(force=True, timeout=3000)
+                    print("✅ COD selected (Method 4)")
+                    cod_selected = True
+                    break
+        except Exception as e:
+            print(f"⚠️ Method 4 failed: {e}")
 
+    # Method 5: JavaScript click
+    if not cod_selected:
+        print("🔄 Trying Method 5: JavaScript...")
+        try:
+            result = page.evaluate("""
+                () => {
+                    // Find all divs
+                    const divs = document.querySelectorAll('div');
+                    for (let div of divs) {
+                        const text = div.textContent || '';
+                        if (text.includes('Cash on Delivery') || text.includes('COD')) {
+                            div.click();
+                            return true;
+                        }
+                    }
+                    return false;
+                }
+            """)
+            if result:
+                print("✅ COD selected (Method 5)")
+                cod_selected = True
+            else:
+                print("⚠️ Method 5: JS found no matching element")
+        except Exception as e:
+            print(f"⚠️ Method 5 failed: {e}")
 
-            # ADDRESS DETAILS
-            # -----------------------------
-            print("📝 Filling address details...")
-            
-            # Get order details from environment variables
-            automation_name = os.environ.get('AUTOMATION_NAME', '')
-            automation_house_flat = os.environ.get('AUTOMATION_HOUSE_FLAT', '')
-            automation_landmark = os.environ.get('AUTOMATION_LANDMARK', '')
-            
-            print(f"[DEBUG] Order details from environment:")
-            print(f"[DEBUG]   Name: {automation_name}")
-            print(f"[DEBUG]   House/Flat: {automation_house_flat}")
-            print(f"[DEBUG]   Landmark: {automation_landmark}")
-            
-            if not automation_name or not automation_house_flat or not automation_landmark:
-                fail_and_exit("Order details (name, house/flat, landmark) are required but not configured", page, browser)
+    # Method 6: Find paragraph and click parent
+    if not cod_selected:
+        print("🔄 Trying Method 6: paragraph parent...")
+        try:
+            paragraphs = page.locator("p.text-medium-xl")
+            count = paragraphs.count()
+            print(f"  Found {count} paragraphs")
             
-            try:
-                # Wait for form to be visible (implies we are on address page)
-                page.wait_for_selector("input[name='userName']", state="visible", timeout=10000)
-                time.sleep(1)
+            for i in range(count):
+                p = paragraphs.nth(i)
+                text = p.text_content()
+                if "Cash on Delivery" in text:
+                    print(f"    ✓ Found COD paragraph")
+                    # Click the paragraph itself
+                    p.scroll_into_view_if_needed(timeout=3000)
+                    motion.settle(0.5)
+                    p.click(force=True, timeout=3000)
+                    print("✅ COD selected (Method 6)")
+                    cod_selected = True
+                    break
+        except Exception as e:
+            print(f"⚠️ Method 6 failed: {e}")
 
-                # Fill name
-                name_input = page.locator("input[name='userName']")
-                name_input.fill(automation_name)
-                print(f"✅ Filled name: {automation_name}")
-                time.sleep(0.5)
-
-                # Fill flat
-                flat_input = page.locator("input[name='flat']")
-                flat_input.fill(automation_house_flat)
-                print(f"✅ Filled house/flat: {automation_house_flat}")
-                time.sleep(0.5)
-
-                # Fill landmark
-                landmark_input = page.locator("input[name='landMark']")
-                landmark_input.fill(automation_landmark)
-                print(f"✅ Filled landmark: {automation_landmark}")
-                time.sleep(1)
+    # Final check
+    if not cod_selected:
+        print("❌ Failed to select COD payment method after all attempts")
+        capture_screenshot(page, "cod_selection_failed", full_page=True)
+        raise Exception("Could not select Cash on Delivery")
 
-                # Save address with robust clicking
-                print("💾 Saving address...")
-                
-                # Use text selector to get the correct button
-                save_btn = page.locator("button.btn.btn-secondary", has_text="Save Address")
-                
-                # Wait for button to be visible and enabled
-                save_btn.wait_for(state="visible", timeout=5000)
-                time.sleep(0.5)
-                
-                # Try multiple click methods
-                if robust_click(page, save_btn, method="locator"):
-                    print("✅ Address saved successfully")
-                else:
-                    print("❌ Failed to save address (click failed)")
-                    # We continue to verification step anyway
-            except Exception as e:
-                 print(f"⚠️ Error filling address: {e}")
-                 # Continue to check status
-            
-            time.sleep(3)
+    print("✅ COD payment method confirmed")
+
+    if wait_ready(page, "place_order", timeout=2000) is None:
+        time.sleep(2)
+    set_step("place_order")
+    print("📦 Attempting to place order...")
+    
+    # Try multiple selectors for the place order button
+    place_btn = None
+    place_state = probe(page, {
+        "by_class": ["button.CodView_orderButton__E53_u"],
+        "by_text": ["button:has-text('Place Order')"],
+        "by_type": ["button[type='button']"],
+    })
+    
+    # Selector 1: Class name
+    if place_state["by_class"]["present"]:
+        place_btn = page.locator("button.CodView_orderButton__E53_u").first
+        print("Found button via class")
+    
+    # Selector 2: Text content
+    elif place_state["by_text"]["present"]:
+        place_btn = page.locator("button:has-text('Place Order')").first
+        print("Found button via text")
+    
+    # Selector 3: Any button in COD view
+    elif place_state["by_type"]["present"]:
+        place_btn = page.locator("button[type='button']").last
+        print("Found button via type")
+    
+    if place_btn:
+        # Wait for button to be ready
+        try:
+            place_btn.wait_for(state="visible", timeout=5000)
+        except:
+            print("⚠️ Button not visible, trying anyway...")
+        
+        # Scroll into view
+        try:
+            place_btn.scroll_into_view_if_needed()
+            motion.settle(1)
+        except:
+            pass
+        
+        # The click is wrapped so the place-order response is caught the moment it arrives
+        order_response = None
+        try:
+            with page.expect_response(order_confirmation.is_place_order_response,
+                                      timeout=order_confirmation.ORDER_RESPONSE_TIMEOUT_MS) as response_info:
+                if not click_place_order(page, place_btn):
+                    fail_and_exit("All click methods failed!", page, browser)
+            order_response = response_info.value
+        except TimeoutError:
+            print(f"⚠️ No place-order response within {order_confirmation.ORDER_RESPONSE_TIMEOUT_MS} ms")
+        
+        print("🎉 PLACE ORDER TRIGGERED")
+        result = order_confirmation.parse(order_response) if order_response else None
+        print(f"📦 Place-order response: {order_confirmation.describe(result)}")
+        if result and result["failed"]:
+            fail_and_exit(f"Order rejected by the storefront ({result['reason']})", page, browser)
+        
+        screenshot_path = None
+        if result and result["ok"]:
+            print(f"✅ Order confirmed by the storefront: {result['order_id']}")
+            if order_confirmation.SCREENSHOT_ON_SUCCESS:
+                screenshot_path = capture_screenshot(page, "order_result")
+        else:
+            # Unconfirmed by the network: fall back to the on-page checks
+            print("⚠️ Order not confirmed by a response - checking the page")
+            if wait_ready(page, "order_result", timeout=2000) is None:
+                time.sleep(2)
+            screenshot_path = capture_screenshot(page, "order_result")
             
-            # -----------------------------
-            # VERIFY ADVANCEMENT
-            # -----------------------------
-            # Check if "Proceed" button (AddToCart) is still visible
-            # If visible, it means we are stuck or bounced back
-            proceed_btn_check = page.locator("button.AddToCart_cartButton__tWwqP")
-            if proceed_btn_check.count() > 0 and proceed_btn_check.first.is_visible():
-                print("⚠️ 'Proceed' button still visible - Address flow did not advance. Retrying...")
-                address_retry += 1
-                if address_retry > 20: # Max retries
-                    fail_and_exit("Failed to advance past address screen after 20 retries", page, browser)
-                time.sleep(1)
-                continue
-            else:
-                print("✅ Check passed: 'Proceed' button is gone. Flow advanced.")
-                break
+            # Check for common error texts
+            error_texts = ["Something went wrong", "Out of Stock", "Not available", "Sold Out"]
+            order_error = probe(page, {"error": text_selectors(error_texts)})["error"]
+            if order_error["visible"]:
+                error_reason = selector_label(order_error["selector"])
+                print(f"❌ Error detected after place order: {error_reason}")
+                fail_and_exit(f"Order failed due to post-click error: {error_reason}", page, browser)
         
-        time.sleep(3)
-
-        # -----------------------------
-        # PAYMENT
-        # -----------------------------
-        print("💳 Selecting payment method...")
-
-        # Wait for payment page to stabilize
-        time.sleep(3)
-
-        # Try multiple methods to select COD
-        cod_selected = False
-
-        # Method 1: Find by class and text
-        print("🔄 Trying Method 1: class + text...")
+        # Log to CSV
         try:
-            cod_option = page.locator("div.Payment_methodItem__BLz7I:has-text('Cash on Delivery')")
-            if cod_option.count() > 0:
-                print(f"  Found {cod_option.count()} COD options")
-                first_option = cod_option.first
-                first_option.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.5)
-                first_option.click(force=True, timeout=3000)
-                print("✅ COD selected (Method 1)")
-                cod_selected = True
+            save_order_to_csv(
+                screenshot_url=screenshot_path,
+                status="success",
+                order_number=os.environ.get('ORDER_NUMBER'),
+                order_id=result["order_id"] if result else None,
+                amount=result["amount"] if result else None
+            )
+            print("📝 Order info logged to my_orders.csv")
         except Exception as e:
-            print(f"⚠️ Method 1 failed: {e}")
+            print(f"❌ Failed to log to CSV: {e}")
+        
+        print("✅ No errors detected after placement.")
+        order_trace.finish("success")
+        print("TRIGGER_ORDER_SUCCESS")
+        return
+    else:
+        fail_and_exit("Could not find place order button!", page, browser)
+    
+    # This should never be reached, but just in case
+    fail_and_exit("Unknown error (end of script reached unexpectedly)", page, browser)
 
-        # Method 2: Find by text only
-        if not cod_selected:
-            print("🔄 Trying Method 2: text only...")
-            try:
-                cod_text = page.locator("text=Cash on Delivery")
-                if cod_text.count() > 0:
-                    print(f"  Found {cod_text.count()} text matches")
-                    first_text = cod_text.first
-                    first_text.scroll_into_view_if_needed(timeout=3000)
-                    time.sleep(0.5)
-                    first_text.click(force=True, timeout=3000)
-                    print("✅ COD selected (Method 2)")
-                    cod_selected = True
-            except Exception as e:
-                print(f"⚠️ Method 2 failed: {e}")
 
-        # Method 3: Find by COD image
-        if not cod_selected:
-            print("🔄 Trying Method 3: COD image...")
-            try:
-                cod_img = page.locator("img[alt='COD']")
-                if cod_img.count() > 0:
-                    print(f"  Found {cod_img.count()} COD images")
-                    first_img = cod_img.first
-                    first_img.scroll_into_view_if_needed(timeout=3000)
-                    time.sleep(0.5)
-                    first_img.click(force=True, timeout=3000)
-                    print("✅ COD selected (Method 3)")
-                    cod_selected = True
-            except Exception as e:
-                print(f"⚠️ Method 3 failed: {e}")
+def reset_account_session(context, page, browser, baseline, address):
+    """
+    Log the previous account out before the next rotated order: scrub cookies
+    and storage back to the pre-login baseline, reload, and make sure the page
+    is logged out with the same location. Falls back to a full wipe plus a
+    fresh location selection when the baseline still carries a session.
+    """
+    set_step("rotate_account")
+    for recorder in cart_recorders.values():
+        recorder.reset()  # captured cart calls carry the previous account's auth headers
+
+    account_rotation.scrub(context, page, baseline)
+    page.goto(HOME_URL, timeout=60000)
+    state = probe(page, {"login": LOGIN_BUTTON_SELECTORS, "address": [ADDRESS_SELECTOR]})
+    if not state["login"]["visible"]:
+        print("⚠️ Still logged in after restoring the baseline - wiping all cookies and storage")
+        account_rotation.scrub(context, page)
+        page.goto(HOME_URL, timeout=60000)
+        time.sleep(2)
+        if not probe(page, {"login": LOGIN_BUTTON_SELECTORS})["login"]["visible"]:
+            raise RuntimeError("Login button not shown after a full session wipe")
+        choose_location(page, browser)
+    elif state["address"]["text"] != address:
+        print(f"⚠️ Location changed after scrub ('{state['address']['text']}'), selecting it again")
+        choose_location(page, browser)
+    print("✅ Logged out, location kept")
 
-        # Method 4: Iterate through payment items
-        if not cod_selected:
-            print("🔄 Trying Method 4: iterate containers...")
-            try:
-                all_items = page.locator("div.Payment_methodItem__BLz7I")
-                count = all_items.count()
-                print(f"  Found {count} payment items")
-                
-                for i in range(count):
-                    item = all_items.nth(i)
-                    text = item.text_content()
-                    print(f"    Item {i}: {text[:50]}")
-                    
-                    if "Cash on Delivery" in text or "COD" in text:
-                        print(f"    ✓ Found COD at index {i}")
-                        item.scroll_into_view_if_needed(timeout=3000)
-                        time.sleep(0.5)
-                        item.click(force=True, timeout=3000)
-                        print("✅ COD selected (Method 4)")
-                        cod_selected = True
-                        break
-            except Exception as e:
-                print(f"⚠️ Method 4 failed: {e}")
 
-        # Method 5: JavaScript click
-        if not cod_selected:
-            print("🔄 Trying Method 5: JavaScript...")
+def run_rotation(context, page, browser, order_numbers):
+    """
+    Place order_numbers one after another in this context, each with its own
+    number and account (ORDERS_PER_CONTEXT). Every order's outcome is printed
+    as ORDER_RESULT:<n>:<code>. Returns the exit code for the process.
+    """
+    global rotation_active
+    rotation_active = True
+    baseline = account_rotation.snapshot(context, page)
+    address = probe(page, {"address": [ADDRESS_SELECTOR]})["address"]["text"]
+    exit_code = 0
+
+    for index, order_num in enumerate(order_numbers):
+        if index > 0:
+            order_trace.start(str(order_num))
             try:
-                result = page.evaluate("""
-                    () => {
-                        // Find all divs
-                        const divs = document.querySelectorAll('div');
-                        for (let div of divs) {
-                            const text = div.textContent || '';
-                            if (text.includes('Cash on Delivery') || text.includes('COD')) {
-                                div.click();
-                                return true;
-                            }
-                        }
-                        return false;
-                    }
-                """)
-                if result:
-                    print("✅ COD selected (Method 5)")
-                    cod_selected = True
-                else:
-                    print("⚠️ Method 5: JS found no matching element")
+                reset_account_session(context, page, browser, baseline, address)
             except Exception as e:
-                print(f"⚠️ Method 5 failed: {e}")
+                # Never start an order on a session that may still belong to the last account
+                print(f"❌ Could not reset the session for order {order_num}: {e}")
+                return exit_code or 1
+            account_rotation.begin_order(order_num)
+        order_started = time.time()
+        try:
+            run_order(page, browser)
+            exit_code = 0
+        except OrderFailed as e:
+            exit_code = e.code
+        except Exception as e:
+            print(f"❌ Order {order_num} crashed: {e}")
+            cancel_held_numbers()
+            order_trace.finish("crashed")
+            exit_code = 1
+        print(f"⏱️ Order {order_num} finished in {time.time() - order_started:.1f}s (exit code {exit_code})")
+        account_rotation.report_result(order_num, exit_code)
 
-        # Method 6: Find paragraph and click parent
-        if not cod_selected:
-            print("🔄 Trying Method 6: paragraph parent...")
-            try:
-                paragraphs = page.locator("p.text-medium-xl")
-                count = paragraphs.count()
-                print(f"  Found {count} paragraphs")
-                
-                for i in range(count):
-                    p = paragraphs.nth(i)
-                    text = p.text_content()
-                    if "Cash on Delivery" in text:
-                        print(f"    ✓ Found COD paragraph")
-                        # Click the paragraph itself
-                        p.scroll_into_view_if_needed(timeout=3000)
-                        time.sleep(0.5)
-                        p.click(force=True, timeout=3000)
-                        print("✅ COD selected (Method 6)")
-                        cod_selected = True
-                        break
-            except Exception as e:
-                print(f"⚠️ Method 6 failed: {e}")
+        if exit_code == 5 or page.is_closed():
+            # All products gone (stop the batch) or nothing left to reuse
+            break
+    return exit_code
 
-        # Final check
-        if not cod_selected:
-            print("❌ Failed to select COD payment method after all attempts")
-            print("📸 Taking screenshot...")
+
+def adopt_standby(p, slot):
+    """
+    Attach to a standby browser parked at the login modal (see standby_pool.py).
+    Returns (browser, context, page), or None if the slot went bad (then start cold).
+    """
+    set_step("standby")
+    browser = None
+    try:
+        browser = p.chromium.connect_over_cdp(slot["endpoint"], timeout=10000)
+        context = browser.contexts[0]
+        page = context.pages[0]
+        prepare_context(context)
+        if not probe(page, {"phone": [PHONE_INPUT_SELECTOR]})["phone"]["visible"]:
+            raise RuntimeError("login modal is no longer open")
+    except Exception as e:
+        print(f"⚠️ Standby slot {slot['slot_id']} unusable, starting cold: {e}")
+        if browser:
             try:
-                page.screenshot(path="cod_selection_failed.png", full_page=True)
-                print("Screenshot saved: cod_selection_failed.png")
-            except:
+                browser.close()  # only disconnects; the pool closes the slot's browser
+            except Exception:
                 pass
-            raise Exception("Could not select Cash on Delivery")
+        standby_pool.release(slot["slot_id"])
+        return None
+    print(f"⚡ Claimed standby slot {slot['slot_id']} (parked {time.time() - slot['ready_at']:.0f}s)")
+    return browser, context, page
 
-        print("✅ COD payment method confirmed")
 
-        time.sleep(2)
-        print("📦 Attempting to place order...")
-        
-        # Try multiple selectors for the place order button
-        place_btn = None
-        
-        # Selector 1: Class name
-        if page.locator("button.CodView_orderButton__E53_u").count() > 0:
-            place_btn = page.locator("button.CodView_orderButton__E53_u").first
-            print("Found button via class")
-        
-        # Selector 2: Text content
-        elif page.locator("button:has-text('Place Order')").count() > 0:
-            place_btn = page.locator("button:has-text('Place Order')").first
-            print("Found button via text")
-        
-        # Selector 3: Any button in COD view
-        elif page.locator("button[type='button']").count() > 0:
-            place_btn = page.locator("button[type='button']").last
-            print("Found button via type")
-        
-        if place_btn:
-            # Wait for button to be ready
-            try:
-                place_btn.wait_for(state="visible", timeout=5000)
-            except:
-                print("⚠️ Button not visible, trying anyway...")
-            
-            # Scroll into view
-            try:
-                place_btn.scroll_into_view_if_needed()
-                time.sleep(1)
-            except:
-                pass
-            
-            # Try clicking with multiple methods
-            success = False
-            
-            # Method 1: Regular click
-            try:
-                place_btn.click(timeout=5000)
-                success = True
-                print("✅ Place order clicked (regular)")
-            except Exception as e:
-                print(f"Regular click failed: {e}")
-            
-            # Method 2: Force click
-            if not success:
-                try:
-                    place_btn.click(force=True, timeout=5000)
-                    success = True
-                    print("✅ Place order clicked (force)")
-                except Exception as e:
-                    print(f"Force click failed: {e}")
-            
-            # Method 3: JS click
-            if not success:
-                try:
-                    page.evaluate("(el) => el.click()", place_btn)
-                    success = True
-                    print("✅ Place order clicked (JS)")
-                except Exception as e:
-                    print(f"JS click failed: {e}")
-            
-            # Method 4: Dispatch click event
-            if not success:
-                try:
-                    place_btn.dispatch_event("click")
-                    success = True
-                    print("✅ Place order clicked (dispatch)")
-                except Exception as e:
-                    print(f"Dispatch click failed: {e}")
-            
-            if success:
-                print("🎉 PLACE ORDER TRIGGERED - MARKING SUCCESS")
-                # Wait briefly to check for immediate error (e.g. backend failure toast)
-                time.sleep(2)
-                
-                # Take screenshot immediately regardless of outcome
-                screenshot_filename = f"order_result_{int(time.time())}.png"
-                screenshot_path = None
-                try:
-                    screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
-                    page.screenshot(path=screenshot_path)
-                    print(f"📸 Screenshot taken: {screenshot_path}")
-                except Exception as e:
-                    print(f"⚠️ Failed to take screenshot: {e}")
-                    screenshot_filename = None
-
-                # Check for common error texts
-                error_texts = ["Something went wrong", "Out of Stock", "Not available", "Sold Out"]
-                error_found = False
-                error_reason = ""
-                for txt in error_texts:
-                    if page.locator(f"text={txt}").count() > 0:
-                        if page.locator(f"text={txt}").first.is_visible():
-                            print(f"❌ Error detected after place order: {txt}")
-                            error_found = True
-                            error_reason = txt
-                            break
-                
-                # Determine status
-                status = "success" if not error_found else f"Failed - {error_reason}"
-                
-                # Local Screenshot
-                screenshot_url = "N/A"
-                if screenshot_filename and screenshot_path and os.path.exists(screenshot_path):
-                    screenshot_url = screenshot_path
-                    print(f"📸 Saved local screenshot: {screenshot_path}")
-                
-                # Log to CSV
-                try:
-                    csv_file = "my_orders.csv"
-                    file_exists = os.path.isfile(csv_file)
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    with open(csv_file, mode='a', newline='', encoding='utf-8') as f:
-                        writer = csv.writer(f)
-                        if not file_exists:
-                            writer.writerow(["Timestamp", "Screenshot URL", "Status"])
-                        writer.writerow([timestamp, screenshot_url, status])
-                    print(f"📝 Order info logged to {csv_file}")
-                except Exception as e:
-                    print(f"❌ Failed to log to CSV: {e}")
+def main():
+    order_numbers = account_rotation.order_numbers()
+    if len(order_numbers) > 1:
+        account_rotation.begin_order(order_numbers[0])
+    order_trace.start()
 
-                if not error_found:
-                    print("✅ No errors detected after placement.")
-                    print("TRIGGER_ORDER_SUCCESS") 
-                    browser.close()
-                    sys.exit(0) # SUCCESS EXIT
-                else:
-                    print("❌ Order failed due to post-click error")
-                    fail_and_exit("Order failed due to post-click error", page, browser)
-            
-            else:
-                fail_and_exit("All click methods failed!", page, browser)
+    with sync_playwright() as p:
+        slot = standby_pool.claim() if standby_pool.STANDBY_PAGES > 0 else None
+        adopted = adopt_standby(p, slot) if slot else None
+        if adopted:
+            browser, context, page = adopted
         else:
-            fail_and_exit("Could not find place order button!", page, browser)
-        
-        # This should never be reached, but just in case
-        fail_and_exit("Unknown error (end of script reached unexpectedly)", page, browser)
+            browser = launch_browser(p)
+            context = new_checkout_context(browser)
+
+            page = context.new_page()
+            page.goto(HOME_URL, timeout=60000)
+            time.sleep(2)
+            choose_location(page, browser)
+
+        if len(order_numbers) > 1:
+            exit_code = run_rotation(context, page, browser, order_numbers)
+        else:
+            run_order(page, browser)
+            exit_code = 0  # SUCCESS EXIT
+        browser.close()
+        screenshot_service.flush()
+        sys.exit(exit_code)
 
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_terminate)
     main()
\ No newline at end of file
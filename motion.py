@@ -0,0 +1,75 @@
+"""
+Animation and transition suppression for checkout contexts (SUPPRESS_MOTION=1)
+
+context_options() adds reduced-motion emulation to browser.new_context() and
+install() injects a stylesheet (from an init script, so every page and
+navigation gets it) that zeroes CSS animation/transition durations and delays.
+Drawers, modals and buttons then reach their final state in the same frame.
+
+Sleeps that only exist to wait out an animation go through settle(), which is
+a no-op once suppression is installed on the context. Sleeps that wait for
+the network or the app's own timers stay plain time.sleep().
+"""
+import json
+import os
+import time
+from typing import Any, Dict
+
+SUPPRESS_MOTION = os.environ.get('SUPPRESS_MOTION', '1') != '0'
+
+NO_MOTION_CSS = """
+*, *::before, *::after {
+    animation-duration: 0s !important;
+    animation-delay: 0s !important;
+    animation-iteration-count: 1 !important;
+    transition-duration: 0s !important;
+    transition-delay: 0s !important;
+    scroll-behavior: auto !important;
+}
+"""
+
+INIT_SCRIPT_TEMPLATE = """
+(() => {
+    const inject = () => {
+        if (document.getElementById('__no_motion')) return true;
+        const root = document.head || document.documentElement;
+        if (!root) return false;
+        const style = document.createElement('style');
+        style.id = '__no_motion';
+        style.textContent = %s;
+        root.appendChild(style);
+        return true;
+    };
+    if (!inject()) {
+        new MutationObserver((_, observer) => { if (inject()) observer.disconnect(); })
+            .observe(document, {childList: true, subtree: true});
+    }
+})();
+"""
+
+# True once install() ran for this process's checkout context
+_active = False
+
+
+def context_options(enabled: bool = SUPPRESS_MOTION) -> Dict[str, Any]:
+    """Extra browser.new_context() keyword arguments"""
+    return {"reduced_motion": "reduce"} if enabled else {}
+
+
+def install(context):
+    """Disable CSS animations/transitions in every page of the context"""
+    global _active
+    context.add_init_script(INIT_SCRIPT_TEMPLATE % json.dumps(NO_MOTION_CSS))
+    _active = True
+
+
+def reset():
+    """Forget install() (the next context runs with animations again)"""
+    global _active
+    _active = False
+
+
+def settle(seconds: float):
+    """Pause that only waits out an animation/transition; skipped while motion is suppressed"""
+    if not _active:
+        time.sleep(seconds)
@@ -0,0 +1,131 @@
+"""
+Cross-process registry of outstanding provider numbers
+
+main.py registers every number it buys (request_id, batch, order, pid and
+the API credentials needed to cancel it) and releases it once the number has
+been cancelled. Entries are stored in shared_state (a cross-process SQLite
+set with per-ID TTLs and batch grouping), so the backend can see numbers held
+by worker processes it never talked to.
+Those numbers can be cancelled in bulk when a batch is stopped, when a
+worker crashes, or on the next startup if the server itself went down.
+
+Cancellations run in parallel with bounded concurrency. The report says how
+many numbers were refunded, how much money that saved and how much time the
+parallel calls saved compared with cancelling one by one.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import shared_state
+from api_dynamic import cancel_number
+
+CANCEL_CONCURRENCY = int(os.environ.get('NUMBER_CANCEL_CONCURRENCY', '8'))
+# Providers expire activations on their own; entries older than this lapse without a call
+MAX_NUMBER_AGE = float(os.environ.get('NUMBER_MAX_AGE_SECONDS', '1800'))
+
+
+def register(request_id: str, api_key: str, api_url: str, batch_id: Optional[str] = None,
+             order_number: Optional[str] = None, pid: Optional[int] = None) -> Dict[str, Any]:
+    """Record a purchased number as outstanding"""
+    entry = {
+        "request_id": str(request_id),
+        "batch_id": batch_id,
+        "order_number": order_number,
+        "pid": pid or os.getpid(),
+        "api_key": api_key,
+        "api_url": api_url,
+        "created_at": time.time(),
+    }
+    shared_state.add_request_id(request_id, batch_id=batch_id, ttl=MAX_NUMBER_AGE, data=entry)
+    return entry
+
+
+def release(request_id: str):
+    """Forget a number (it was cancelled or consumed)"""
+    shared_state.remove_request_id(request_id)
+
+
+def outstanding(batch_id: Optional[str] = None, pid: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Registered numbers, optionally limited to one batch or one process"""
+    entries = []
+    for row in shared_state.get_entries(batch_id=batch_id):
+        entry = row["data"] or {"request_id": row["request_id"], "batch_id": row["batch_id"]}
+        if pid is not None and entry.get('pid') != pid:
+            continue
+        entries.append(entry)
+    return entries
+
+
+def _cancel_one(entry: Dict[str, Any], api_key: Optional[str], api_url: Optional[str]) -> Dict[str, Any]:
+    started = time.time()
+    result = {"request_id": entry["request_id"], "order_number": entry.get("order_number")}
+    try:
+        response = cancel_number(entry["request_id"], api_key or entry.get("api_key"),
+                                 api_url or entry.get("api_url"))
+        result["response"] = response
+        # ACCESS_CANCEL / ACCESS_CANCEL_ALREADY: refunded; NO_ACTIVATION etc.: nothing left to cancel
+        result["cancelled"] = response.startswith("ACCESS_CANCEL")
+        result["gone"] = result["cancelled"] or response.startswith(("NO_ACTIVATION", "BAD_ID", "STATUS_CANCEL"))
+    except Exception as e:
+        result.update(cancelled=False, gone=False, error=str(e))
+    result["seconds"] = round(time.time() - started, 3)
+    return result
+
+
+def cancel_entries(entries: List[Dict[str, Any]], api_key: Optional[str] = None,
+                   api_url: Optional[str] = None, price: float = 0.0,
+                   max_workers: int = CANCEL_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Cancel numbers in parallel (at most max_workers provider calls at a time).
+    Entries that were cancelled, or that the provider no longer knows, are released.
+    """
+    report = {"requested": len(entries), "cancelled": 0, "not_active": 0, "failed": [],
+              "money_saved": 0.0, "seconds": 0.0, "time_saved_seconds": 0.0}
+    if not entries:
+        return report
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(entries)))) as pool:
+        results = list(pool.map(lambda e: _cancel_one(e, api_key, api_url), entries))
+    elapsed = time.time() - started
+
+    for result in results:
+        if result.get("gone"):
+            release(result["request_id"])
+        if result.get("cancelled"):
+            report["cancelled"] += 1
+        elif result.get("gone"):
+            report["not_active"] += 1
+        else:
+            report["failed"].append(result)
+    report["money_saved"] = round(report["cancelled"] * float(price or 0.0), 2)
+    report["seconds"] = round(elapsed, 2)
+    report["time_saved_seconds"] = round(max(0.0, sum(r["seconds"] for r in results) - elapsed), 2)
+    return report
+
+
+def cancel_outstanding(batch_id: Optional[str] = None, api_key: Optional[str] = None,
+                       api_url: Optional[str] = None, price: float = 0.0,
+                       max_workers: int = CANCEL_CONCURRENCY) -> Dict[str, Any]:
+    """Cancel every registered number (of one batch, if batch_id is given)"""
+    return cancel_entries(outstanding(batch_id=batch_id), api_key, api_url, price, max_workers)
+
+
+def cancel_own(api_key: Optional[str] = None, api_url: Optional[str] = None) -> Dict[str, Any]:
+    """Cancel the numbers held by this process (used on failure/termination in main.py)"""
+    return cancel_entries(outstanding(pid=os.getpid()), api_key, api_url)
+
+
+def sweep_leaked(is_alive: Callable[[Optional[int]], bool], batch_id: Optional[str] = None,
+                 price: float = 0.0) -> Dict[str, Any]:
+    """Cancel numbers whose owning process is gone (crashed worker or previous server run)"""
+    expired = shared_state.purge_expired()
+    leaked = [e for e in outstanding(batch_id=batch_id) if not is_alive(e.get('pid'))]
+    report = cancel_entries(leaked, price=price)
+    report["expired"] = expired
+    if report["requested"] or expired:
+        print(f"[INFO] Swept {report['requested']} leaked numbers: "
+              f"{report['cancelled']} cancelled, {len(report['failed'])} failed, {expired} expired")
+    return report
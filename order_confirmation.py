@@ -0,0 +1,136 @@
+"""
+Order confirmation from the place-order network response
+
+Clicking the COD "Place Order" button makes the storefront POST the order
+through its own XHR/fetch call. main.py wraps the click in
+page.expect_response() with is_place_order_response() as the predicate. The
+order is then confirmed by that response, as soon as it arrives, instead of
+by sleeps, error-text scans and a screenshot. parse() pulls the order ID,
+amount and status out of the JSON body, wherever the API nests them.
+
+Nothing here depends on a hard-coded endpoint. A candidate is a JSON
+XHR/fetch POST/PUT to a first-party URL with an "order"/"orders" path
+segment. Analytics and session-recorder hosts and read-only order paths
+(summary, history...) are excluded. Only a failure signal in the body itself
+(success=false, a failure status, an error field) fails the order. An HTTP
+error alone doesn't, because the call might not be the place-order one after
+all. When no matching response arrives within ORDER_RESPONSE_TIMEOUT_MS, or
+the response is inconclusive, main.py falls back to the on-page checks.
+
+The result screenshot is only taken on the success path when
+SCREENSHOT_ON_SUCCESS=1. Failures are always screenshotted.
+"""
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+ORDER_RESPONSE_TIMEOUT_MS = int(os.environ.get('ORDER_RESPONSE_TIMEOUT_MS', '15000'))
+SCREENSHOT_ON_SUCCESS = os.environ.get('SCREENSHOT_ON_SUCCESS', '0') == '1'
+
+# An "order"/"orders" path segment (or one starting/ending with it: place-order, orderCreate)
+ORDER_PATH_RE = re.compile(r'(^|[/_\-.])(?i:orders?)($|[/_\-.]|[A-Z])|(^|/)(?i:place|create|submit)[_\-]?[Oo]rder')
+EXCLUDED_PATH_HINTS = ('summary', 'history', 'list', 'track', 'detail', 'recorder', 'analytics', 'event', 'log')
+EXCLUDED_HOST_HINTS = (
+    'google', 'doubleclick', 'facebook', 'analytics', 'segment', 'mixpanel', 'amplitude', 'clevertap',
+    'moengage', 'webengage', 'branch.io', 'appsflyer', 'sentry', 'hotjar', 'clarity', 'newrelic', 'nr-data',
+)
+PLACE_METHODS = ('POST', 'PUT')
+ORDER_ID_KEYS = ('orderid', 'order_id', 'ordernumber', 'order_no', 'orderno', 'orderrefid')
+AMOUNT_KEYS = ('amount', 'totalamount', 'total_amount', 'orderamount', 'payableamount', 'grandtotal', 'total')
+STATUS_KEYS = ('orderstatus', 'order_status', 'status')
+FAILURE_STATUSES = ('failed', 'failure', 'error', 'rejected', 'cancelled', 'canceled')
+MESSAGE_KEYS = ('message', 'error', 'errormessage', 'msg')
+
+
+def is_place_order_response(response) -> bool:
+    """Predicate for page.expect_response(): the storefront's place-order call"""
+    try:
+        request = response.request
+        if request.resource_type not in ('xhr', 'fetch') or request.method not in PLACE_METHODS:
+            return False
+        url = urlsplit(response.url)
+        host, path = url.netloc.lower(), url.path
+        if any(hint in host for hint in EXCLUDED_HOST_HINTS):
+            return False
+        if not ORDER_PATH_RE.search(path) or any(hint in path.lower() for hint in EXCLUDED_PATH_HINTS):
+            return False
+        return 'json' in response.headers.get('content-type', '').lower()
+    except Exception:
+        return False
+
+
+def find_value(body: Any, keys: Tuple[str, ...]) -> Any:
+    """First scalar value under one of `keys` (case-insensitive), searching nested dicts/lists breadth-first"""
+    queue = [body]
+    while queue:
+        node = queue.pop(0)
+        if isinstance(node, dict):
+            for key in keys:
+                for name, value in node.items():
+                    if isinstance(name, str) and name.lower() == key and value not in (None, '') \
+                            and not isinstance(value, (dict, list)):
+                        return value
+            queue.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            queue.extend(v for v in node if isinstance(v, (dict, list)))
+    return None
+
+
+def parse(response) -> Dict[str, Any]:
+    """
+    {"ok", "failed", "order_id", "amount", "status", "reason", "http_status"} for a place-order response.
+    ok: the API accepted the order (HTTP 2xx, no success=false, no failure status, an order ID).
+    failed: the body says the order was rejected. Neither: inconclusive (e.g. an HTTP error
+    without a failure in the body, or no order ID).
+    """
+    result: Dict[str, Any] = {
+        "ok": False, "failed": False, "order_id": None, "amount": None, "status": None,
+        "reason": None, "http_status": response.status,
+    }
+    try:
+        body = response.json()
+    except Exception:
+        body = None
+
+    if body is not None:
+        order_id = find_value(body, ORDER_ID_KEYS)
+        amount = find_value(body, AMOUNT_KEYS)
+        status = find_value(body, STATUS_KEYS)
+        result["order_id"] = str(order_id) if order_id is not None else None
+        result["amount"] = amount
+        result["status"] = str(status) if status is not None else None
+
+    success_flag = body.get("success") if isinstance(body, dict) else None
+    error_field = (body.get("error") or body.get("errors")) if isinstance(body, dict) else None
+    if success_flag is False:
+        result["failed"], result["reason"] = True, "success=false"
+    elif result["status"] and result["status"].lower() in FAILURE_STATUSES:
+        result["failed"], result["reason"] = True, f"status {result['status']}"
+    elif error_field:
+        result["failed"], result["reason"] = True, "error in response"
+    elif not response.ok:
+        result["reason"] = f"HTTP {response.status} without a failure in the body"
+    elif not result["order_id"]:
+        result["reason"] = "no order ID in response"
+    else:
+        result["ok"] = True
+
+    if result["failed"] and body is not None:
+        message = find_value(body, MESSAGE_KEYS)
+        if message:
+            result["reason"] = f"{result['reason']}: {message}"
+    return result
+
+
+def describe(result: Optional[Dict[str, Any]]) -> str:
+    """One-line summary for the logs"""
+    if not result:
+        return "no place-order response"
+    parts = [f"order {result['order_id'] or '?'}"]
+    if result["amount"] is not None:
+        parts.append(f"amount {result['amount']}")
+    if result["status"]:
+        parts.append(f"status {result['status']}")
+    parts.append(f"HTTP {result['http_status']}")
+    return ", ".join(parts)
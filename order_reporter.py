@@ -5,6 +5,7 @@ import csv
 import os
 from datetime import datetime
 from threading import Lock
+from failure_index import index_failed_log
 
 # Thread-safe CSV writing
 _csv_lock = Lock()
@@ -15,9 +16,10 @@ def ensure_csv_exists():
     if not os.path.exists(_csv_file):
         with open(_csv_file, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(['timestamp', 'screenshot_url', 'status', 'pastebin_url'])
+            writer.writerow(['timestamp', 'screenshot_url', 'status', 'pastebin_url', 'order_id', 'amount'])
 
-def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, order_number=None):
+def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, order_number=None,
+                      order_id=None, amount=None):
     """
     Save order information to CSV file
     
@@ -26,6 +28,8 @@ def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, or
         status: 'success' or 'failed' (or 'Failed - reason')
         worker_log_path: Path to worker log file (for failed orders)
         order_number: Order number for log identification
+        order_id: Storefront order ID (from the place-order response)
+        amount: Order amount (from the place-order response)
     """
     ensure_csv_exists()
     
@@ -48,6 +52,7 @@ def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, or
             full_log = f"=== FAILED ORDER LOG ===\n"
             full_log += f"Order Number: {order_number or 'Unknown'}\n"
             full_log += f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            full_log += f"Batch: {os.environ.get('BATCH_ID', 'unknown')}\n"
             full_log += f"Status: {status}\n"
             full_log += f"Screenshot: {screenshot_url or 'N/A'}\n"
             full_log += f"\n{'='*50}\n"
@@ -64,6 +69,7 @@ def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, or
                 f.write(full_log)
                 
             print(f"✅ Saved failed order log to: {log_filepath}")
+            index_failed_log(log_filepath)
             pastebin_url = log_filepath
             
         except Exception as e:
@@ -75,7 +81,8 @@ def save_order_to_csv(screenshot_url, status='success', worker_log_path=None, or
             with open(_csv_file, 'a', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                writer.writerow([timestamp, screenshot_url or '', status, pastebin_url])
+                writer.writerow([timestamp, screenshot_url or '', status, pastebin_url,
+                                 order_id or '', '' if amount is None else amount])
         except Exception as e:
             print(f"[ERROR] Failed to save order to CSV: {e}")
 
@@ -0,0 +1,152 @@
+"""
+Per-order timing trace
+
+A trace is a list of spans (name, lane, start, end). main.py's set_step()
+opens one span per checkout step on the "main" lane and closes the previous
+one. Work that overlaps the main flow runs on its own lane: "otp" for the
+provider polling thread and "preload" for the product tab that loads while
+the OTP is outstanding. Spans on different lanes that cover the same time ran
+in parallel.
+
+finish() closes whatever is still open, prints a waterfall to the order's log
+and writes the spans to traces/<batch>/order_<n>_<time>.json.
+ORDER_TRACE=0 turns the trace off (set_step() then records nothing).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+ORDER_TRACE = os.environ.get('ORDER_TRACE', '1') != '0'
+TRACES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces')
+
+MAIN_LANE = "main"
+
+
+class Trace:
+    def __init__(self, order_number: Optional[str] = None):
+        self.order_number = order_number or os.environ.get('ORDER_NUMBER')
+        self.batch_id = os.environ.get('BATCH_ID')
+        self.started = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._open_step: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, lane: str, start: float, end: float, **attrs):
+        with self._lock:
+            self.spans.append(dict(name=name, lane=lane, start=start, end=end, **attrs))
+
+    def step(self, name: str):
+        """Close the running main-lane step and open the next one"""
+        now = time.time()
+        with self._lock:
+            if self._open_step is not None:
+                self._open_step["end"] = now
+                self.spans.append(self._open_step)
+            self._open_step = {"name": name, "lane": MAIN_LANE, "start": now, "end": None}
+
+    @contextmanager
+    def span(self, name: str, lane: str, **attrs):
+        start = time.time()
+        try:
+            yield attrs  # the block may add attributes (e.g. a result)
+        finally:
+            self.add(name, lane, start, time.time(), **attrs)
+
+    def overlap(self, lane: str, other: str) -> float:
+        """Seconds during which both lanes had a span running"""
+        total = 0.0
+        for a in (s for s in self.spans if s["lane"] == lane):
+            for b in (s for s in self.spans if s["lane"] == other):
+                total += max(0.0, min(a["end"], b["end"]) - max(a["start"], b["start"]))
+        return total
+
+    def close(self):
+        with self._lock:
+            if self._open_step is not None:
+                self._open_step["end"] = time.time()
+                self.spans.append(self._open_step)
+                self._open_step = None
+            self.spans.sort(key=lambda s: s["start"])
+
+    def waterfall(self) -> List[str]:
+        lines = []
+        for s in self.spans:
+            label = s["name"] + (f" {s['url']}" if s.get("url") else "")
+            status = f" [{s['result']}]" if s.get("result") else ""
+            lines.append(f"  {s['lane']:<8} {s['start'] - self.started:7.2f}s → {s['end'] - self.started:7.2f}s "
+                         f"({s['end'] - s['start']:6.2f}s)  {label}{status}")
+        return lines
+
+    def to_dict(self, outcome: str) -> Dict[str, Any]:
+        return {
+            "order_number": self.order_number,
+            "batch_id": self.batch_id,
+            "outcome": outcome,
+            "started": self.started,
+            "seconds": round(time.time() - self.started, 3),
+            "spans": [
+                dict(s, start=round(s["start"] - self.started, 3), end=round(s["end"] - self.started, 3))
+                for s in self.spans
+            ],
+        }
+
+
+_current: Optional[Trace] = None
+
+
+def start(order_number: Optional[str] = None) -> Optional[Trace]:
+    """Begin the trace of the next order (replaces an unfinished one)"""
+    global _current
+    _current = Trace(order_number) if ORDER_TRACE else None
+    return _current
+
+
+def current() -> Optional[Trace]:
+    return _current
+
+
+def step(name: str):
+    trace = _current or start()
+    if trace:
+        trace.step(name)
+
+
+@contextmanager
+def span(name: str, lane: str, **attrs):
+    """A span on a side lane of the current order (no-op without a trace)"""
+    trace = _current
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, lane, **attrs) as span_attrs:
+        yield span_attrs
+
+
+def finish(outcome: str) -> Optional[str]:
+    """Close the current trace, print its waterfall and write it out; returns the JSON path"""
+    global _current
+    trace, _current = _current, None
+    if trace is None:
+        return None
+    trace.close()
+    print(f"⏱️ Order trace ({outcome}, {time.time() - trace.started:.1f}s):")
+    for line in trace.waterfall():
+        print(line)
+    for lane in sorted({s["lane"] for s in trace.spans} - {MAIN_LANE, "otp"}):
+        overlap = trace.overlap(lane, "otp")
+        if overlap:
+            print(f"  ⚡ {lane} overlapped the OTP wait for {overlap:.1f}s")
+
+    try:
+        directory = os.path.join(TRACES_DIR, trace.batch_id or 'no_batch')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"order_{trace.order_number or 'unknown'}_{int(trace.started)}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace.to_dict(outcome), f, indent=2)
+        return path
+    except OSError as e:
+        print(f"⚠️ Failed to write order trace: {e}")
+        return None
@@ -0,0 +1,243 @@
+"""
+Per-number OTP state machine
+
+Every provider number (request ID) gets one OtpSession that moves through
+
+    waiting ──> received ──> consumed ──> re_requested ──> received ...
+       └──────────┴─────────────┴──────────────┴──> expired
+
+* waiting       - phone number submitted, first code not seen yet
+* received      - a code nobody has entered yet is available
+* consumed      - the code was typed into the site; it is never accepted again
+* re_requested  - a new code was asked for (status 3) and is being waited on
+* expired       - timed out, or the number was cancelled (no more polling)
+
+Each state is entered once per transition, so a re-request that is already
+pending is not sent again, a code that was already received is returned
+without polling, and a cancelled/expired number is never polled again.
+Provider getStatus keeps returning the last code until a new one arrives;
+that stale code is ignored because it is in the consumed set.
+
+Every wait is recorded in otp_stats.db (SQLite, WAL) with the provider
+operator and country, so the backend can report time-to-OTP distributions
+for the whole batch.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from api_dynamic import get_status, set_status
+
+WAITING = "waiting"
+RECEIVED = "received"
+CONSUMED = "consumed"
+RE_REQUESTED = "re_requested"
+EXPIRED = "expired"
+
+POLL_INTERVAL = float(os.environ.get('OTP_POLL_INTERVAL', '1.0'))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATS_DB = os.environ.get('OTP_STATS_DB') or os.path.join(BASE_DIR, 'otp_stats.db')
+
+_local = threading.local()
+_sessions: Dict[str, "OtpSession"] = {}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(STATS_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS otp_waits (
+                request_id TEXT NOT NULL,
+                batch_id TEXT,
+                operator TEXT,
+                country TEXT,
+                kind TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                polls INTEGER NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_otp_waits_batch ON otp_waits (batch_id)")
+        _local.conn = conn
+    return conn
+
+
+def _record_wait(session: "OtpSession", outcome: str, seconds: float, polls: int):
+    try:
+        _connect().execute(
+            "INSERT INTO otp_waits (request_id, batch_id, operator, country, kind, outcome, seconds, polls, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (session.request_id, session.batch_id, session.operator, session.country,
+             "resend" if session.resends else "first", outcome, round(seconds, 2), polls, time.time())
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to record OTP timing: {e}")
+
+
+class OtpSession:
+    def __init__(self, request_id: str, api_key: str, api_url: str, operator: Optional[str] = None,
+                 country: Optional[str] = None, batch_id: Optional[str] = None):
+        self.request_id = str(request_id)
+        self.api_key = api_key
+        self.api_url = api_url
+        self.operator = operator or os.environ.get('OPERATOR')
+        self.country = country or os.environ.get('COUNTRY')
+        self.batch_id = batch_id or os.environ.get('BATCH_ID')
+        self.state = WAITING
+        self.code: Optional[str] = None
+        self.consumed: Set[str] = set()
+        self.resends = 0
+        self.polls = 0
+        self.wait_started = time.time()
+        self.history: List[Dict[str, Any]] = [{"state": WAITING, "at": self.wait_started}]
+
+    def _transition(self, state: str, reason: Optional[str] = None):
+        self.state = state
+        self.history.append({"state": state, "at": time.time(), "reason": reason})
+
+    def wait(self, timeout_seconds: float = 120.0, poll_interval: float = POLL_INTERVAL) -> Optional[str]:
+        """
+        Return a code that hasn't been consumed yet, polling getStatus only while waiting.
+        None if the number expired, was cancelled or no new code came within timeout_seconds.
+        """
+        if self.state == RECEIVED:
+            return self.code
+        if self.state == EXPIRED:
+            print(f"⚠️ OTP session {self.request_id} expired - not polling")
+            return None
+        if self.state == CONSUMED:
+            print("⚠️ Last OTP already used and no new one requested - not polling")
+            return None
+
+        deadline = time.time() + timeout_seconds
+        polls = 0
+        while True:
+            polls += 1
+            try:
+                status, code = get_status(self.request_id, self.api_key, self.api_url)
+            except ValueError as e:
+                print(f"⚠️ OTP poll failed: {e}")
+                status, code = "error", None
+            self.polls += 1
+
+            if status == "ok" and code and code not in self.consumed:
+                self.code = code
+                _record_wait(self, "received", time.time() - self.wait_started, polls)
+                self._transition(RECEIVED)
+                return code
+            if status == "cancelled":
+                _record_wait(self, "cancelled", time.time() - self.wait_started, polls)
+                self._transition(EXPIRED, "number cancelled by provider")
+                return None
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                _record_wait(self, "timeout", time.time() - self.wait_started, polls)
+                self._transition(EXPIRED, f"no new OTP within {timeout_seconds:.0f}s")
+                return None
+            time.sleep(min(poll_interval, remaining))
+
+    def consume(self) -> Optional[str]:
+        """Mark the current code as entered on the site"""
+        if self.state != RECEIVED:
+            return None
+        self.consumed.add(self.code)
+        self._transition(CONSUMED)
+        return self.code
+
+    def request_new(self) -> bool:
+        """Ask the provider for another code (status 3). False if the number can't receive one."""
+        if self.state == EXPIRED:
+            print(f"⚠️ OTP session {self.request_id} expired - can't request a new OTP")
+            return False
+        if self.state in (WAITING, RE_REQUESTED):
+            # A code is already on its way; asking again only restarts the provider's timer
+            return True
+        if self.state == RECEIVED:
+            # Unused code in hand: it is superseded by the new one
+            self.consumed.add(self.code)
+        try:
+            set_status(3, self.request_id, self.api_key, self.api_url)
+        except ValueError as e:
+            print(f"⚠️ Failed to request a new OTP: {e}")
+            return False
+        self.resends += 1
+        self.wait_started = time.time()
+        self._transition(RE_REQUESTED)
+        return True
+
+    def expire(self, reason: str):
+        """No more codes will be needed or delivered (e.g. the number was cancelled)"""
+        if self.state != EXPIRED:
+            self._transition(EXPIRED, reason)
+
+
+def start(request_id: str, api_key: str, api_url: str, **kwargs) -> OtpSession:
+    """Begin waiting for the first code of a number (call right after submitting it)"""
+    session = OtpSession(request_id, api_key, api_url, **kwargs)
+    _sessions[session.request_id] = session
+    return session
+
+
+def session_for(request_id: str, api_key: str, api_url: str) -> OtpSession:
+    """The number's session, created on first use"""
+    session = _sessions.get(str(request_id))
+    if session is None:
+        session = start(request_id, api_key, api_url)
+    return session
+
+
+def expire(request_id: str, reason: str):
+    session = _sessions.get(str(request_id))
+    if session:
+        session.expire(reason)
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def distribution(batch_id: Optional[str] = None, since: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Time-to-OTP per (operator, country, first/resend): counts, outcomes and percentiles"""
+    clauses, params = [], []
+    if batch_id is not None:
+        clauses.append("batch_id = ?")
+        params.append(batch_id)
+    if since is not None:
+        clauses.append("recorded_at >= ?")
+        params.append(since)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _connect().execute(f"SELECT * FROM otp_waits {where}", params).fetchall()
+
+    groups: Dict[tuple, List[sqlite3.Row]] = {}
+    for row in rows:
+        groups.setdefault((row["operator"], row["country"], row["kind"]), []).append(row)
+
+    report = []
+    for (operator, country, kind), waits in sorted(groups.items(), key=lambda g: tuple(str(k) for k in g[0])):
+        received = sorted(w["seconds"] for w in waits if w["outcome"] == "received")
+        report.append({
+            "operator": operator,
+            "country": country,
+            "kind": kind,
+            "waits": len(waits),
+            "received": len(received),
+            "timeouts": sum(1 for w in waits if w["outcome"] == "timeout"),
+            "cancelled": sum(1 for w in waits if w["outcome"] == "cancelled"),
+            "p50_seconds": _percentile(received, 0.5),
+            "p90_seconds": _percentile(received, 0.9),
+            "max_seconds": received[-1] if received else None,
+            "mean_seconds": round(sum(received) / len(received), 2) if received else None,
+            "avg_polls": round(sum(w["polls"] for w in waits) / len(waits), 1),
+        })
+    return report
@@ -0,0 +1,109 @@
+"""
+Product URL preflight, run once per batch before any number is bought
+
+Every URL in PRODUCTS_JSON is fetched once, in parallel, over plain HTTP (no
+browser, no login). The server-rendered page is classified as:
+
+    available     - the ADD button markup is present
+    out_of_stock  - an OOS indicator is in the visible text
+    dead          - HTTP 404/410 (product removed)
+    unknown       - anything else (network error, client-rendered page...)
+
+automation_worker drops out_of_stock/dead products, keeps available ones
+ahead of unknown ones, and fails the whole batch up front if nothing is left.
+Unknown products are kept, so a flaky network never drops a good product.
+"""
+import html
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib import error, request
+
+# Same indicators main.py looks for on the product page
+OOS_INDICATORS = ["Currently Unavailable", "Notify Me", "Out of Stock", "Sold Out"]
+UNDELIVERABLE_INDICATORS = ["Not deliverable", "not available at your location", "Not available in your area"]
+ADD_BUTTON_MARKERS = ["add-button"]
+
+PREFLIGHT_TIMEOUT = float(os.environ.get('PREFLIGHT_TIMEOUT', '10'))
+PREFLIGHT_CONCURRENCY = int(os.environ.get('PREFLIGHT_CONCURRENCY', '8'))
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style|noscript)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+STATUS_RANK = {"available": 0, "unknown": 1, "out_of_stock": 2, "dead": 3}
+
+
+def visible_text(markup: str) -> str:
+    """Page text without scripts, styles and tags (so JSON blobs can't trigger OOS markers)"""
+    text = _SCRIPT_STYLE_RE.sub(' ', markup)
+    text = _TAG_RE.sub(' ', text)
+    return ' '.join(html.unescape(text).split())
+
+
+def classify_page(markup: str) -> Dict[str, Optional[str]]:
+    """Availability verdict for a product page's HTML"""
+    text = visible_text(markup)
+    lowered = text.lower()
+    for indicator in UNDELIVERABLE_INDICATORS:
+        if indicator.lower() in lowered:
+            return {"status": "out_of_stock", "reason": f"'{indicator}' on page"}
+    without_scripts = _SCRIPT_STYLE_RE.sub(' ', markup)
+    if any(marker in without_scripts for marker in ADD_BUTTON_MARKERS):
+        return {"status": "available", "reason": None}
+    for indicator in OOS_INDICATORS:
+        if indicator in text:
+            return {"status": "out_of_stock", "reason": f"'{indicator}' on page"}
+    return {"status": "unknown", "reason": "no availability markers in server-rendered page"}
+
+
+def check_product(url: str, timeout: float = PREFLIGHT_TIMEOUT,
+                  cookies: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch one product page and classify it"""
+    started = time.time()
+    result: Dict[str, Any] = {"url": url, "http_status": None}
+    headers = {"User-Agent": USER_AGENT, "Accept": "text/html", "Accept-Language": "en-IN,en;q=0.9"}
+    if cookies:
+        headers["Cookie"] = cookies
+    try:
+        with request.urlopen(request.Request(url, headers=headers), timeout=timeout) as resp:
+            result["http_status"] = resp.status
+            markup = resp.read(2 * 1024 * 1024).decode('utf-8', errors='replace')
+        result.update(classify_page(markup))
+    except error.HTTPError as e:
+        result["http_status"] = e.code
+        if e.code in (404, 410):
+            result.update(status="dead", reason=f"HTTP {e.code}")
+        else:
+            result.update(status="unknown", reason=f"HTTP {e.code}")
+    except Exception as e:
+        result.update(status="unknown", reason=str(e))
+    result["seconds"] = round(time.time() - started, 2)
+    return result
+
+
+def preflight(products: List[Dict[str, Any]], max_workers: int = PREFLIGHT_CONCURRENCY,
+              cookies: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Check every product in parallel.
+    Returns {"products": usable products (available first), "dropped": [...], "results": [...]}
+    """
+    urls = [p.get('url', '').strip() for p in products]
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls) or 1))) as pool:
+        results = list(pool.map(lambda u: check_product(u, cookies=cookies), urls))
+
+    ranked = sorted(zip(products, results), key=lambda pr: STATUS_RANK[pr[1]["status"]])
+    usable = [p for p, r in ranked if r["status"] in ("available", "unknown")]
+    dropped = [dict(url=r["url"], status=r["status"], reason=r["reason"])
+               for _, r in ranked if r["status"] not in ("available", "unknown")]
+    return {
+        "products": usable,
+        "dropped": dropped,
+        "results": results,
+        "seconds": round(time.time() - started, 2),
+    }
@@ -0,0 +1,111 @@
+"""
+Execution profiles: which device the checkout runs as (EXECUTION_PROFILE)
+
+    desktop  - 1280x720 desktop context (the default, unchanged behaviour)
+    mobile   - Android phone emulation (mobile viewport and user agent, touch,
+               isMobile). The storefront then serves its mobile web build,
+               which has smaller bundles and a simpler DOM, so more windows
+               fit on one host. DPR stays 1 so responsive images are not
+               fetched at 2-3x size.
+
+Each profile carries the browser.new_context() options that define the
+device and the selectors for elements whose markup depends on the layout
+(header vs bottom navigation). Selector lists are tried in order. The mobile
+lists start with the desktop class names, which the shared CSS modules keep,
+followed by attribute-based fallbacks for the mobile navigation.
+
+Compare the two with: python benchmarks/profile_benchmark.py
+"""
+import os
+from typing import Any, Dict, List
+
+EXECUTION_PROFILE = os.environ.get('EXECUTION_PROFILE', 'desktop').strip().lower()
+
+MOBILE_USER_AGENT = (
+    "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36"
+)
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "desktop": {
+        "context": {
+            "viewport": {"width": 1280, "height": 720},  # Smaller viewport
+            "device_scale_factor": 1,
+            "has_touch": False,
+            "is_mobile": False,
+        },
+        "selectors": {
+            "user_icon": [
+                "div.UserOptions_userContainer__CqX1R",
+                "div[class*='UserOptions_userContainer']",
+                "div[class*='userContainer']",
+                "button:has-text('Login')",
+                "span:has-text('Login')",
+            ],
+            "bag_icon": ["img[src*='bag']"],
+            "address_bar": ["p.Address_addressBold__GlDKW"],
+            "add_button": [".ActionSection_container__ertTt button.add-button"],
+        },
+    },
+    "mobile": {
+        "context": {
+            "viewport": {"width": 412, "height": 839},
+            "screen": {"width": 412, "height": 915},
+            "device_scale_factor": 1,
+            "has_touch": True,
+            "is_mobile": True,
+            "user_agent": MOBILE_USER_AGENT,
+        },
+        "selectors": {
+            "user_icon": [
+                "div.UserOptions_userContainer__CqX1R",
+                "div[class*='UserOptions_userContainer']",
+                "div[class*='userContainer']",
+                "a[href*='/profile']",
+                "a[href*='/account']",
+                "img[alt*='profile']",
+                "button:has-text('Login')",
+                "span:has-text('Login')",
+            ],
+            "bag_icon": [
+                "img[src*='bag']",
+                "a[href*='/cart']",
+                "img[alt*='cart']",
+            ],
+            "address_bar": [
+                "p.Address_addressBold__GlDKW",
+                "p[class*='Address_addressBold']",
+            ],
+            "add_button": [
+                ".ActionSection_container__ertTt button.add-button",
+                "button.add-button",
+            ],
+        },
+    },
+}
+
+
+if EXECUTION_PROFILE not in PROFILES:
+    print(f"⚠️ Unknown EXECUTION_PROFILE '{EXECUTION_PROFILE}', using desktop")
+    EXECUTION_PROFILE = "desktop"
+
+
+def active(name: str = None) -> Dict[str, Any]:
+    """The selected profile (EXECUTION_PROFILE unless a name is given)"""
+    name = name or EXECUTION_PROFILE
+    return dict(PROFILES[name], name=name)
+
+
+def context_options(name: str = None) -> Dict[str, Any]:
+    """Device options for browser.new_context()"""
+    return dict(active(name)["context"])
+
+
+def selectors(key: str, name: str = None) -> List[str]:
+    """Selector list for a layout-dependent element, in the order to try them"""
+    return list(active(name)["selectors"][key])
+
+
+def selector(key: str, name: str = None) -> str:
+    """The selector list as one CSS selector list (for locator() / wait_for_selector())"""
+    return ", ".join(selectors(key, name))
@@ -0,0 +1,189 @@
+"""
+In-page readiness signals for the checkout's landmarks
+
+An init script (added once per browser context, so it runs in every page and
+after every navigation) watches the DOM with a MutationObserver plus
+animation/transition end events. After each batch of changes it re-checks the
+known landmarks (ADD button, cart drawer, OTP inputs, payment list, order
+result...). A landmark is ready when one of its elements is visible, enabled,
+accepts pointer events and has no running animation on itself or an
+ancestor. Readiness flips are reported to Python through the exposed
+__reportReadiness binding.
+
+Readiness.wait() is a single page.evaluate that returns a promise. The
+promise resolves inside the page the moment the landmark becomes ready, so
+there is no selector polling and no padding sleep "for animations". Landmarks
+matched by text (text=, :has-text()) are only evaluated while a step waits on
+them, so the observer stays cheap.
+
+READINESS=0 disables it. main.py then falls back to its selector waits.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from dom_probe import DOM_QUERY_JS
+
+READINESS_ENABLED = os.environ.get('READINESS', '1') != '0'
+
+LANDMARKS: Dict[str, List[str]] = {
+    "add_button": [".ActionSection_container__ertTt button.add-button"],
+    "cart_drawer": [
+        "button.AddToCart_cartButton__tWwqP",
+        "button:has-text('Proceed')",
+        "button:has-text('Login')",
+        "text=Remove Item",
+    ],
+    "phone_input": ["input[placeholder='Ex 9876543210']"],
+    "otp_inputs": ["input[type='tel'][maxlength='1']"],
+    "verify_otp": ["button.Button_button__8B4nB.Button_active__8l_7k:has-text('Verify OTP')"],
+    "payment_list": ["div.Payment_methodItem__BLz7I"],
+    "place_order": ["button.CodView_orderButton__E53_u", "button:has-text('Place Order')"],
+    "order_result": [
+        "text=Order Placed",
+        "text=Order Confirmed",
+        "text=Thank you",
+        "text=Something went wrong",
+        "text=Out of Stock",
+        "text=Not available",
+        "text=Sold Out",
+    ],
+}
+
+INIT_SCRIPT_TEMPLATE = """
+(() => {
+    if (window.__readiness) return;
+    const LANDMARKS = %(landmarks)s;
+%(query)s
+    // Infinite animations (spinners, skeleton shimmer) never finish, so they don't block readiness
+    const animating = (el) => document.getAnimations().some((a) =>
+        a.playState === 'running' && a.effect && a.effect.target &&
+        a.effect.getComputedTiming().iterations !== Infinity &&
+        (a.effect.target === el || a.effect.target.contains(el)));
+    const interactable = (el) => isVisible(el) && !el.disabled &&
+        el.getAttribute('aria-disabled') !== 'true' &&
+        getComputedStyle(el).pointerEvents !== 'none' && !animating(el);
+    const byText = (selector) => selector.startsWith('text=') || selector.includes(':has-text(');
+
+    const readiness = window.__readiness = {state: {}, waiters: []};
+    const check = () => {
+        const waited = new Set(readiness.waiters.map((w) => w.name));
+        for (const [name, selectors] of Object.entries(LANDMARKS)) {
+            if (selectors.some(byText) && !waited.has(name)) continue;
+            const ready = selectors.some((s) => query(s).some(interactable));
+            if (ready !== !!readiness.state[name]) {
+                readiness.state[name] = ready;
+                if (window.__reportReadiness) {
+                    window.__reportReadiness(name, ready, performance.now()).catch(() => {});
+                }
+            }
+        }
+        readiness.waiters = readiness.waiters.filter((w) => {
+            if (!readiness.state[w.name]) return true;
+            clearTimeout(w.timer);
+            w.resolve(true);
+            return false;
+        });
+    };
+    // Coalesce a burst of mutations into one check (rAF, or a timer in throttled background tabs)
+    let scheduled = false;
+    const run = () => {
+        if (!scheduled) return;
+        scheduled = false;
+        check();
+    };
+    const schedule = () => {
+        if (scheduled) return;
+        scheduled = true;
+        requestAnimationFrame(run);
+        setTimeout(run, 50);
+    };
+    readiness.wait = (name, timeout) => new Promise((resolve) => {
+        const waiter = {name, resolve};
+        waiter.timer = setTimeout(() => {
+            readiness.waiters = readiness.waiters.filter((w) => w !== waiter);
+            resolve(false);
+        }, timeout);
+        readiness.waiters.push(waiter);
+        check();
+    });
+
+    new MutationObserver(schedule).observe(document, {
+        subtree: true, childList: true, attributes: true, characterData: true
+    });
+    for (const type of ['animationend', 'animationcancel', 'transitionend', 'transitioncancel',
+                        'DOMContentLoaded', 'load']) {
+        window.addEventListener(type, schedule, true);
+    }
+})();
+"""
+
+
+# page.evaluate() errors that only mean the document changed under it; anything else is fatal
+NAVIGATION_ERROR_HINTS = (
+    'execution context was destroyed',
+    'cannot find context with specified id',
+    'frame was detached',
+    'navigat',
+)
+
+
+def is_navigation_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return 'closed' not in message and any(hint in message for hint in NAVIGATION_ERROR_HINTS)
+
+
+def build_init_script(landmarks: Dict[str, List[str]] = LANDMARKS) -> str:
+    return INIT_SCRIPT_TEMPLATE % {"landmarks": json.dumps(landmarks), "query": DOM_QUERY_JS}
+
+
+class Readiness:
+    def __init__(self, context, landmarks: Dict[str, List[str]] = LANDMARKS):
+        self.landmarks = landmarks
+        self.script = build_init_script(landmarks)
+        self.events: List[Dict[str, Any]] = []
+        context.expose_binding("__reportReadiness", self._on_report)
+        context.add_init_script(self.script)
+
+    def _on_report(self, source, name, ready, page_ms):
+        self.events.append({"landmark": name, "ready": ready, "page_ms": page_ms, "time": time.time()})
+
+    def wait(self, page, name: str, timeout: float = 30000) -> bool:
+        """
+        Block until the landmark is interactable (True) or timeout ms pass (False).
+        Survives navigations: the wait is re-armed in the new document.
+        """
+        if name not in self.landmarks:
+            raise KeyError(f"Unknown readiness landmark: {name}")
+        started = time.time()
+        deadline = started + timeout / 1000
+        while True:
+            remaining = int((deadline - time.time()) * 1000)
+            if remaining <= 0 or page.is_closed():
+                return False
+            try:
+                ready = page.evaluate(
+                    "([name, timeout]) => window.__readiness ? window.__readiness.wait(name, timeout) : null",
+                    [name, remaining]
+                )
+            except Exception as e:
+                if not is_navigation_error(e):
+                    print(f"⚠️ Readiness wait for '{name}' failed: {e}")
+                    return False
+                # Execution context destroyed by a navigation; wait again in the new document
+                time.sleep(0.05)
+                continue
+            if ready is None:
+                # Page opened before the init script was registered (or about:blank)
+                try:
+                    page.evaluate(self.script)
+                except Exception as e:
+                    if not is_navigation_error(e):
+                        return False
+                    time.sleep(0.05)
+                continue
+            if ready:
+                print(f"⚡ '{name}' ready after {time.time() - started:.2f}s")
+            return bool(ready)
+
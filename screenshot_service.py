@@ -0,0 +1,227 @@
+"""
+Screenshot pipeline: compressed capture, hash dedup, background write-out
+
+capture() grabs a JPEG (or WebP, when Pillow is installed) at the configured
+quality and returns the final path immediately. A background thread writes
+the file, so the checkout flow doesn't wait on disk I/O. Identical frames
+(same content hash) are stored once.
+
+Each image gets a small ``<name>.meta.jsonl`` sidecar listing the
+orders/steps/reasons it was taken for. Every capture appends one JSON line
+with O_APPEND, so main.py processes that dedupe onto the same image never
+overwrite each other's entries.
+
+The screenshots directory is kept under a disk quota by evicting the least
+recently used images.
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Optional: WebP output needs Pillow to transcode Playwright's JPEG/PNG
+try:
+    from PIL import Image
+    import io
+    _PIL_AVAILABLE = True
+except ImportError:
+    _PIL_AVAILABLE = False
+
+SCREENSHOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
+SCREENSHOT_FORMAT = os.environ.get('SCREENSHOT_FORMAT', 'jpeg').lower()  # jpeg | webp | png
+SCREENSHOT_QUALITY = int(os.environ.get('SCREENSHOT_QUALITY', '60'))
+SCREENSHOT_QUOTA_MB = float(os.environ.get('SCREENSHOT_QUOTA_MB', '200'))
+
+META_SUFFIX = '.meta.jsonl'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+_write_queue: "queue.Queue" = queue.Queue()
+_writer_thread: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _extension() -> str:
+    if SCREENSHOT_FORMAT == 'webp' and _PIL_AVAILABLE:
+        return 'webp'
+    if SCREENSHOT_FORMAT == 'png':
+        return 'png'
+    return 'jpg'
+
+
+def _grab(page, full_page: bool) -> bytes:
+    """Take the screenshot in the configured format and return its bytes"""
+    if SCREENSHOT_FORMAT == 'png':
+        return page.screenshot(type='png', full_page=full_page)
+    data = page.screenshot(type='jpeg', quality=SCREENSHOT_QUALITY, full_page=full_page)
+    if SCREENSHOT_FORMAT == 'webp' and _PIL_AVAILABLE:
+        out = io.BytesIO()
+        Image.open(io.BytesIO(data)).save(out, format='WEBP', quality=SCREENSHOT_QUALITY)
+        return out.getvalue()
+    return data
+
+
+def _meta_path(image_path: str) -> str:
+    return image_path + META_SUFFIX
+
+
+def _atomic_write(path: str, data: bytes):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _append_metadata(image_path: str, entry: Dict[str, Any]):
+    """Append one capture record in a single O_APPEND write (no read-modify-write across processes)"""
+    line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+    fd = os.open(_meta_path(image_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _enforce_quota():
+    """Evict least recently used images (and their metadata) until under quota"""
+    quota_bytes = SCREENSHOT_QUOTA_MB * 1024 * 1024
+    if quota_bytes <= 0:
+        return
+    images = []
+    total = 0
+    for filename in os.listdir(SCREENSHOTS_DIR):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        filepath = os.path.join(SCREENSHOTS_DIR, filename)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            continue
+        images.append((stat.st_mtime, stat.st_size, filepath))
+        total += stat.st_size
+    if total <= quota_bytes:
+        return
+    for _, size, filepath in sorted(images):
+        try:
+            os.remove(filepath)
+            if os.path.exists(_meta_path(filepath)):
+                os.remove(_meta_path(filepath))
+            total -= size
+            print(f"🧹 Evicted old screenshot: {os.path.basename(filepath)}")
+        except OSError:
+            continue
+        if total <= quota_bytes:
+            break
+
+
+def _writer_loop():
+    while True:
+        job = _write_queue.get()
+        try:
+            image_path, data, entry = job
+            if data is not None:
+                _atomic_write(image_path, data)
+            else:
+                # Duplicate frame: mark as recently used for LRU eviction
+                os.utime(image_path, None)
+            _append_metadata(image_path, entry)
+            _enforce_quota()
+        except Exception as e:
+            print(f"⚠️ Screenshot write failed: {e}")
+        finally:
+            _write_queue.task_done()
+
+
+def _ensure_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name='screenshot-writer', daemon=True)
+            _writer_thread.start()
+
+
+def capture(page, prefix: str = 'failed', step: Optional[str] = None, reason: Optional[str] = None,
+            order_number: Optional[str] = None, full_page: bool = False) -> Optional[str]:
+    """
+    Take a compressed screenshot and queue it for writing.
+    Returns the path the image will be written to, or None if capture failed.
+    """
+    try:
+        data = _grab(page, full_page)
+    except Exception as e:
+        print(f"⚠️ Screenshot failed: {e}")
+        return None
+
+    os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
+    digest = hashlib.sha1(data).hexdigest()[:16]
+    image_path = os.path.join(SCREENSHOTS_DIR, f"{prefix}_{digest}.{_extension()}")
+    entry = {
+        "order_number": order_number or os.environ.get('ORDER_NUMBER'),
+        "batch_id": os.environ.get('BATCH_ID'),
+        "step": step,
+        "reason": reason,
+        "timestamp": datetime.now().isoformat(),
+    }
+    duplicate = os.path.exists(image_path)
+    _write_queue.put((image_path, None if duplicate else data, entry))
+    _ensure_writer()
+    if duplicate:
+        print(f"📸 Screenshot identical to existing {os.path.basename(image_path)} (deduplicated)")
+    return image_path
+
+
+def flush(timeout: float = 10.0) -> bool:
+    """Wait for queued screenshots to reach disk. Returns False on timeout."""
+    deadline = time.time() + timeout
+    while _write_queue.unfinished_tasks:
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def get_metadata(filename: str) -> Optional[Dict[str, Any]]:
+    """Metadata (captures with order/step/reason) for an image in the screenshots dir"""
+    meta_path = _meta_path(os.path.join(SCREENSHOTS_DIR, filename))
+    captures = []
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    captures.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a torn line from a crashed writer
+    except OSError:
+        return None
+    return {"file": filename, "captures": captures}
+
+
+def list_screenshots() -> List[Dict[str, Any]]:
+    """All stored images with size and capture metadata, newest first"""
+    if not os.path.isdir(SCREENSHOTS_DIR):
+        return []
+    items = []
+    for filename in os.listdir(SCREENSHOTS_DIR):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        filepath = os.path.join(SCREENSHOTS_DIR, filename)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            continue
+        meta = get_metadata(filename) or {}
+        items.append({
+            "filename": filename,
+            "size": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "captures": meta.get("captures", []),
+        })
+    items.sort(key=lambda x: x["modified"], reverse=True)
+    return items
+
+
+atexit.register(flush)
@@ -1,32 +1,125 @@
 """
 Shared state for tracking active request IDs across processes
+
+Backed by a small SQLite database (shared_state.db, WAL mode) so the backend,
+automation_worker and every main.py process see the same set. Request IDs
+are primary keys (indexed membership tests and removal), each one can carry
+a TTL after which it stops being reported, and IDs are grouped by batch.
 """
+import json
+import os
+import sqlite3
 import threading
+import time
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB = os.environ.get('SHARED_STATE_DB') or os.path.join(BASE_DIR, 'shared_state.db')
+
+# Default lifetime of a request ID (providers expire numbers on their own)
+DEFAULT_TTL = float(os.environ.get('REQUEST_ID_TTL_SECONDS', '1800'))
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread (and per database path)"""
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(STATE_DB)
+    if conn is None:
+        conn = sqlite3.connect(STATE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS request_ids (
+                request_id TEXT PRIMARY KEY,
+                batch_id TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                data TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_request_ids_batch ON request_ids (batch_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_request_ids_expiry ON request_ids (expires_at)")
+        conns[STATE_DB] = conn
+    return conn
+
+
+def _live_clause(batch_id: Optional[str]):
+    clauses = ["(expires_at IS NULL OR expires_at > ?)"]
+    params: List[Any] = [time.time()]
+    if batch_id is not None:
+        clauses.append("batch_id = ?")
+        params.append(batch_id)
+    return " AND ".join(clauses), params
+
 
-# Thread-safe storage
-_lock = threading.Lock()
-_active_request_ids = []
+def add_request_id(request_id, batch_id: Optional[str] = None, ttl: Optional[float] = DEFAULT_TTL,
+                   data: Optional[Dict[str, Any]] = None):
+    """Add a request ID to the active set (ttl=None keeps it until removed)"""
+    now = time.time()
+    _connect().execute(
+        "INSERT OR REPLACE INTO request_ids (request_id, batch_id, created_at, expires_at, data) VALUES (?, ?, ?, ?, ?)",
+        (str(request_id), batch_id, now, now + ttl if ttl else None, json.dumps(data) if data else None)
+    )
 
-def add_request_id(request_id):
-    """Add a request ID to the active list"""
-    with _lock:
-        if request_id not in _active_request_ids:
-            _active_request_ids.append(request_id)
 
 def remove_request_id(request_id):
-    """Remove a request ID from the active list"""
-    with _lock:
-        if request_id in _active_request_ids:
-            _active_request_ids.remove(request_id)
+    """Remove a request ID from the active set"""
+    _connect().execute("DELETE FROM request_ids WHERE request_id = ?", (str(request_id),))
+
+
+def has_request_id(request_id) -> bool:
+    """True if the request ID is active (and not expired)"""
+    where, params = _live_clause(None)
+    row = _connect().execute(
+        f"SELECT 1 FROM request_ids WHERE request_id = ? AND {where}", (str(request_id), *params)
+    ).fetchone()
+    return row is not None
+
+
+def get_all_request_ids(batch_id: Optional[str] = None) -> List[str]:
+    """All active request IDs (of one batch, if given)"""
+    where, params = _live_clause(batch_id)
+    rows = _connect().execute(f"SELECT request_id FROM request_ids WHERE {where} ORDER BY created_at", params)
+    return [row["request_id"] for row in rows]
+
+
+def get_entries(batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Active request IDs with their batch, timestamps and attached data"""
+    where, params = _live_clause(batch_id)
+    rows = _connect().execute(f"SELECT * FROM request_ids WHERE {where} ORDER BY created_at", params)
+    entries = []
+    for row in rows:
+        entry = dict(row)
+        entry["data"] = json.loads(entry["data"]) if entry["data"] else {}
+        entries.append(entry)
+    return entries
+
+
+def get_batches() -> Dict[str, int]:
+    """Number of active request IDs per batch"""
+    where, params = _live_clause(None)
+    rows = _connect().execute(
+        f"SELECT batch_id, COUNT(*) AS count FROM request_ids WHERE {where} GROUP BY batch_id", params
+    )
+    return {row["batch_id"]: row["count"] for row in rows}
 
-def get_all_request_ids():
-    """Get a copy of all active request IDs"""
-    with _lock:
-        return _active_request_ids.copy()
 
-def clear_all_request_ids():
-    """Clear all active request IDs"""
-    with _lock:
-        _active_request_ids.clear()
+def purge_expired() -> int:
+    """Delete expired request IDs; returns how many were removed"""
+    cursor = _connect().execute(
+        "DELETE FROM request_ids WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+    )
+    return cursor.rowcount
 
 
+def clear_all_request_ids(batch_id: Optional[str] = None):
+    """Clear all active request IDs (of one batch, if given)"""
+    if batch_id is None:
+        _connect().execute("DELETE FROM request_ids")
+    else:
+        _connect().execute("DELETE FROM request_ids WHERE batch_id = ?", (batch_id,))
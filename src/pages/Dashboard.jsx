@@ -31,6 +31,8 @@ function Dashboard() {
   const [activeTab, setActiveTab] = useState('dashboard')
   const [orders, setOrders] = useState({ success: [], failed: [] })
   const [orderStats, setOrderStats] = useState({ success: 0, failed: 0 })
+  const [ordersCursor, setOrdersCursor] = useState(null)
+  const [loadingMoreOrders, setLoadingMoreOrders] = useState(false)
   const [logFiles, setLogFiles] = useState([])
   const [selectedLogContent, setSelectedLogContent] = useState(null)
   const [selectedLogFilename, setSelectedLogFilename] = useState(null)
@@ -456,7 +458,8 @@ function Dashboard() {
 
   const loadOrdersReport = async () => {
     try {
-      const result = await getOrdersReport()
+      // First page only; further pages are fetched with "Load more"
+      const result = await getOrdersReport({ limit: 200 })
       if (result.success) {
         setOrders({
           success: result.orders?.success || [],
@@ -466,6 +469,7 @@ function Dashboard() {
           success: result.total?.success || 0,
           failed: result.total?.failed || 0
         })
+        setOrdersCursor(result.has_more ? result.next_cursor : null)
       } else {
         addLog('error', `Failed to load orders: ${result.error}`)
       }
@@ -474,6 +478,29 @@ function Dashboard() {
     }
   }
 
+  const loadMoreOrders = async () => {
+    if (!ordersCursor) return
+    setLoadingMoreOrders(true)
+    try {
+      const result = await getOrdersReport({ limit: 200, cursor: ordersCursor, aggregates: 0 })
+      if (result.success) {
+        setOrders(prev => ({
+          success: [...prev.success, ...(result.orders?.success || [])],
+          failed: [...prev.failed, ...(result.orders?.failed || [])]
+        }))
+        setOrdersCursor(result.has_more ? result.next_cursor : null)
+      } else {
+        // e.g. the report changed under the cursor: start over from the first page
+        addLog('error', `Failed to load more orders: ${result.error}`)
+        loadOrdersReport()
+      }
+    } catch (error) {
+      addLog('error', `Error loading more orders: ${error.message}`)
+    } finally {
+      setLoadingMoreOrders(false)
+    }
+  }
+
   const handleClearReports = async () => {
     if (!window.confirm('Are you sure you want to delete ALL reports and screenshots? This action cannot be undone.')) {
       return
@@ -1837,6 +1864,22 @@ function Dashboard() {
                 </div>
               )}
             </div>
+
+            {ordersCursor && (
+              <div className="flex flex-col items-center gap-2">
+                <span className="text-sm text-gray-400">
+                  Showing {orders.success.length + orders.failed.length} of {orderStats.success + orderStats.failed} orders
+                </span>
+                <button
+                  onClick={loadMoreOrders}
+                  disabled={loadingMoreOrders}
+                  className="flex items-center gap-2 px-4 py-2 bg-blue-600 hover:bg-blue-700 disabled:opacity-50 rounded-lg transition-colors"
+                >
+                  <ChevronDown className="w-4 h-4" />
+                  {loadingMoreOrders ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </motion.div>
         )}
 
@@ -283,9 +283,10 @@ export const getAutomationStatus = async () => {
 }
 
 // Reports API
-export const getOrdersReport = async () => {
+export const getOrdersReport = async (params = {}) => {
   try {
-    const response = await api.get('/orders/report')
+    // params: status, since, until, limit, cursor, aggregates
+    const response = await api.get('/orders/report', { params })
     return response.data
   } catch (error) {
     return {
@@ -0,0 +1,286 @@
+"""
+Hot-standby browsers parked at the login modal (STANDBY_PAGES=N)
+
+Loading the homepage, selecting the location and opening the login modal
+make up most of an order's head latency, and none of it needs a phone
+number. With STANDBY_PAGES > 0 automation_worker.py runs this module as a
+side process. It keeps up to N Chromium instances (one persistent context
+each, so accounts never share cookies) driven to the "enter phone number"
+state and listens on a local DevTools port per instance.
+
+main.py calls claim() first. A ready slot is handed over in one SQLite
+transaction, and main.py attaches to it with connect_over_cdp() and goes
+straight to buying a number. When claim() returns nothing, main.py starts
+cold as before. The pool then refills in the background.
+
+Slots are health-checked every STANDBY_HEALTH_INTERVAL seconds (page alive,
+phone input still visible) and recycled after STANDBY_MAX_IDLE_SECONDS
+unclaimed. A claimed slot is closed once main.py releases it at exit, or
+after STANDBY_CLAIM_TTL_SECONDS if its process died without releasing it.
+
+    python standby_pool.py          # started/stopped by automation_worker.py
+"""
+import atexit
+import math
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STANDBY_DB = os.environ.get('STANDBY_DB') or os.path.join(BASE_DIR, 'standby.db')
+
+STANDBY_PAGES = int(os.environ.get('STANDBY_PAGES', '0'))
+STANDBY_MAX_IDLE = float(os.environ.get('STANDBY_MAX_IDLE_SECONDS', '300'))
+STANDBY_HEALTH_INTERVAL = float(os.environ.get('STANDBY_HEALTH_INTERVAL', '20'))
+STANDBY_CLAIM_TTL = float(os.environ.get('STANDBY_CLAIM_TTL_SECONDS', '1800'))
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(STANDBY_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS standby_slots (
+                slot_id TEXT PRIMARY KEY,
+                batch_id TEXT,
+                endpoint TEXT NOT NULL,
+                status TEXT NOT NULL,
+                ready_at REAL NOT NULL,
+                claimed_by INTEGER,
+                claimed_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_standby_status ON standby_slots (batch_id, status)")
+        _local.conn = conn
+    return conn
+
+
+# =========================
+# CLAIMING (main.py side)
+# =========================
+def claim(batch_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Take the oldest ready slot of this batch: {"slot_id", "endpoint", "ready_at", ...} or None.
+    The slot is released automatically when this process exits.
+    """
+    batch_id = batch_id or os.environ.get('BATCH_ID')
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM standby_slots WHERE status = 'ready' AND batch_id IS ? ORDER BY ready_at LIMIT 1",
+            (batch_id,)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE standby_slots SET status = 'claimed', claimed_by = ?, claimed_at = ? WHERE slot_id = ?",
+                (os.getpid(), time.time(), row["slot_id"])
+            )
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+        print(f"⚠️ Standby claim failed: {e}")
+        return None
+    if not row:
+        return None
+    atexit.register(release, row["slot_id"])
+    return dict(row)
+
+
+def release(slot_id: str):
+    """Hand a claimed slot back to the pool for closing (its account session is spent)"""
+    try:
+        _connect().execute("UPDATE standby_slots SET status = 'released' WHERE slot_id = ?", (slot_id,))
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to release standby slot {slot_id}: {e}")
+
+
+def _retire(slot_id: str) -> bool:
+    """Take an unclaimed slot out of the pool. False if an order claimed it first."""
+    cur = _connect().execute(
+        "UPDATE standby_slots SET status = 'retired' WHERE slot_id = ? AND status = 'ready'", (slot_id,)
+    )
+    return cur.rowcount == 1
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# =========================
+# POOL (side process)
+# =========================
+class StandbyPool:
+    def __init__(self, playwright, size: int, batch_id: Optional[str], demand: Optional[int] = None):
+        import main  # checkout helpers; imported here because main.py imports this module
+        self.main = main
+        self.playwright = playwright
+        self.size = size
+        self.batch_id = batch_id
+        self.demand = demand  # processes that will still start (no point parking more than that)
+        self.slots: Dict[str, Dict[str, Any]] = {}
+        self.claimed = 0
+        self.last_health_check = time.time()
+
+    def open_slot(self) -> Optional[str]:
+        """Launch a browser and drive it to the login modal; returns the slot id or None"""
+        main = self.main
+        slot_id = uuid.uuid4().hex[:12]
+        port = _free_port()
+        user_dir = tempfile.mkdtemp(prefix="standby_")
+        started = time.time()
+        context = None
+        try:
+            context = self.playwright.chromium.launch_persistent_context(
+                user_dir,
+                headless=True,
+                args=main.BROWSER_ARGS + [f"--remote-debugging-port={port}"],
+                timeout=30000,
+                **main.context_options()
+            )
+            # Readiness is installed by the order that claims the slot (its binding reports to that process)
+            main.prepare_context(context, readiness=False)
+            main.seed_location(context)
+            page = context.pages[0] if context.pages else context.new_page()
+            page.goto(main.HOME_URL, timeout=60000)
+            time.sleep(2)
+            if os.environ.get('SELECT_LOCATION', '1') == '1' and not main.location_fast_path_ok(page):
+                before = main.location_snapshot(page)
+                main.select_location(page, *main.location_settings())
+                if before is not None:
+                    main.remember_location(page, before)
+            time.sleep(2)
+            main.click_user_icon_with_retry(page)
+            page.locator(main.PHONE_INPUT_SELECTOR).wait_for(state="visible", timeout=15000)
+        except Exception as e:
+            print(f"⚠️ Standby slot failed to reach the login modal: {e}")
+            self._close(context, user_dir)
+            return None
+
+        now = time.time()
+        self.slots[slot_id] = {"context": context, "user_dir": user_dir, "ready_at": now}
+        _connect().execute(
+            "INSERT INTO standby_slots (slot_id, batch_id, endpoint, status, ready_at) VALUES (?, ?, ?, 'ready', ?)",
+            (slot_id, self.batch_id, f"http://127.0.0.1:{port}", now)
+        )
+        print(f"🅿️ Standby slot {slot_id} parked at the login modal in {now - started:.1f}s")
+        return slot_id
+
+    def _close(self, context, user_dir):
+        if context is not None:
+            try:
+                context.close()
+            except Exception:
+                pass
+        shutil.rmtree(user_dir, ignore_errors=True)
+
+    def close_slot(self, slot_id: str, reason: str):
+        slot = self.slots.pop(slot_id, None)
+        _connect().execute("DELETE FROM standby_slots WHERE slot_id = ?", (slot_id,))
+        if slot:
+            self._close(slot["context"], slot["user_dir"])
+            print(f"🗑️ Standby slot {slot_id} closed ({reason})")
+
+    def reap(self):
+        """Close slots their orders released (or abandoned), count new claims"""
+        rows = {row["slot_id"]: row for row in _connect().execute(
+            "SELECT slot_id, status, claimed_at FROM standby_slots WHERE batch_id IS ?", (self.batch_id,)
+        )}
+        for slot_id, slot in list(self.slots.items()):
+            row = rows.get(slot_id)
+            if row is None:
+                self.close_slot(slot_id, "row missing")
+                continue
+            if row["status"] == "claimed" and not slot.get("claimed"):
+                slot["claimed"] = True
+                self.claimed += 1
+                print(f"🤝 Standby slot {slot_id} claimed after {time.time() - slot['ready_at']:.0f}s parked")
+            if row["status"] == "released":
+                self.close_slot(slot_id, "order finished")
+            elif row["status"] == "claimed" and time.time() - (row["claimed_at"] or 0) > STANDBY_CLAIM_TTL:
+                self.close_slot(slot_id, "claim expired")
+
+    def health_check(self):
+        """Recycle unclaimed slots that are stale or no longer at the login modal"""
+        self.last_health_check = time.time()
+        for slot_id, slot in list(self.slots.items()):
+            if slot.get("claimed"):
+                continue
+            if time.time() - slot["ready_at"] > STANDBY_MAX_IDLE:
+                reason = "max idle age"
+            else:
+                try:
+                    page = slot["context"].pages[0]
+                    state = self.main.probe(page, {"phone": [self.main.PHONE_INPUT_SELECTOR]})
+                    reason = None if state["phone"]["visible"] else "login modal gone"
+                except Exception as e:
+                    reason = f"page unhealthy: {e}"
+            if reason and _retire(slot_id):
+                self.close_slot(slot_id, reason)
+
+    def wanted(self) -> int:
+        ready = sum(1 for slot in self.slots.values() if not slot.get("claimed"))
+        target = self.size
+        if self.demand is not None:
+            target = min(target, max(0, self.demand - self.claimed))
+        return target - ready
+
+    def run(self, stop: threading.Event):
+        print(f"🅿️ Standby pool: {self.size} slot(s), max idle {STANDBY_MAX_IDLE:.0f}s")
+        while not stop.is_set():
+            self.reap()
+            if time.time() - self.last_health_check >= STANDBY_HEALTH_INTERVAL:
+                self.health_check()
+            if self.wanted() > 0:
+                self.open_slot()
+            else:
+                stop.wait(1)
+
+    def shutdown(self):
+        for slot_id in list(self.slots):
+            self.close_slot(slot_id, "pool stopped")
+
+
+def main_cli():
+    from playwright.sync_api import sync_playwright
+
+    if STANDBY_PAGES <= 0:
+        print("STANDBY_PAGES is 0, nothing to do")
+        return
+    total_orders = int(os.environ.get('TOTAL_ORDERS', '0')) or None
+    orders_per_context = max(1, int(os.environ.get('ORDERS_PER_CONTEXT', '1')))
+    demand = math.ceil(total_orders / orders_per_context) if total_orders else None
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    with sync_playwright() as p:
+        pool = StandbyPool(p, STANDBY_PAGES, os.environ.get('BATCH_ID'), demand)
+        try:
+            pool.run(stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,199 @@
+"""
+Shared-memory status channel between automation_worker and the backend
+
+The automation status lives in a fixed-size memory-mapped file guarded by a
+sequence lock: writers bump the sequence number to odd, write the JSON
+payload, then bump it to even. Readers retry until they see the same even
+sequence number before and after copying the payload, so a snapshot is
+always complete and consistent. Polling readers compare a single integer to
+detect changes, and writers from different processes (worker and server)
+serialize on an OS file lock.
+
+Payload shape:
+    {
+        "seq": 12, "is_running": true, "success": 3, "failure": 1,
+        "all_products_failed": false, "start_time": "...", "end_time": null,
+        "orders": {"1": {"status": "success", "return_code": 0, ...}, ...}
+    }
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHANNEL_PATH = os.path.join(BASE_DIR, 'automation_status.shm')
+
+MAGIC = b'DSST'
+HEADER = struct.Struct('<4sQI')  # magic, sequence number, payload length
+CHANNEL_SIZE = 512 * 1024
+MAX_PAYLOAD = CHANNEL_SIZE - HEADER.size
+
+if sys.platform == 'win32':
+    import msvcrt
+
+    @contextmanager
+    def _file_lock(lock_path):
+        with open(lock_path, 'a+b') as f:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    @contextmanager
+    def _file_lock(lock_path):
+        with open(lock_path, 'a+b') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def empty_status() -> Dict[str, Any]:
+    return {
+        "is_running": False,
+        "success": 0,
+        "failure": 0,
+        "all_products_failed": False,
+        "start_time": None,
+        "end_time": None,
+        "orders": {},
+    }
+
+
+class StatusChannel:
+    def __init__(self, path: str = DEFAULT_CHANNEL_PATH):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._map = None
+
+    def _mapping(self) -> mmap.mmap:
+        if self._map is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                # Growing to a fixed size is idempotent, so racing creators are
+                # harmless; no file lock here because callers may already hold it
+                if os.fstat(fd).st_size < CHANNEL_SIZE:
+                    os.ftruncate(fd, CHANNEL_SIZE)
+                self._map = mmap.mmap(fd, CHANNEL_SIZE)
+            finally:
+                os.close(fd)
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    # -----------------------------
+    # READING
+    # -----------------------------
+    def sequence(self) -> int:
+        """Current sequence number (cheap change detection)"""
+        magic, seq, _ = HEADER.unpack_from(self._mapping(), 0)
+        return seq if magic == MAGIC else 0
+
+    def snapshot(self, timeout: float = 1.0) -> Dict[str, Any]:
+        """Consistent copy of the current status (with its 'seq')"""
+        buf = self._mapping()
+        deadline = time.time() + timeout
+        while True:
+            magic, seq1, length = HEADER.unpack_from(buf, 0)
+            if magic != MAGIC:
+                return dict(empty_status(), seq=0)
+            if seq1 % 2 == 0 and length <= MAX_PAYLOAD:
+                payload = buf[HEADER.size:HEADER.size + length]
+                _, seq2, _ = HEADER.unpack_from(buf, 0)
+                if seq1 == seq2:
+                    try:
+                        data = json.loads(payload.decode('utf-8'))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        data = empty_status()
+                    data["seq"] = seq1
+                    return data
+            if time.time() >= deadline:
+                raise TimeoutError("Status channel is stuck mid-write")
+            time.sleep(0.001)
+
+    def wait_for_change(self, since_seq: int, timeout: float = 10.0, poll_interval: float = 0.05) -> Dict[str, Any]:
+        """Block until the sequence number moves past since_seq (or timeout), then snapshot"""
+        deadline = time.time() + timeout
+        while self.sequence() <= since_seq and time.time() < deadline:
+            time.sleep(poll_interval)
+        return self.snapshot()
+
+    # -----------------------------
+    # WRITING
+    # -----------------------------
+    def _write(self, data: Dict[str, Any]):
+        """Publish data (caller holds the file lock)"""
+        buf = self._mapping()
+        data = {k: v for k, v in data.items() if k != "seq"}
+        payload = json.dumps(data, default=str).encode('utf-8')
+        if len(payload) > MAX_PAYLOAD:
+            # Keep the counters; drop the oldest per-order detail until it fits
+            orders = data.get("orders", {})
+            for key in sorted(orders, key=lambda k: int(k) if str(k).isdigit() else 0):
+                orders.pop(key)
+                payload = json.dumps(data, default=str).encode('utf-8')
+                if len(payload) <= MAX_PAYLOAD:
+                    break
+        magic, seq, _ = HEADER.unpack_from(buf, 0)
+        seq = seq if magic == MAGIC else 0
+        if seq % 2:
+            seq += 1  # a writer died mid-update; its payload is discarded below
+        HEADER.pack_into(buf, 0, MAGIC, seq + 1, 0)
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(buf, 0, MAGIC, seq + 1, len(payload))
+        HEADER.pack_into(buf, 0, MAGIC, seq + 2, len(payload))
+
+    def publish(self, data: Dict[str, Any]):
+        """Replace the whole status record"""
+        with _file_lock(self.lock_path):
+            self._write(data)
+
+    def update(self, mutate: Optional[Callable[[Dict[str, Any]], None]] = None, **fields) -> Dict[str, Any]:
+        """Atomically read-modify-write the status; returns the new status"""
+        with _file_lock(self.lock_path):
+            data = self.snapshot()
+            data.update(fields)
+            if mutate:
+                mutate(data)
+            self._write(data)
+            return data
+
+    def update_order(self, order_num, **fields) -> Dict[str, Any]:
+        """Merge fields into one order's detail record"""
+        def mutate(data):
+            orders = data.setdefault("orders", {})
+            orders.setdefault(str(order_num), {}).update(fields)
+        return self.update(mutate)
+
+    def start_run(self, **fields) -> Dict[str, Any]:
+        """Reset the channel for a new run"""
+        data = empty_status()
+        data.update(is_running=True, start_time=datetime.now().isoformat())
+        data.update(fields)
+        self.publish(data)
+        return data
+
+    def finish_run(self, **fields) -> Dict[str, Any]:
+        """Mark the run as stopped"""
+        return self.update(is_running=False, end_time=datetime.now().isoformat(), **fields)
@@ -0,0 +1,246 @@
+"""
+Stateless worker agent for distributed order execution
+
+Connects to a coordinator (see coordinator.py), pulls orders while it has free
+slots, runs each one as a main.py subprocess with the batch environment sent
+by the coordinator, streams output lines and return codes back, and
+heartbeats. If the connection drops, running orders are killed (the
+coordinator has already requeued them) and the agent reconnects.
+
+Usage (several agents can share one box for testing):
+    python worker_agent.py --host 192.168.1.10 --port 8765 --slots 4
+"""
+import argparse
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from coordinator import DEFAULT_PORT, read_message, send_message
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(BASE_DIR, 'main.py')
+SESSION_START_DELAY = 2  # seconds between opening browser sessions on this host
+STREAM_DRAIN_TIMEOUT = 5  # seconds to wait for an order's last output lines before reporting its result
+
+
+class WorkerAgent:
+    def __init__(self, host: str, port: int, slots: int = 1, agent_id: Optional[str] = None,
+                 token: Optional[str] = None, reconnect_timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.slots = max(1, slots)
+        self.agent_id = agent_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.token = token
+        self.reconnect_timeout = reconnect_timeout
+        self.logs_dir = os.path.join(os.environ.get('LOGS_DIR') or os.path.join(BASE_DIR, 'logs'),
+                                     f'agent_{self.agent_id}')
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self.streams: Dict[int, List[threading.Thread]] = {}
+        self._send_lock = threading.Lock()
+        self._wfile = None
+        self._stopped = False
+
+    # -----------------------------
+    # CONNECTION
+    # -----------------------------
+    def send(self, message) -> bool:
+        try:
+            send_message(self._wfile, message, self._send_lock)
+            return True
+        except (OSError, AttributeError):
+            return False
+
+    def run(self):
+        """Serve coordinators until told to stop or the coordinator stays unreachable"""
+        last_connected = time.time()
+        while not self._stopped:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=10)
+            except OSError as e:
+                if time.time() - last_connected > self.reconnect_timeout:
+                    print(f"[ERROR] Coordinator {self.host}:{self.port} unreachable: {e}")
+                    return
+                time.sleep(2)
+                continue
+            print(f"[INFO] Agent {self.agent_id} connected to coordinator {self.host}:{self.port}")
+            try:
+                self._session(sock)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Lost coordinator connection: {e}")
+            finally:
+                self._kill_all()
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+            last_connected = time.time()
+
+    def _session(self, sock: socket.socket):
+        sock.settimeout(None)
+        rfile = sock.makefile('rb')
+        self._wfile = sock.makefile('wb')
+        self.send({"type": "hello", "agent_id": self.agent_id, "host": socket.gethostname(),
+                   "slots": self.slots, "token": self.token})
+        welcome = read_message(rfile)
+        if not welcome or welcome.get('type') != 'welcome':
+            message = (welcome or {}).get('message', 'no welcome from coordinator')
+            print(f"[ERROR] Coordinator rejected agent: {message}")
+            self._stopped = True
+            return
+        batch_env = welcome.get('env', {})
+        heartbeat_interval = float(welcome.get('heartbeat_interval', 5))
+
+        inbox: "queue.Queue" = queue.Queue()
+
+        def reader():
+            try:
+                while True:
+                    message = read_message(rfile)
+                    inbox.put(message)
+                    if message is None:
+                        return
+            except (OSError, ValueError):
+                inbox.put(None)
+
+        threading.Thread(target=reader, name='agent-reader', daemon=True).start()
+        threading.Thread(target=self._heartbeat, args=(heartbeat_interval,), name='agent-heartbeat',
+                         daemon=True).start()
+
+        awaiting_reply = False
+        next_pull = 0.0
+        last_start = 0.0
+        while True:
+            self._reap()
+            if not awaiting_reply and len(self.processes) < self.slots and time.time() >= next_pull:
+                if not self.send({"type": "pull"}):
+                    return
+                awaiting_reply = True
+
+            try:
+                message = inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+
+            kind = message.get('type')
+            if kind == 'order':
+                awaiting_reply = False
+                wait = SESSION_START_DELAY - (time.time() - last_start)
+                if wait > 0:
+                    time.sleep(wait)
+                self._launch(int(message['order']), batch_env)
+                last_start = time.time()
+            elif kind == 'wait':
+                awaiting_reply = False
+                next_pull = time.time() + float(message.get('retry_in', 1.0))
+            elif kind == 'stop':
+                print("[INFO] Coordinator finished the batch - stopping agent")
+                self._stopped = True
+                return
+            elif kind == 'error':
+                print(f"[ERROR] Coordinator: {message.get('message')}")
+
+    def _heartbeat(self, interval: float):
+        wfile = self._wfile
+        while self._wfile is wfile and not self._stopped:
+            if not self.send({"type": "heartbeat", "orders": sorted(self.processes)}):
+                return
+            time.sleep(interval)
+
+    # -----------------------------
+    # ORDERS
+    # -----------------------------
+    def _launch(self, order_num: int, batch_env: Dict[str, str]):
+        os.makedirs(self.logs_dir, exist_ok=True)
+        env = os.environ.copy()
+        env.update(batch_env)
+        env['ORDER_NUMBER'] = str(order_num)
+        env['WORKER_LOG_PATH'] = os.path.join(self.logs_dir, f'worker_{order_num}.log')
+        if sys.platform == 'win32':
+            env['PYTHONIOENCODING'] = 'utf-8'
+        try:
+            process = subprocess.Popen(
+                [sys.executable, '-u', MAIN_SCRIPT],
+                cwd=BASE_DIR,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1
+            )
+        except Exception as e:
+            print(f"[ERROR] Failed to start order {order_num}: {e}")
+            self.send({"type": "result", "order": order_num, "return_code": 1})
+            return
+        self.processes[order_num] = process
+        self.send({"type": "started", "order": order_num, "pid": process.pid})
+        print(f"[INFO] Started order {order_num} (pid {process.pid})")
+        self.streams[order_num] = []
+        for stream_name, stream in (('stdout', process.stdout), ('stderr', process.stderr)):
+            thread = threading.Thread(target=self._stream_output, args=(order_num, stream_name, stream),
+                                      daemon=True)
+            thread.start()
+            self.streams[order_num].append(thread)
+
+    def _stream_output(self, order_num: int, stream_name: str, stream):
+        worker_log = os.path.join(self.logs_dir, f'worker_{order_num}.log')
+        try:
+            with open(worker_log, 'a', encoding='utf-8') as log_file:
+                for line in iter(stream.readline, ''):
+                    line = line.rstrip()
+                    log_file.write(line + '\n')
+                    self.send({"type": "log", "order": order_num, "stream": stream_name, "line": line})
+        except Exception as e:
+            print(f"[ERROR] Error reading {stream_name} for order {order_num}: {e}")
+
+    def _reap(self):
+        for order_num, process in list(self.processes.items()):
+            return_code = process.poll()
+            if return_code is None:
+                continue
+            del self.processes[order_num]
+            # The coordinator must get the last lines (the failure reason) before the result
+            deadline = time.time() + STREAM_DRAIN_TIMEOUT
+            for thread in self.streams.pop(order_num, []):
+                thread.join(timeout=max(0.0, deadline - time.time()))
+            print(f"[INFO] Order {order_num} finished (return_code={return_code})")
+            self.send({"type": "result", "order": order_num, "return_code": return_code})
+
+    def _kill_all(self):
+        for order_num, process in list(self.processes.items()):
+            try:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            except Exception as e:
+                print(f"[ERROR] Failed to terminate order {order_num}: {e}")
+        self.processes.clear()
+        self.streams.clear()
+        self._wfile = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DealShare distributed worker agent')
+    parser.add_argument('--host', default=os.environ.get('COORDINATOR_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('COORDINATOR_PORT', DEFAULT_PORT)))
+    parser.add_argument('--slots', type=int, default=int(os.environ.get('AGENT_SLOTS', '1')),
+                        help='Parallel browser windows on this host')
+    parser.add_argument('--agent-id', default=os.environ.get('AGENT_ID'))
+    parser.add_argument('--token', default=os.environ.get('COORDINATOR_TOKEN'))
+    args = parser.parse_args()
+    WorkerAgent(args.host, args.port, args.slots, args.agent_id, args.token).run()
+
+
+if __name__ == '__main__':
+    main()